@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Entrenamiento, Ejercicio
+from .models import Entrenamiento, Ejercicio, Inscripcion, Tarea
 
 # Register your models here.
 
@@ -7,7 +7,8 @@ from .models import Entrenamiento, Ejercicio
     Personaliza la interfaz de administración para el modelo Entrenamiento.
 """
 class EntrenamientoAdmin(admin.ModelAdmin):
-    readonly_fields = ('creado', )  # Establece el campo 'creado' como de solo lectura
+    list_display = ('titulo', 'num_ejercicios', 'num_apuntados', 'creado')  # Los contadores permiten ordenar por popularidad
+    readonly_fields = ('creado', 'num_ejercicios', 'num_apuntados')  # Establece el campo 'creado' y los contadores como de solo lectura
 
 """
     Personaliza la interfaz de administración para el modelo Ejercicio.
@@ -15,6 +16,24 @@ class EntrenamientoAdmin(admin.ModelAdmin):
 class EjercicioAdmin(admin.ModelAdmin):
     readonly_fields = ('creado', )  # Establece el campo 'creado' como de solo lectura
 
+"""
+    Personaliza la interfaz de administración para las tareas en segundo plano.
+"""
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'ejecutar_despues', 'creado')  # Columnas del listado
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('creado', 'actualizado')
+
+"""
+    Personaliza la interfaz de administración para las inscripciones de los usuarios.
+"""
+class InscripcionAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'entrenamiento', 'fecha_apuntado')
+    list_select_related = ('usuario', 'entrenamiento')  # Evita una consulta por fila en el listado
+    raw_id_fields = ('usuario', 'entrenamiento')  # No carga todos los usuarios y entrenamientos en los desplegables
+
 # Registra los modelos 'Entrenamiento' y 'Ejercicio' en el sitio de administración de Django
 admin.site.register(Entrenamiento, EntrenamientoAdmin)
 admin.site.register(Ejercicio, EjercicioAdmin)
+admin.site.register(Tarea, TareaAdmin)
+admin.site.register(Inscripcion, InscripcionAdmin)
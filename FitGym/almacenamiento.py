@@ -0,0 +1,117 @@
+import hashlib
+import os
+from itertools import islice
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from .imagenes import IMAGEN_POR_DEFECTO, es_imagen_por_defecto
+from .models import Ejercicio, Entrenamiento, FicheroContenido
+
+"""
+    Almacenamiento direccionado por contenido para las imágenes.
+
+    Cada fichero subido se guarda con el hash SHA-256 de su contenido como nombre
+    ('contenido/ab/abcdef....jpg'), así que la misma imagen subida dos veces ocupa un único
+    fichero y su URL nunca cambia de contenido (se puede cachear indefinidamente).
+    Como varios ejercicios y entrenamientos pueden compartir fichero, se lleva la cuenta de
+    referencias en FicheroContenido y el fichero solo se borra cuando deja de usarlo el último.
+"""
+
+DIRECTORIO = 'contenido'  # Carpeta (dentro de MEDIA_ROOT) donde se guardan los ficheros por hash.
+LOTE_RECUENTO = 1000  # Ficheros que se leen y escriben de una vez al recontar las referencias.
+
+"""
+    Almacenamiento en disco que nombra los ficheros por el hash de su contenido.
+    Los nombres que ya están dentro de DIRECTORIO (las miniaturas, cuyo nombre se deriva del
+    hash de la original) se guardan tal cual.
+"""
+class AlmacenamientoContenido(FileSystemStorage):
+    contenido_inmutable = True  # Un mismo nombre siempre tiene el mismo contenido.
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)  # Reescribir un nombre por hash nunca cambia su contenido.
+        super().__init__(*args, **kwargs)
+
+    def _save(self, name, content):
+        if not name.startswith(DIRECTORIO + '/'):
+            name = self.nombre_por_contenido(name, content)
+        if self.exists(name):  # Contenido ya guardado: no se vuelve a escribir.
+            return name
+        return super()._save(name, content)
+
+    """
+        Calcula el nombre por contenido de un fichero, leyéndolo por trozos.
+    """
+    def nombre_por_contenido(self, name, content):
+        resumen = hashlib.sha256()
+        content.seek(0)
+        for trozo in content.chunks():
+            resumen.update(trozo)
+        content.seek(0)
+        huella = resumen.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return f"{DIRECTORIO}/{huella[:2]}/{huella}{extension}"
+
+"""
+    Cuenta cuántos ejercicios y entrenamientos usan un fichero consultando las tablas.
+    Se usa para los ficheros que todavía no tienen contador (subidos antes de este almacenamiento).
+"""
+def contar_referencias(nombre):
+    return Ejercicio.objects.filter(imagen=nombre).count() + Entrenamiento.objects.filter(imagen=nombre).count()
+
+"""
+    Suma una referencia al fichero indicado, creando su contador si no existe.
+"""
+def sumar_referencia(nombre):
+    if es_imagen_por_defecto(nombre):
+        return
+    if FicheroContenido.objects.filter(nombre=nombre).update(referencias=F('referencias') + 1):
+        return
+    try:
+        with transaction.atomic():
+            FicheroContenido.objects.create(nombre=nombre, referencias=1)
+    except IntegrityError:  # Otra petición ha creado el contador a la vez.
+        FicheroContenido.objects.filter(nombre=nombre).update(referencias=F('referencias') + 1)
+
+"""
+    Devuelve cuántas referencias le quedan a un fichero según su contador (o las tablas si no lo tiene).
+"""
+def referencias_restantes(nombre):
+    restantes = FicheroContenido.objects.filter(nombre=nombre).values_list('referencias', flat=True).first()
+    return contar_referencias(nombre) if restantes is None else restantes
+
+"""
+    Resta una referencia al fichero y, si ya no lo usa nadie, encola su borrado junto con sus miniaturas.
+    Se encola al confirmar la transacción (se llama desde post_delete y al cambiar la imagen): si el
+    borrado o el cambio se deshacen, el fichero sigue en uso. El borrado vuelve a comprobar el contador
+    al ejecutarse, por si mientras tanto alguien subió la misma imagen.
+"""
+def liberar_referencia(modelo, nombre, derivadas=None):
+    if es_imagen_por_defecto(nombre):
+        return
+    FicheroContenido.objects.filter(nombre=nombre).update(referencias=F('referencias') - 1)
+    if referencias_restantes(nombre) <= 0:
+        from .tareas import encolar  # Importación local: FitGym.tareas importa este módulo.
+        nombres = [n for por_ancho in (derivadas or {}).values() for n in por_ancho.values()]
+        transaction.on_commit(lambda: encolar('liberar_fichero', {'modelo': modelo, 'nombre': nombre, 'derivadas': nombres}))
+
+"""
+    Recalcula desde las tablas los contadores de referencias de todos los ficheros.
+    Las cuentas se agregan en la base de datos (una fila por fichero) y se leen y escriben por lotes,
+    así que la memoria no depende del número de objetos. Devuelve el número de ficheros con referencias.
+"""
+def recontar_referencias(lote=LOTE_RECUENTO):
+    with transaction.atomic():
+        FicheroContenido.objects.all().delete()
+        for modelo in (Ejercicio, Entrenamiento):
+            cuentas = (modelo.objects.exclude(imagen='').exclude(imagen=IMAGEN_POR_DEFECTO)
+                       .values('imagen').annotate(total=Count('pk')).order_by().values_list('imagen', 'total')
+                       .iterator(chunk_size=lote))
+            while trozo := dict(islice(cuentas, lote)):
+                # Los ficheros compartidos con el modelo anterior ya tienen contador: se suman.
+                existentes = list(FicheroContenido.objects.filter(nombre__in=trozo))
+                for fichero in existentes:
+                    fichero.referencias += trozo.pop(fichero.nombre)
+                FicheroContenido.objects.bulk_update(existentes, ['referencias'])
+                FicheroContenido.objects.bulk_create(FicheroContenido(nombre=n, referencias=r) for n, r in trozo.items())
+        return FicheroContenido.objects.count()
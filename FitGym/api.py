@@ -0,0 +1,335 @@
+import functools
+import hashlib
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects, Prefetch
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from .condicional import estado_paginacion
+from .models import Ejercicio, Entrenamiento, EntrenamientoEjercicio
+from . import sugerencias as indice_sugerencias
+from .views import paginar, paginar_busqueda
+
+"""
+    API JSON de solo lectura del catálogo (versión 1).
+
+    Ofrece los mismos listados que las vistas HTML (misma búsqueda y misma paginación), el detalle
+    de un objeto y un endpoint por lotes para pedir muchos ids en una sola petición. Con el parámetro
+    'campos' se eligen los campos devueltos, y solo esas columnas se leen de la base de datos.
+    Cada respuesta lleva un ETag formado, igual que en FitGym.condicional, con el id y la fecha de
+    modificación de los objetos (y de sus ejercicios, si se piden), el estado de la paginación y la URL
+    (campos, página o cursor, búsqueda). Se calcula antes de cargar los ejercicios y de serializar, así
+    que una petición condicional cuyo contenido no ha cambiado recibe un 304 sin hacer ese trabajo.
+    El detalle lleva además un Last-Modified con su fecha de modificación; los listados y los lotes no,
+    porque la fecha más reciente de sus objetos no cambia al borrar uno o al cambiar el orden.
+"""
+
+POR_PAGINA = 20  # Tamaño de página por defecto de los listados.
+MAX_POR_PAGINA = 100  # Tamaño de página máximo que se puede pedir con 'por_pagina'.
+MAX_IDS_LOTE = 100  # Número máximo de ids en una petición por lotes.
+CACHE_SUGERENCIAS = 60  # Segundos que el navegador puede reutilizar unas sugerencias sin volver a pedirlas.
+
+# Campos que se pueden pedir de cada modelo y columna de la base de datos que necesita cada uno.
+CAMPOS_EJERCICIO = {
+    'id': 'id', 'nombre': 'nombre', 'descripcion': 'descripcion', 'imagen': 'imagen',
+    'miniaturas': 'imagen_derivadas', 'creado': 'creado', 'actualizado': 'actualizado',
+}
+CAMPOS_ENTRENAMIENTO = {
+    'id': 'id', 'titulo': 'titulo', 'descripcion': 'descripcion', 'imagen': 'imagen',
+    'miniaturas': 'imagen_derivadas', 'creado': 'creado', 'actualizado': 'actualizado', 'ejercicios': None,
+}
+CAMPOS_EJERCICIO_ANIDADO = ['id', 'nombre', 'descripcion', 'imagen', 'miniaturas', 'actualizado']  # Ejercicios dentro de un entrenamiento.
+
+"""
+    Error de la petición que se devuelve al cliente como JSON con estado 400.
+"""
+class PeticionIncorrecta(Exception):
+    pass
+
+"""
+    Lee el parámetro 'campos' y devuelve la lista de campos pedidos (todos si no se indica).
+"""
+def campos_pedidos(request, disponibles):
+    valor = request.GET.get('campos')
+    if not valor:
+        return list(disponibles)
+    campos = list(dict.fromkeys(c.strip() for c in valor.split(',') if c.strip()))
+    desconocidos = [c for c in campos if c not in disponibles]
+    if desconocidos:
+        raise PeticionIncorrecta(f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos
+
+"""
+    Limita el queryset a las columnas necesarias para los campos pedidos.
+    'creado' e 'id' se leen siempre porque la paginación ordena por ellos, y 'actualizado' para el ETag y Last-Modified.
+"""
+def preparar_consulta(queryset, campos, disponibles):
+    columnas = {'id', 'creado', 'actualizado'} | {disponibles[c] for c in campos if disponibles[c]}
+    return queryset.only(*columnas)
+
+"""
+    Si se piden los ejercicios, los carga para todos los objetos con una única consulta adicional.
+"""
+def cargar_ejercicios(objetos, campos):
+    if 'ejercicios' in campos:
+        prefetch_related_objects(objetos, Prefetch('ejercicios', queryset=ejercicios_anidados()))
+
+"""
+    Ejercicios anidados en el orden del entrenamiento (el ORDER BY reutiliza el JOIN del prefetch con la tabla intermedia).
+"""
+def ejercicios_anidados():
+    return Ejercicio.objects.only(*{CAMPOS_EJERCICIO[c] for c in CAMPOS_EJERCICIO_ANIDADO}).order_by('filas_entrenamientos__posicion', 'id')
+
+def _url(storage, nombre):
+    return storage.url(nombre) if nombre else None
+
+"""
+    Convierte un ejercicio en un diccionario con los campos indicados.
+"""
+def serializar_ejercicio(ejercicio, campos):
+    datos = {}
+    for campo in campos:
+        if campo == 'imagen':
+            datos['imagen'] = _url(ejercicio.imagen.storage, ejercicio.imagen.name)
+        elif campo == 'miniaturas':
+            datos['miniaturas'] = _miniaturas(ejercicio)
+        else:
+            datos[campo] = getattr(ejercicio, campo)
+    return datos
+
+"""
+    Convierte un entrenamiento en un diccionario con los campos indicados (y sus ejercicios anidados).
+"""
+def serializar_entrenamiento(entrenamiento, campos):
+    datos = serializar_ejercicio(entrenamiento, [c for c in campos if c != 'ejercicios'])
+    if 'ejercicios' in campos:
+        datos['ejercicios'] = [serializar_ejercicio(e, CAMPOS_EJERCICIO_ANIDADO) for e in entrenamiento.ejercicios.all()]
+    return {campo: datos[campo] for campo in campos}  # Respeta el orden pedido.
+
+def _miniaturas(objeto):
+    storage = objeto.imagen.storage
+    return {formato: {ancho: storage.url(nombre) for ancho, nombre in por_ancho.items()}
+            for formato, por_ancho in (objeto.imagen_derivadas or {}).items()}
+
+"""
+    Devuelve lo que cambia en los ejercicios anidados de unos objetos si se han pedido: el ejercicio
+    de cada posición y su fecha de modificación. Es una consulta ligera sobre la tabla intermedia
+    que no carga los ejercicios.
+"""
+def firma_ejercicios(objetos, campos):
+    if 'ejercicios' not in campos or not objetos:
+        return []
+    return list(EntrenamientoEjercicio.objects.filter(entrenamiento_id__in=[objeto.pk for objeto in objetos])
+                .order_by('entrenamiento_id', 'posicion', 'ejercicio_id')
+                .values_list('entrenamiento_id', 'ejercicio_id', 'posicion', 'ejercicio__actualizado'))
+
+"""
+    Devuelve la fecha de modificación más reciente de unos objetos y de sus ejercicios anidados (ver firma_ejercicios).
+"""
+def ultima_modificacion(objetos, anidados):
+    fechas = [objeto.actualizado for objeto in objetos] + [fila[-1] for fila in anidados]
+    return max(fechas, default=None)
+
+"""
+    Versión (ETag) de una respuesta, calculada sin serializar nada: la URL (campos, página o cursor,
+    búsqueda...), los objetos con su fecha de modificación, sus ejercicios anidados y las partes adicionales.
+"""
+def version(request, objetos, anidados, *partes):
+    firma = [(objeto.pk, objeto.actualizado) for objeto in objetos]
+    datos = repr((request.get_full_path(), firma, anidados) + partes)
+    return quote_etag(hashlib.sha1(datos.encode()).hexdigest())
+
+def _marca(actualizado):
+    return int(actualizado.timestamp()) if actualizado else None
+
+"""
+    Responde con un 304 si el cliente ya tiene la versión actual de los objetos. Si no, carga sus
+    ejercicios (si se piden) y devuelve la respuesta JSON con los datos que construye 'construir'.
+    'partes' se añaden a la versión (por ejemplo, el estado de la paginación).
+"""
+def responder(request, objetos, campos, construir, *partes, con_fecha=False):
+    anidados = firma_ejercicios(objetos, campos)
+    etag = version(request, objetos, anidados, *partes)
+    actualizado = ultima_modificacion(objetos, anidados) if con_fecha else None
+    condicional = get_conditional_response(request, etag=etag, last_modified=_marca(actualizado))
+    if condicional is not None:
+        return condicional
+    cargar_ejercicios(objetos, campos)
+    return respuesta_json(request, construir(), etag=etag, actualizado=actualizado)
+
+"""
+    Devuelve la respuesta JSON con su ETag (y Last-Modified si se indica). Sin ETag (las sugerencias,
+    que no leen la base de datos) se calcula sobre el contenido y se responde 304 si el cliente ya lo tiene.
+"""
+def respuesta_json(request, datos, status=200, etag=None, actualizado=None):
+    marca = _marca(actualizado)
+    if status == 200 and etag is None:
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+        etag = '"%s"' % hashlib.sha1(contenido.encode()).hexdigest()
+        condicional = get_conditional_response(request, etag=etag, last_modified=marca)
+        if condicional is not None:
+            return condicional
+    response = JsonResponse(datos, status=status, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+    if status == 200:
+        response['ETag'] = etag
+        if marca is not None:
+            response['Last-Modified'] = http_date(marca)
+        response['Cache-Control'] = 'no-cache'  # Se puede guardar, pero hay que revalidarla con el ETag.
+    return response
+
+def respuesta_error(request, mensaje, status=400):
+    return respuesta_json(request, {'error': mensaje}, status=status)
+
+"""
+    Lee un entero positivo de la query string, con un valor por defecto y un máximo.
+"""
+def entero_positivo(request, nombre, defecto, maximo):
+    try:
+        valor = int(request.GET.get(nombre, defecto))
+    except ValueError:
+        raise PeticionIncorrecta(f"'{nombre}' debe ser un número entero")
+    if valor < 1:
+        raise PeticionIncorrecta(f"'{nombre}' debe ser mayor que cero")
+    return min(valor, maximo)
+
+"""
+    Construye la respuesta de un listado: misma búsqueda y misma paginación que la vista HTML.
+"""
+def listado(request, modelo, disponibles, serializar):
+    campos = campos_pedidos(request, disponibles)
+    por_pagina = entero_positivo(request, 'por_pagina', POR_PAGINA, MAX_POR_PAGINA)
+    busqueda = request.GET.get('q', '')
+    consulta = preparar_consulta(modelo.objects.all(), campos, disponibles)
+    if busqueda:
+        pagina = paginar_busqueda(modelo, busqueda, request.GET.get('page'), por_pagina, consulta)
+    else:
+        pagina = paginar(request, consulta, por_pagina)
+    objetos = list(pagina)
+
+    def construir():
+        datos = {'resultados': [serializar(objeto, campos) for objeto in objetos]}
+        if getattr(pagina, 'es_cursor', False):
+            datos['siguiente'] = pagina.next_cursor
+            datos['anterior'] = pagina.previous_cursor
+        else:
+            datos['pagina'] = pagina.number
+            datos['paginas'] = pagina.paginator.num_pages
+            datos['total'] = pagina.paginator.count
+            datos['siguiente'] = pagina.next_page_number() if pagina.has_next() else None
+            datos['anterior'] = pagina.previous_page_number() if pagina.has_previous() else None
+        return datos
+    return responder(request, objetos, campos, construir, estado_paginacion(pagina))
+
+"""
+    Construye la respuesta del detalle de un objeto.
+"""
+def detalle(request, modelo, disponibles, serializar, id):
+    campos = campos_pedidos(request, disponibles)
+    objeto = preparar_consulta(modelo.objects.filter(id=id), campos, disponibles).first()
+    if objeto is None:
+        return respuesta_error(request, "No encontrado", status=404)
+    return responder(request, [objeto], campos, lambda: serializar(objeto, campos), con_fecha=True)
+
+"""
+    Construye la respuesta de una petición por lotes (?ids=1,2,3): una sola consulta para todos
+    los objetos (más una para los ejercicios si se piden), en el orden de los ids solicitados.
+"""
+def lote(request, modelo, disponibles, serializar):
+    campos = campos_pedidos(request, disponibles)
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.GET.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        raise PeticionIncorrecta("'ids' debe ser una lista de números separados por comas")
+    if not ids:
+        raise PeticionIncorrecta("Falta el parámetro 'ids'")
+    if len(ids) > MAX_IDS_LOTE:
+        raise PeticionIncorrecta(f"Como máximo se pueden pedir {MAX_IDS_LOTE} ids")
+    objetos = preparar_consulta(modelo.objects.all(), campos, disponibles).in_bulk(ids)
+    encontrados = [objetos[i] for i in ids if i in objetos]
+    return responder(request, encontrados, campos, lambda: {
+        'resultados': [serializar(objeto, campos) for objeto in encontrados],
+        'no_encontrados': [i for i in ids if i not in objetos],
+    })
+
+"""
+    Construye la respuesta de las sugerencias de autocompletado (?q=pres): ids y textos de los objetos
+    cuyo título o nombre tiene una palabra que empieza por lo escrito, sin consultar la base de datos.
+"""
+def sugerencias(request, modelo):
+    limite = entero_positivo(request, 'limite', indice_sugerencias.LIMITE_SUGERENCIAS, indice_sugerencias.LIMITE_SUGERENCIAS)
+    resultados = indice_sugerencias.sugerir(modelo, request.GET.get('q', ''), limite)
+    response = respuesta_json(request, {'resultados': [{'id': objeto_id, 'texto': texto} for objeto_id, texto in resultados]})
+    if response.status_code == 200:
+        response['Cache-Control'] = f'max-age={CACHE_SUGERENCIAS}'  # Se repiten mucho al escribir y borrar.
+    return response
+
+"""
+    Decorador de las vistas de la API: solo GET/HEAD y los errores de la petición se devuelven como JSON.
+"""
+def vista_api(funcion):
+    @require_safe
+    @functools.wraps(funcion)
+    def vista(request, *args, **kwargs):
+        try:
+            return funcion(request, *args, **kwargs)
+        except PeticionIncorrecta as error:
+            return respuesta_error(request, str(error))
+    return vista
+
+"""
+    Listado de entrenamientos con sus ejercicios. Admite 'q', 'page' o 'cursor', 'por_pagina' y 'campos'.
+"""
+@vista_api
+def entrenamientos(request):
+    return listado(request, Entrenamiento, CAMPOS_ENTRENAMIENTO, serializar_entrenamiento)
+
+"""
+    Detalle de un entrenamiento con sus ejercicios.
+"""
+@vista_api
+def entrenamiento(request, id):
+    return detalle(request, Entrenamiento, CAMPOS_ENTRENAMIENTO, serializar_entrenamiento, id)
+
+"""
+    Varios entrenamientos por id en una sola petición (?ids=1,2,3).
+"""
+@vista_api
+def entrenamientos_lote(request):
+    return lote(request, Entrenamiento, CAMPOS_ENTRENAMIENTO, serializar_entrenamiento)
+
+"""
+    Sugerencias de títulos de entrenamientos para lo escrito en 'q'. Admite 'limite'.
+"""
+@vista_api
+def entrenamientos_sugerencias(request):
+    return sugerencias(request, 'entrenamiento')
+
+"""
+    Listado de ejercicios. Admite 'q', 'page' o 'cursor', 'por_pagina' y 'campos'.
+"""
+@vista_api
+def ejercicios(request):
+    return listado(request, Ejercicio, CAMPOS_EJERCICIO, serializar_ejercicio)
+
+"""
+    Detalle de un ejercicio.
+"""
+@vista_api
+def ejercicio(request, id):
+    return detalle(request, Ejercicio, CAMPOS_EJERCICIO, serializar_ejercicio, id)
+
+"""
+    Varios ejercicios por id en una sola petición (?ids=1,2,3).
+"""
+@vista_api
+def ejercicios_lote(request):
+    return lote(request, Ejercicio, CAMPOS_EJERCICIO, serializar_ejercicio)
+
+"""
+    Sugerencias de nombres de ejercicios para lo escrito en 'q'. Admite 'limite'.
+"""
+@vista_api
+def ejercicios_sugerencias(request):
+    return sugerencias(request, 'ejercicio')
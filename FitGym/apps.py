@@ -9,4 +9,10 @@ from django.apps import AppConfig
 """
 class FitgymConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField" # Establece el tipo de campo predeterminado para las claves primarias de los modelos.
-    name = "FitGym" # Especifica el nombre de la aplicación.
\ No newline at end of file
+    name = "FitGym" # Especifica el nombre de la aplicación.
+
+    """
+        Registra las señales de la aplicación cuando Django termina de cargar los modelos.
+    """
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,170 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from .models import TerminoBusqueda
+from .paginacion import total_aproximado
+
+"""
+    Motor de búsqueda de texto completo para ejercicios y entrenamientos.
+
+    Mantiene un índice invertido (modelo TerminoBusqueda) con los términos normalizados
+    del título/nombre y de la descripción de cada objeto. Los términos se pasan a minúsculas,
+    se les quitan las tildes y se reducen a su raíz, de modo que "presión", "Presiones" y
+    "presion" acaban en el mismo término.
+"""
+
+# Campos indexados por modelo junto con su peso en el ranking (el título pesa más que la descripción).
+CAMPOS_INDEXADOS = {
+    'ejercicio': (('nombre', 3.0), ('descripcion', 1.0)),
+    'entrenamiento': (('titulo', 3.0), ('descripcion', 1.0)),
+}
+
+LIMITE_RESULTADOS = 1000  # Número máximo de resultados que devuelve una búsqueda.
+TAMANO_LOTE = 2000  # Tamaño de los lotes de inserción al indexar muchos objetos.
+
+# Palabras vacías en español que no aportan nada a la búsqueda.
+PALABRAS_VACIAS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'o', 'para',
+    'por', 'que', 'se', 'si', 'su', 'sus', 'u', 'un', 'una', 'unas', 'unos', 'y',
+))
+
+# Sufijos derivativos que se eliminan al calcular la raíz, del más largo al más corto.
+SUFIJOS = (
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'uciones', 'idades', 'adoras',
+    'adores', 'ancias', 'encias', 'mente', 'acion', 'ucion', 'adora', 'ancia', 'encia',
+    'ismos', 'istas', 'ables', 'ibles', 'iendo', 'ador', 'idad', 'ismo', 'ista', 'able',
+    'ible', 'osos', 'osas', 'ando', 'oso', 'osa', 'ar', 'er', 'ir',
+)
+
+LONGITUD_MINIMA_RAIZ = 3  # Nunca se recorta una palabra por debajo de esta longitud.
+LONGITUD_MAXIMA_TERMINO = 50  # Coincide con el max_length del campo 'termino'.
+LONGITUD_MINIMA_PREFIJO = 3  # El último término se busca como prefijo solo si tiene al menos esta longitud.
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9ñ]+')
+
+"""
+    Pasa el texto a minúsculas y le quita las tildes y diéresis, conservando la ñ.
+"""
+def normalizar(texto):
+    texto = (texto or '').lower().replace('ñ', '\0')
+    texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return texto.replace('\0', 'ñ')
+
+"""
+    Reduce una palabra normalizada a su raíz con un stemmer ligero para español:
+    quita el plural, después el sufijo derivativo más largo y por último la vocal final.
+"""
+def raiz(palabra):
+    def recortar(p, sufijo):
+        return p[:-len(sufijo)] if p.endswith(sufijo) and len(p) - len(sufijo) >= LONGITUD_MINIMA_RAIZ else p
+
+    palabra = recortar(palabra, 'es') if palabra.endswith(('nes', 'res', 'les', 'des')) else recortar(palabra, 's')
+    for sufijo in SUFIJOS:
+        recortada = recortar(palabra, sufijo)
+        if recortada != palabra:
+            palabra = recortada
+            break
+    for vocal in 'aoe':
+        palabra = recortar(palabra, vocal)
+    return palabra[:LONGITUD_MAXIMA_TERMINO]
+
+"""
+    Convierte un texto en la lista de términos que se guardan (o se buscan) en el índice.
+"""
+def terminos(texto):
+    return [raiz(p) for p in _PATRON_PALABRA.findall(normalizar(texto)) if p not in PALABRAS_VACIAS]
+
+"""
+    Devuelve las filas de índice (sin guardar) correspondientes a un objeto.
+    El peso de cada término combina el peso del campo y su frecuencia (1 + log(tf)).
+"""
+def _filas(objeto):
+    modelo = objeto._meta.model_name
+    pesos = Counter()
+    for campo, peso_campo in CAMPOS_INDEXADOS[modelo]:
+        for termino, frecuencia in Counter(terminos(getattr(objeto, campo))).items():
+            pesos[termino] += peso_campo * (1 + math.log(frecuencia))
+    return [TerminoBusqueda(termino=t, modelo=modelo, objeto_id=objeto.pk, peso=p) for t, p in pesos.items()]
+
+"""
+    Actualiza incrementalmente el índice de un único objeto (se llama desde post_save).
+"""
+def indexar(objeto):
+    desindexar(objeto)
+    TerminoBusqueda.objects.bulk_create(_filas(objeto))
+
+"""
+    Elimina del índice las filas de un objeto (se llama desde post_delete).
+"""
+def desindexar(objeto):
+    TerminoBusqueda.objects.filter(modelo=objeto._meta.model_name, objeto_id=objeto.pk).delete()
+
+"""
+    Indexa muchos objetos del mismo modelo con inserciones por lotes.
+    Devuelve el número de filas de índice creadas.
+"""
+def indexar_lote(objetos):
+    creadas = 0
+    filas = []
+    for objeto in objetos:
+        filas.extend(_filas(objeto))
+        if len(filas) >= TAMANO_LOTE:
+            TerminoBusqueda.objects.bulk_create(filas)
+            creadas += len(filas)
+            filas = []
+    TerminoBusqueda.objects.bulk_create(filas)
+    return creadas + len(filas)
+
+"""
+    Reconstruye desde cero el índice de un modelo recorriendo la tabla con un iterador.
+"""
+def reconstruir(modelo_cls):
+    modelo = modelo_cls._meta.model_name
+    campos = ['pk'] + [campo for campo, _ in CAMPOS_INDEXADOS[modelo]]
+    TerminoBusqueda.objects.filter(modelo=modelo).delete()
+    return indexar_lote(modelo_cls.objects.only(*campos).iterator(chunk_size=TAMANO_LOTE))
+
+"""
+    Busca en el índice de un modelo y devuelve los ids ordenados por relevancia.
+    Primero van los objetos que contienen más términos de la consulta y, a igualdad,
+    los de mayor puntuación TF-IDF. El último término se busca como prefijo, para que
+    una palabra a medio escribir ("sent") encuentre los objetos con la palabra completa
+    ("Sentadilla"); todos los términos del índice que empiezan por él cuentan como una coincidencia.
+"""
+def buscar(modelo_cls, consulta, limite=LIMITE_RESULTADOS):
+    modelo = modelo_cls._meta.model_name
+    lista = terminos(consulta)
+    if not lista:
+        return []
+
+    buscados = Q(termino__in=set(lista))
+    coincidencia = F('termino')  # Lo que se cuenta como un término distinto de la consulta.
+    prefijo = lista[-1]
+    if len(prefijo) >= LONGITUD_MINIMA_PREFIJO:
+        buscados |= Q(termino__startswith=prefijo)
+        coincidencia = Case(When(termino__startswith=prefijo, then=Value(prefijo)), default=F('termino'))
+    filas = TerminoBusqueda.objects.filter(buscados, modelo=modelo)
+    frecuencias = dict(filas.values_list('termino').annotate(n=Count('id')).order_by())  # Nº de documentos por término.
+    if not frecuencias:
+        return []
+    total = total_aproximado(modelo_cls.objects.all())  # Cacheado: basta un valor aproximado para el IDF.
+    idf = {t: math.log(1 + max(total, n) / n) for t, n in frecuencias.items()}
+
+    puntuacion = Sum(Case(
+        *[When(termino=t, then=F('peso') * Value(v)) for t, v in idf.items()],
+        default=Value(0.0), output_field=FloatField(),
+    ))
+    resultados = (filas.values('objeto_id')
+                  .annotate(coincidencias=Count(coincidencia, distinct=True), puntuacion=puntuacion)
+                  .order_by('-coincidencias', '-puntuacion', 'objeto_id')[:limite])
+    return [fila['objeto_id'] for fila in resultados]
+
+"""
+    Devuelve los objetos con los ids indicados conservando el orden de la lista.
+    Con 'queryset' se cargan desde él (por ejemplo, limitado a unas columnas con only()).
+"""
+def objetos_ordenados(modelo_cls, ids, queryset=None):
+    objetos = (modelo_cls.objects.all() if queryset is None else queryset).in_bulk(ids)
+    return [objetos[i] for i in ids if i in objetos]
@@ -0,0 +1,274 @@
+import csv
+import json
+import os
+import shutil
+import zipfile
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from . import almacenamiento, busqueda, contadores, imagenes, sugerencias, tareas
+from .models import Ejercicio, Entrenamiento, TerminoBusqueda
+
+"""
+    Importación y exportación masiva del catálogo de ejercicios y entrenamientos.
+
+    Los registros se leen y escriben de uno en uno (JSONL o CSV), así que la memoria usada no
+    depende del tamaño del catálogo. La importación agrupa los registros en lotes y por cada lote
+    hace un puñado de consultas: bulk_create de los nuevos, bulk_update de los existentes
+    (se identifican por nombre o título), inserción por lotes en la tabla intermedia de
+    ejercicios, índice de búsqueda y fecha de modificación (que invalida las tarjetas). Las imágenes viajan en un zip aparte.
+"""
+
+TAMANO_LOTE = 1000  # Registros por lote (y por transacción) al importar.
+
+# Clave natural de cada modelo: un registro con el mismo valor actualiza el objeto existente.
+CLAVES = {'ejercicio': 'nombre', 'entrenamiento': 'titulo'}
+MODELOS = {'ejercicio': Ejercicio, 'entrenamiento': Entrenamiento}
+
+# Columnas del CSV; en los entrenamientos 'nombre' es el título y 'ejercicios' va separado por SEPARADOR_CSV.
+CAMPOS_CSV = ['tipo', 'nombre', 'descripcion', 'imagen', 'ejercicios']
+SEPARADOR_CSV = '|'
+
+"""
+    Deduce el formato ('jsonl' o 'csv') a partir de la extensión del fichero.
+"""
+def formato_de(ruta):
+    return 'csv' if ruta.lower().endswith('.csv') else 'jsonl'
+
+"""
+    Lee registros de un fichero de texto abierto y los devuelve de uno en uno con la forma
+    {'tipo', 'nombre', 'descripcion', 'imagen', 'ejercicios'}.
+"""
+def leer_registros(fichero, formato):
+    if formato == 'csv':
+        for fila in csv.DictReader(fichero):
+            ejercicios = fila.get('ejercicios') or ''
+            yield _registro(fila, [n for n in ejercicios.split(SEPARADOR_CSV) if n])
+    else:
+        for numero, linea in enumerate(fichero, 1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except ValueError as error:
+                raise ValueError(f"Línea {numero}: JSON no válido ({error})")
+            yield _registro(datos, datos.get('ejercicios') or [])
+
+def _registro(datos, ejercicios):
+    tipo = datos.get('tipo')
+    if tipo not in MODELOS:
+        raise ValueError(f"Tipo de registro desconocido: {tipo!r}")
+    nombre = (datos.get('titulo') if tipo == 'entrenamiento' else None) or datos.get('nombre') or ''
+    if not nombre.strip():
+        raise ValueError(f"Registro de {tipo} sin {CLAVES[tipo]}")
+    return {
+        'tipo': tipo,
+        'nombre': nombre.strip(),
+        'descripcion': datos.get('descripcion') or '',
+        'imagen': datos.get('imagen') or '',
+        'ejercicios': ejercicios,
+    }
+
+"""
+    Importa registros en lotes. Los ejercicios de un lote se guardan siempre antes que los
+    entrenamientos que vienen detrás, para que estos puedan referenciarlos por nombre.
+    'progreso' es una función opcional que recibe (tipo, estadisticas) tras cada lote.
+"""
+class Importador:
+
+    def __init__(self, lote=TAMANO_LOTE, imagenes_zip=None, progreso=None):
+        self.lote = lote
+        self.zip = zipfile.ZipFile(imagenes_zip) if imagenes_zip else None
+        self.progreso = progreso
+        self.estadisticas = {tipo: {'nuevos': 0, 'actualizados': 0} for tipo in MODELOS}
+        self.ejercicios_desconocidos = 0
+        self._imagenes_guardadas = {}  # Nombre en el zip -> nombre en el almacenamiento.
+        self._imagenes_cambiadas = False
+        self._liberar = []  # Imágenes sustituidas: se borran al final si ya nadie las usa.
+
+    def importar(self, registros):
+        pendientes = {tipo: {} for tipo in MODELOS}
+        for registro in registros:
+            tipo = registro['tipo']
+            if tipo == 'entrenamiento' and pendientes['ejercicio']:
+                self._guardar_lote('ejercicio', pendientes['ejercicio'])
+            pendientes[tipo][registro['nombre']] = registro  # Dentro del lote, el último registro gana.
+            if len(pendientes[tipo]) >= self.lote:
+                self._guardar_lote(tipo, pendientes[tipo])
+        for tipo in ('ejercicio', 'entrenamiento'):
+            if pendientes[tipo]:
+                self._guardar_lote(tipo, pendientes[tipo])
+        self._terminar()
+        return self.estadisticas
+
+    def _guardar_lote(self, tipo, registros):
+        modelo, clave = MODELOS[tipo], CLAVES[tipo]
+        miniaturas = []
+        with transaction.atomic():
+            existentes = {}
+            for objeto in (modelo.objects.filter(**{f'{clave}__in': list(registros)})
+                           .only('pk', clave, 'imagen', 'imagen_derivadas').order_by('-pk')):
+                existentes[getattr(objeto, clave)] = objeto  # Si hay duplicados, se queda el más antiguo.
+            nuevos, actualizados = [], []
+            for nombre, registro in registros.items():
+                imagen = self._imagen(registro['imagen'])
+                objeto = existentes.get(nombre)
+                if objeto is None:
+                    objeto = modelo(**{clave: nombre}, descripcion=registro['descripcion'], imagen=imagen)
+                    nuevos.append(objeto)
+                    continue
+                if objeto.imagen.name != imagen:
+                    self._liberar.append((tipo, objeto.imagen.name, objeto.imagen_derivadas))
+                    objeto.imagen, objeto.imagen_derivadas = imagen, {}
+                    self._imagenes_cambiadas = True
+                objeto.descripcion = registro['descripcion']
+                actualizados.append(objeto)
+
+            modelo.objects.bulk_create(nuevos, batch_size=self.lote)
+            ahora = timezone.now()
+            for objeto in actualizados:
+                objeto.actualizado = ahora  # bulk_update no aplica auto_now.
+            modelo.objects.bulk_update(actualizados, ['descripcion', 'imagen', 'imagen_derivadas', 'actualizado'], batch_size=self.lote)
+            if nuevos and nuevos[0].pk is None:  # MySQL no devuelve los ids de bulk_create.
+                ids = dict(modelo.objects.filter(**{f'{clave}__in': [getattr(o, clave) for o in nuevos]})
+                           .order_by('-pk').values_list(clave, 'pk'))
+                for objeto in nuevos:
+                    objeto.pk = ids[getattr(objeto, clave)]
+
+            ids_actualizados = [o.pk for o in actualizados]
+            TerminoBusqueda.objects.filter(modelo=tipo, objeto_id__in=ids_actualizados).delete()
+            busqueda.indexar_lote(nuevos + actualizados)
+            if tipo == 'entrenamiento':
+                self._guardar_ejercicios(nuevos + actualizados, registros, ids_actualizados)
+            for objeto in nuevos + actualizados:
+                if not objeto.imagen_derivadas and not imagenes.es_imagen_por_defecto(objeto.imagen.name):
+                    miniaturas.append(objeto)
+            self._imagenes_cambiadas |= any(not imagenes.es_imagen_por_defecto(o.imagen.name) for o in nuevos)
+
+        if nuevos:
+            sugerencias.invalidar(tipo)
+        tareas.encolar_varios('procesar_imagen', [
+            ({'modelo': tipo, 'id': o.pk, 'imagen': o.imagen.name}, f'procesar_imagen:{tipo}:{o.pk}:{o.imagen.name}')
+            for o in miniaturas
+        ])
+        self.estadisticas[tipo]['nuevos'] += len(nuevos)
+        self.estadisticas[tipo]['actualizados'] += len(actualizados)
+        registros.clear()
+        if self.progreso:
+            self.progreso(tipo, self.estadisticas[tipo])
+
+    """
+        Sustituye los ejercicios de los entrenamientos del lote con una inserción por lotes en la
+        tabla intermedia, en el orden del registro. Los nombres de ejercicio se resuelven con una sola consulta por lote.
+        Actualiza los contadores y encola el recálculo de los similares de los entrenamientos del lote.
+    """
+    def _guardar_ejercicios(self, entrenamientos, registros, ids_actualizados):
+        intermedia = Entrenamiento.ejercicios.through
+        nombres = {n for registro in registros.values() for n in registro['ejercicios']}
+        ids = {}
+        for nombre, pk in Ejercicio.objects.filter(nombre__in=nombres).order_by('-pk').values_list('nombre', 'pk'):
+            ids[nombre] = pk
+        self.ejercicios_desconocidos += len(nombres - ids.keys())
+        anteriores = intermedia.objects.filter(entrenamiento_id__in=ids_actualizados)
+        afectados = set(anteriores.values_list('ejercicio_id', flat=True))
+        anteriores.delete()
+        filas = [
+            intermedia(entrenamiento_id=entrenamiento.pk, ejercicio_id=ids[nombre], posicion=posicion)
+            for entrenamiento in entrenamientos
+            for posicion, nombre in enumerate(n for n in dict.fromkeys(registros[entrenamiento.titulo]['ejercicios']) if n in ids)
+        ]
+        intermedia.objects.bulk_create(filas, batch_size=self.lote, ignore_conflicts=True)
+        contadores.recalcular('num_ejercicios', [e.pk for e in entrenamientos])  # bulk_create no envía m2m_changed.
+        contadores.recalcular('num_entrenamientos', afectados | {fila.ejercicio_id for fila in filas})
+        if entrenamientos:  # Ni delete ni bulk_create envían m2m_changed, que es lo que encola los similares.
+            tareas.encolar('actualizar_similares', {'ids': sorted(e.pk for e in entrenamientos)})
+
+    """
+        Devuelve el nombre en el almacenamiento de la imagen de un registro. Si está en el zip se
+        guarda (el almacenamiento por contenido no duplica las repetidas); si no, se usa tal cual.
+    """
+    def _imagen(self, nombre):
+        if not nombre:
+            return imagenes.IMAGEN_POR_DEFECTO
+        if self.zip is None:
+            return nombre
+        if nombre not in self._imagenes_guardadas:
+            try:
+                miembro = self.zip.open(nombre)
+            except KeyError:
+                self._imagenes_guardadas[nombre] = nombre  # No viene en el zip: ya debe estar en el almacenamiento.
+            else:
+                with miembro:
+                    # Se guarda por el nombre base para que el almacenamiento calcule el hash del contenido.
+                    guardada = Ejercicio._meta.get_field('imagen').storage.save(
+                        os.path.basename(nombre), File(miembro, name=os.path.basename(nombre)),
+                    )
+                self._imagenes_guardadas[nombre] = guardada
+        return self._imagenes_guardadas[nombre]
+
+    """
+        Recalcula los contadores de referencias si han cambiado imágenes y encola el borrado de las sustituidas.
+    """
+    def _terminar(self):
+        if self.zip is not None:
+            self.zip.close()
+        if not self._imagenes_cambiadas:
+            return
+        almacenamiento.recontar_referencias()
+        for tipo, nombre, derivadas in self._liberar:
+            if not imagenes.es_imagen_por_defecto(nombre):
+                nombres = [n for por_ancho in (derivadas or {}).values() for n in por_ancho.values()]
+                tareas.encolar('liberar_fichero', {'modelo': tipo, 'nombre': nombre, 'derivadas': nombres})
+
+"""
+    Devuelve los registros del catálogo de uno en uno: primero los ejercicios y después los
+    entrenamientos con los nombres de sus ejercicios (cargados por lotes con prefetch_related).
+"""
+def registros_catalogo(lote=TAMANO_LOTE):
+    for ejercicio in Ejercicio.objects.only('nombre', 'descripcion', 'imagen').order_by('pk').iterator(chunk_size=lote):
+        yield {'tipo': 'ejercicio', 'nombre': ejercicio.nombre, 'descripcion': ejercicio.descripcion,
+               'imagen': _imagen_exportada(ejercicio.imagen.name)}
+    entrenamientos = (Entrenamiento.objects.only('titulo', 'descripcion', 'imagen').order_by('pk')
+                      .prefetch_related(Prefetch('ejercicios', queryset=Ejercicio.objects.only('nombre').order_by('filas_entrenamientos__posicion', 'pk'))))
+    for entrenamiento in entrenamientos.iterator(chunk_size=lote):
+        yield {'tipo': 'entrenamiento', 'titulo': entrenamiento.titulo, 'descripcion': entrenamiento.descripcion,
+               'imagen': _imagen_exportada(entrenamiento.imagen.name),
+               'ejercicios': [e.nombre for e in entrenamiento.ejercicios.all()]}
+
+def _imagen_exportada(nombre):
+    return '' if imagenes.es_imagen_por_defecto(nombre) else nombre
+
+"""
+    Escribe los registros en un fichero de texto abierto y, si se indica, copia sus imágenes a un zip
+    (una sola vez cada una). Devuelve el número de registros escritos.
+"""
+def exportar(fichero, formato, imagenes_zip=None, lote=TAMANO_LOTE, progreso=None):
+    escritor = None
+    if formato == 'csv':
+        escritor = csv.DictWriter(fichero, fieldnames=CAMPOS_CSV)
+        escritor.writeheader()
+    archivo = zipfile.ZipFile(imagenes_zip, 'w', zipfile.ZIP_STORED) if imagenes_zip else None  # Las imágenes ya van comprimidas.
+    storage = Ejercicio._meta.get_field('imagen').storage
+    escritos = 0
+    try:
+        for registro in registros_catalogo(lote):
+            if archivo is not None and registro['imagen'] and registro['imagen'] not in archivo.NameToInfo:
+                if storage.exists(registro['imagen']):
+                    with storage.open(registro['imagen'], 'rb') as origen, archivo.open(registro['imagen'], 'w') as destino:
+                        shutil.copyfileobj(origen, destino)
+            if escritor is not None:
+                escritor.writerow({
+                    'tipo': registro['tipo'], 'nombre': registro.get('nombre') or registro.get('titulo'),
+                    'descripcion': registro['descripcion'], 'imagen': registro['imagen'],
+                    'ejercicios': SEPARADOR_CSV.join(registro.get('ejercicios', [])),
+                })
+            else:
+                fichero.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            escritos += 1
+            if progreso and escritos % lote == 0:
+                progreso(escritos)
+    finally:
+        if archivo is not None:
+            archivo.close()
+    return escritos
@@ -0,0 +1,58 @@
+import hashlib
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+"""
+    Respuestas HTTP condicionales (ETag) para las páginas del catálogo.
+
+    La vista carga los objetos de la página como siempre y, antes de renderizar, forma el ETag con
+    el id y la fecha de modificación ('actualizado') de cada uno, el estado de la paginación, el
+    usuario y la URL. Si coincide con el que envía el navegador (o el proxy) se responde 304 sin
+    renderizar plantillas: no hace falta ninguna consulta adicional. Un objeto borrado o añadido
+    cambia la lista de ids, así que también cambia el ETag.
+    No se envía Last-Modified: la fecha más reciente de los objetos mostrados no cambia al borrar
+    o reordenar uno, ni al cambiar de usuario, y una petición solo con If-Modified-Since recibiría
+    un 304 con la página antigua.
+    Las páginas cambian según el usuario, así que se marcan como privadas y dependientes de la cookie.
+"""
+
+"""
+    Estado de la navegación de una página (numerada o por cursor), que también se muestra en la plantilla.
+"""
+def estado_paginacion(pagina):
+    if getattr(pagina, 'es_cursor', False):
+        return (pagina.next_cursor, pagina.previous_cursor)
+    return (pagina.number, pagina.paginator.count)
+
+"""
+    Versión (ETag) de una página. Incluye la URL completa (página, búsqueda, pestaña...), el usuario,
+    los objetos mostrados con su fecha de modificación y las partes adicionales indicadas.
+    Si hay mensajes pendientes de mostrar (por ejemplo, tras un formulario incorrecto) la versión
+    cambia, para que no se respondan con un 304 de la página sin ellos.
+"""
+def version(request, objetos, *partes):
+    usuario = request.user
+    identidad = (usuario.pk, usuario.is_staff) if usuario.is_authenticated else None
+    firma = [(objeto.pk, objeto.actualizado) for objeto in objetos]
+    mensajes = len(get_messages(request))  # Contarlos no los marca como leídos.
+    datos = repr((request.get_full_path(), identidad, firma, mensajes) + partes)
+    return quote_etag(hashlib.sha1(datos.encode()).hexdigest())
+
+"""
+    Devuelve la respuesta 304 si el cliente ya tiene esta versión de la página, o None.
+"""
+def no_modificada(request, etag):
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is not None:
+        anotar(respuesta, etag)
+    return respuesta
+
+"""
+    Añade a la respuesta la cabecera de validación y las de caché privada.
+"""
+def anotar(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)  # Se guarda, pero siempre se revalida.
+    patch_vary_headers(response, ['Cookie'])
+    return response
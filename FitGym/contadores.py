@@ -0,0 +1,87 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Ejercicio, Entrenamiento
+
+"""
+    Contadores desnormalizados: número de ejercicios y de apuntados de los entrenamientos y número
+    de entrenamientos de los ejercicios.
+
+    Se guardan en columnas del modelo para poder mostrarlos en las tarjetas y ordenar por
+    popularidad sin contar en cada lectura. Las señales m2m_changed los mantienen con UPDATE
+    atómicos: al añadir se suma con F() el número de filas insertadas; al quitar se recalcula
+    con una subconsulta, porque Django avisa de los ids pedidos aunque no estuvieran en la relación.
+    El comando 'recalcular_contadores' los repara en bloque si alguna vez se desincronizan.
+"""
+
+TAMANO_LOTE = 5000  # Objetos recalculados por UPDATE en la reparación.
+VISIBLES = ('num_ejercicios', 'num_apuntados')  # Contadores que se muestran en las tarjetas.
+
+"""
+    Devuelve, para cada contador, el modelo que lo guarda, la tabla intermedia que cuenta y la
+    columna de esa tabla que apunta al modelo.
+"""
+def tablas():
+    return {
+        'num_ejercicios': (Entrenamiento, Entrenamiento.ejercicios.through, 'entrenamiento_id'),
+        'num_apuntados': (Entrenamiento, Entrenamiento.apuntados.through, 'entrenamiento_id'),
+        'num_entrenamientos': (Ejercicio, Entrenamiento.ejercicios.through, 'ejercicio_id'),
+    }
+
+"""
+    Actualiza con un único UPDATE el contador de los objetos indicados. Si el contador se muestra en
+    las tarjetas, renueva en el mismo UPDATE su fecha de modificación, que forma parte de la clave de sus tarjetas en caché.
+"""
+def _actualizar(campo, ids, valor):
+    modelo = tablas()[campo][0]
+    cambios = {campo: valor}
+    if campo in VISIBLES:
+        cambios['actualizado'] = timezone.now()
+    modelo.objects.filter(pk__in=ids).update(**cambios)
+
+"""
+    Suma 'cantidad' (puede ser negativa) al contador de los objetos indicados con un único UPDATE.
+"""
+def sumar(campo, ids, cantidad=1):
+    ids = list(ids)
+    if not ids or not cantidad:
+        return
+    _actualizar(campo, ids, F(campo) + cantidad)
+
+"""
+    Subconsulta que cuenta las filas de la tabla intermedia de un contador para cada objeto.
+"""
+def _subconsulta(campo):
+    _, intermedia, columna = tablas()[campo]
+    cuenta = (intermedia.objects.filter(**{columna: OuterRef('pk')})
+              .order_by().values(columna).annotate(n=Count('*')).values('n'))
+    return Coalesce(Subquery(cuenta, output_field=IntegerField()), Value(0))
+
+"""
+    Recalcula desde la tabla intermedia el contador de los objetos indicados con un único UPDATE.
+"""
+def recalcular(campo, ids):
+    ids = list(ids)
+    if not ids:
+        return
+    _actualizar(campo, ids, _subconsulta(campo))
+
+"""
+    Repara todos los contadores por rangos de ids. Solo escribe las filas cuyo valor era incorrecto
+    (así no cambia la fecha de modificación de las demás) y devuelve cuántas ha corregido.
+"""
+def reparar(campos=None):
+    corregidos = 0
+    for campo in campos or tablas():
+        modelo = tablas()[campo][0]
+        inicio = 0
+        while True:
+            ids = list(modelo.objects.filter(pk__gt=inicio).order_by('pk').values_list('pk', flat=True)[:TAMANO_LOTE])
+            if not ids:
+                break
+            erroneos = list(modelo.objects.filter(pk__in=ids).annotate(correcto=_subconsulta(campo))
+                            .exclude(**{campo: F('correcto')}).values_list('pk', flat=True))
+            recalcular(campo, erroneos)
+            corregidos += len(erroneos)
+            inicio = ids[-1]
+    return corregidos
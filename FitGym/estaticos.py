@@ -0,0 +1,101 @@
+import gzip
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se generan las versiones .gz.
+    brotli = None
+
+"""
+    Ficheros estáticos con el hash del contenido en el nombre y versiones precomprimidas.
+
+    'collectstatic' guarda cada fichero como 'nombre.<hash>.ext' (ManifestStaticFilesStorage) y,
+    para los de texto, una copia '.gz' y otra '.br' (si está instalado brotli) comprimidas al máximo
+    una sola vez. Como el nombre cambia cuando cambia el contenido, los navegadores pueden guardarlos
+    un año sin revalidar. Los sirve el servidor web (p. ej. nginx con gzip_static/brotli_static) o,
+    si no hay uno delante, la vista 'servir' con SERVIR_ESTATICOS = True.
+"""
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot')
+TAMANO_MINIMO = 512  # Bytes: por debajo la compresión no compensa las cabeceras.
+AHORRO_MINIMO = 0.95  # Solo se guarda la versión comprimida si ocupa menos del 95 % del original.
+MAX_AGE_HASH = 60 * 60 * 24 * 365  # Un año para los ficheros con hash en el nombre.
+MAX_AGE_SIN_HASH = 60 * 5
+PATRON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')  # 'styles.3f2a9c0d1b4e.css'
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))  # Por orden de preferencia.
+
+"""
+    Comprime un contenido con gzip (sin fecha, para que el resultado sea reproducible) y con brotli.
+    Devuelve {extensión: bytes} solo con las versiones que merecen la pena.
+"""
+def comprimir(contenido):
+    versiones = {'.gz': gzip.compress(contenido, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        versiones['.br'] = brotli.compress(contenido, quality=11)
+    return {ext: datos for ext, datos in versiones.items() if len(datos) < len(contenido) * AHORRO_MINIMO}
+
+"""
+    Almacenamiento de estáticos con manifiesto de hashes que además genera las versiones .gz y .br.
+"""
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        nombres = set(paths) | set(self.hashed_files.values())  # Originales y copias con hash.
+        for nombre in sorted(nombres):
+            if not nombre.endswith(EXTENSIONES_COMPRIMIBLES) or not self.exists(nombre):
+                continue
+            with self.open(nombre) as fichero:
+                contenido = fichero.read()
+            if len(contenido) < TAMANO_MINIMO:
+                continue
+            for extension, datos in comprimir(contenido).items():
+                comprimido = nombre + extension
+                if self.exists(comprimido):
+                    self.delete(comprimido)
+                self._save(comprimido, ContentFile(datos))
+                yield comprimido, comprimido, True
+
+"""
+    Vista para servir los estáticos recogidos en STATIC_ROOT cuando no hay servidor web delante.
+    Elige la versión precomprimida según Accept-Encoding y marca como inmutables durante un año
+    los ficheros con hash en el nombre.
+"""
+@require_safe
+def servir(request, ruta):
+    try:
+        original = safe_join(settings.STATIC_ROOT, ruta)
+    except SuspiciousFileOperation:
+        raise Http404("Ruta no válida")
+    if not os.path.isfile(original):
+        raise Http404("Fichero no encontrado")
+
+    aceptadas = {c.split(';')[0].strip() for c in request.headers.get('Accept-Encoding', '').split(',')}
+    camino, codificacion = original, None
+    for nombre, extension in CODIFICACIONES:
+        if nombre in aceptadas and os.path.isfile(original + extension):
+            camino, codificacion = original + extension, nombre
+            break
+
+    tipo, _ = mimetypes.guess_type(original)
+    response = FileResponse(open(camino, 'rb'), content_type=tipo or 'application/octet-stream')
+    if codificacion:
+        response['Content-Encoding'] = codificacion
+    if PATRON_HASH.search(ruta):
+        response['Cache-Control'] = f'public, max-age={MAX_AGE_HASH}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={MAX_AGE_SIN_HASH}'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
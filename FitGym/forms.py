@@ -2,7 +2,31 @@ import re
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Entrenamiento, Ejercicio
+from . import rutinas
+from .models import Entrenamiento, Ejercicio, EntrenamientoEjercicio
+
+MAX_EJERCICIOS_ENTRENAMIENTO = 200  # Ejercicios que se pueden elegir como máximo en un entrenamiento.
+PRESCRIPCION = ('series', 'repeticiones', 'descanso')  # Campos de cada ejercicio: se envían como '<campo>_<id del ejercicio>'.
+CAMPO_PRESCRIPCION = forms.IntegerField(min_value=0, max_value=32767, required=False)  # Valida cada valor de la prescripción.
+
+"""
+    Campo para elegir ejercicios sin cargar el catálogo entero.
+    El formulario solo envía los ids elegidos (el selector los busca en la API de ejercicios) y se
+    validan todos con una única consulta IN; el widget oculto nunca recorre la tabla de ejercicios.
+    Devuelve los ejercicios en el orden en que se enviaron.
+"""
+class CampoEjercicios(forms.ModelMultipleChoiceField):
+    widget = forms.MultipleHiddenInput
+
+    def __init__(self, queryset=None, **kwargs):
+        queryset = Ejercicio.objects.all() if queryset is None else queryset
+        super().__init__(queryset.only('id', 'nombre').order_by('nombre', 'id'), **kwargs)  # Solo lo que muestra el selector.
+
+    def clean(self, value):
+        if value and len(set(value)) > MAX_EJERCICIOS_ENTRENAMIENTO:
+            raise forms.ValidationError(f"Como máximo se pueden elegir {MAX_EJERCICIOS_ENTRENAMIENTO} ejercicios.")
+        por_id = {str(ejercicio.pk): ejercicio for ejercicio in super().clean(value)}
+        return [por_id[i] for i in dict.fromkeys(str(v) for v in value or []) if i in por_id]
 
 """
     Formulario para crear o editar un objeto Entrenamiento.
@@ -12,6 +36,52 @@ class EntrenamientoForm(forms.ModelForm):
     class Meta:
         model = Entrenamiento  # Especifica que este formulario está basado en el modelo Entrenamiento.
         fields = "__all__"  # Incluye todos los campos del modelo Entrenamiento en el formulario.
+        field_classes = {'ejercicios': CampoEjercicios}  # Selector paginado en lugar de una opción por ejercicio.
+
+    """
+        Convierte los ejercicios elegidos en filas ordenadas (EntrenamientoEjercicio sin guardar)
+        con la prescripción enviada para cada uno.
+    """
+    def clean_ejercicios(self):
+        filas = []
+        for posicion, ejercicio in enumerate(self.cleaned_data['ejercicios']):
+            fila = EntrenamientoEjercicio(ejercicio=ejercicio, posicion=posicion)
+            for campo in PRESCRIPCION:
+                try:
+                    setattr(fila, campo, CAMPO_PRESCRIPCION.clean(self.data.get(f'{campo}_{ejercicio.pk}')))
+                except forms.ValidationError as error:
+                    raise forms.ValidationError(f"{ejercicio.nombre} ({campo}): {' '.join(error.messages)}")
+            filas.append(fila)
+        return filas
+
+    """
+        Ejercicios elegidos para mostrarlos en el selector, en orden y con su prescripción: los del
+        entrenamiento al editar o, si el formulario se ha enviado, los enviados (ya validados si el campo es válido).
+    """
+    def ejercicios_elegidos(self):
+        if not self.is_bound:
+            if self.instance.pk is None:
+                return []
+            return list(rutinas.ejercicios_ordenados(self.instance.pk).only(*PRESCRIPCION, 'ejercicio', 'ejercicio__nombre'))
+        if 'ejercicios' in getattr(self, 'cleaned_data', {}):
+            return self.cleaned_data['ejercicios']
+        ids = list(dict.fromkeys(i for i in self.data.getlist('ejercicios') if i.isdigit()))[:MAX_EJERCICIOS_ENTRENAMIENTO]
+        por_id = {str(e.pk): e for e in self.fields['ejercicios'].queryset.filter(pk__in=ids)}
+        return [EntrenamientoEjercicio(ejercicio=por_id[i], **{campo: self.data.get(f'{campo}_{i}') or None for campo in PRESCRIPCION})
+                for i in ids if i in por_id]  # Se conservan los valores enviados aunque no sean válidos.
+
+    """
+        Guarda los ejercicios con rutinas.guardar (solo escribe las filas que cambian) en lugar de con .set().
+    """
+    def _save_m2m(self):
+        filas = self.cleaned_data.pop('ejercicios', None)
+        try:
+            super()._save_m2m()
+        finally:
+            if filas is not None:
+                self.cleaned_data['ejercicios'] = filas
+        if filas is not None:
+            rutinas.guardar(self.instance, [(f.ejercicio.pk, f.series, f.repeticiones, f.descanso) for f in filas])
 
 """
     Formulario para crear o editar un objeto Ejercicio.
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+"""
+    Caché de fragmentos HTML para las tarjetas del catálogo.
+
+    Cada tarjeta se guarda con una clave formada por el modelo, el id, la fecha de modificación
+    del objeto ('actualizado') y la variante (las tarjetas cambian según el usuario sea staff o esté
+    apuntado). Todo lo que cambia una tarjeta (guardar, contadores, lista de ejercicios, miniaturas,
+    importación) renueva 'actualizado', y la fecha se lee de la base de datos con el propio objeto:
+    así cada proceso deja de usar las tarjetas antiguas aunque la caché no sea compartida, sin
+    buscarlas ni borrarlas.
+"""
+
+PREFIJO = 'fitgym:fragmento'
+CLAVE_ACIERTOS = f'{PREFIJO}:aciertos'
+CLAVE_FALLOS = f'{PREFIJO}:fallos'
+
+"""
+    Devuelve el tiempo de vida de los fragmentos, configurable con CACHE_FRAGMENTOS_TIMEOUT.
+"""
+def _timeout():
+    return getattr(settings, 'CACHE_FRAGMENTOS_TIMEOUT', 60 * 60 * 24)
+
+"""
+    Versión de la tarjeta de un objeto: su fecha de modificación en microsegundos.
+"""
+def _version(objeto):
+    return int(objeto.actualizado.timestamp() * 1000000) if objeto.actualizado else 0
+
+"""
+    Suma aciertos y fallos a los contadores de la caché de fragmentos.
+"""
+def _contar(clave, cantidad):
+    if not cantidad:
+        return
+    try:
+        cache.incr(clave, cantidad)
+    except ValueError:  # El contador todavía no existe.
+        cache.add(clave, 0, None)
+        cache.incr(clave, cantidad)
+
+"""
+    Devuelve los contadores de aciertos y fallos de la caché de fragmentos.
+"""
+def estadisticas():
+    valores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos, fallos = valores.get(CLAVE_ACIERTOS, 0), valores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {'aciertos': aciertos, 'fallos': fallos, 'ratio': aciertos / total if total else 0.0}
+
+"""
+    Pone a cero los contadores de aciertos y fallos.
+"""
+def reiniciar_estadisticas():
+    cache.delete_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+
+"""
+    Devuelve el HTML de las tarjetas de una lista de objetos, en el mismo orden.
+    Los fragmentos se leen de la caché con un único get_many y solo se renderizan los que faltan,
+    que se guardan después con un único set_many.
+
+    'variante' es una función que recibe el objeto y devuelve un texto que identifica su
+    variante (por ejemplo 'staff' o 'apuntado'); 'contexto' es una función que devuelve el
+    contexto con el que se renderiza la plantilla en caso de fallo.
+"""
+def renderizar_tarjetas(objetos, plantilla, variante, contexto):
+    if not objetos:
+        return []
+    modelo = objetos[0]._meta.model_name
+    claves = [f'{PREFIJO}:{modelo}:{o.pk}:{_version(o)}:{variante(o)}' for o in objetos]
+    guardados = cache.get_many(claves)
+
+    tarjetas, nuevos = [], {}
+    for objeto, clave in zip(objetos, claves):
+        html = guardados.get(clave)
+        if html is None:
+            html = nuevos[clave] = render_to_string(plantilla, contexto(objeto))
+        tarjetas.append(mark_safe(html))
+    if nuevos:
+        cache.set_many(nuevos, _timeout())
+
+    _contar(CLAVE_ACIERTOS, len(objetos) - len(nuevos))
+    _contar(CLAVE_FALLOS, len(nuevos))
+    return tarjetas
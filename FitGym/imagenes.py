@@ -0,0 +1,109 @@
+import io
+import os
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import features, Image, UnidentifiedImageError
+
+"""
+    Generación de imágenes derivadas (miniaturas) para ejercicios y entrenamientos.
+
+    Por cada imagen subida se crean versiones redimensionadas en WebP (y en AVIF si Pillow lo
+    soporta) para los tamaños de tarjeta, tarjeta en pantallas retina y detalle. Las derivadas
+    se guardan junto a la original ('<hash>.jpg' -> '<hash>.256w.webp') y sus nombres se anotan en
+    el campo 'imagen_derivadas' del objeto para construir el srcset sin tocar el disco.
+"""
+
+# Anchos generados: tarjeta (w-64 = 256px), tarjeta en pantallas retina y página de detalle.
+ANCHOS = {'tarjeta': 256, 'retina': 512, 'detalle': 1024}
+
+# Formatos generados con su calidad, del más eficiente al más compatible.
+FORMATOS = {'avif': 50, 'webp': 80}
+
+# Imagen por defecto de los modelos; nunca se generan ni se borran derivadas suyas.
+IMAGEN_POR_DEFECTO = 'static/private-files/ImagenDefault.webp'
+
+"""
+    Devuelve los formatos que el Pillow instalado es capaz de escribir.
+"""
+def formatos_disponibles():
+    return [formato for formato in FORMATOS if features.check(formato)]
+
+"""
+    Nombre de la derivada de una imagen para un ancho y un formato.
+"""
+def nombre_derivada(nombre, ancho, formato):
+    base, _ = os.path.splitext(nombre)
+    return f"{base}.{ancho}w.{formato}"
+
+"""
+    Indica si una imagen es la imagen por defecto o está vacía.
+"""
+def es_imagen_por_defecto(nombre):
+    return not nombre or nombre == IMAGEN_POR_DEFECTO
+
+"""
+    Genera las derivadas de una imagen guardada en 'storage' y devuelve un diccionario
+    {formato: {ancho: nombre}}. No amplía imágenes: si la original es más estrecha que un
+    tamaño, ese tamaño se omite (aunque siempre se genera al menos una derivada).
+    Si el fichero no es una imagen válida devuelve un diccionario vacío.
+"""
+def generar_derivadas(storage, nombre):
+    if es_imagen_por_defecto(nombre):
+        return {}
+    try:
+        with storage.open(nombre, 'rb') as fichero:
+            original = Image.open(fichero)
+            original.load()
+    except (OSError, UnidentifiedImageError, ValueError):
+        return {}
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() or 'transparency' in original.info else 'RGB')
+    anchos = sorted({min(ancho, original.width) for ancho in ANCHOS.values()})
+
+    derivadas = {}
+    for formato in formatos_disponibles():
+        derivadas[formato] = {}
+        for ancho in anchos:
+            destino = nombre_derivada(nombre, ancho, formato)
+            if storage.exists(destino):
+                if getattr(storage, 'contenido_inmutable', False):  # Ya generada para esta misma imagen: se reutiliza.
+                    derivadas[formato][str(ancho)] = destino
+                    continue
+                storage.delete(destino)  # Se sobrescribe en lugar de crear un nombre con sufijo.
+            alto = max(1, round(original.height * ancho / original.width))
+            copia = original if ancho == original.width else original.resize((ancho, alto), Image.LANCZOS)
+            contenido = io.BytesIO()
+            copia.save(contenido, format=formato.upper(), quality=FORMATOS[formato])
+            derivadas[formato][str(ancho)] = storage.save(destino, ContentFile(contenido.getvalue()))
+    return derivadas
+
+"""
+    Borra del almacenamiento las derivadas anotadas en un diccionario {formato: {ancho: nombre}}.
+"""
+def eliminar_derivadas(storage, derivadas):
+    for por_ancho in (derivadas or {}).values():
+        for nombre in por_ancho.values():
+            storage.delete(nombre)
+
+"""
+    Genera las derivadas de la imagen de un objeto y las anota en 'imagen_derivadas'.
+    Se guarda con update() para no volver a disparar las señales de post_save; la nueva fecha de
+    modificación hace que sus tarjetas en caché dejen de usarse. Las derivadas de una imagen anterior no se borran
+    aquí: pueden compartirlas otros objetos y se liberan con su original (ver FitGym.almacenamiento).
+"""
+def procesar_imagen(objeto):
+    storage = objeto.imagen.storage
+    derivadas = generar_derivadas(storage, objeto.imagen.name)
+    objeto.imagen_derivadas = derivadas
+    objeto.actualizado = timezone.now()  # El srcset de sus páginas cambia.
+    type(objeto).objects.filter(pk=objeto.pk).update(imagen_derivadas=derivadas, actualizado=objeto.actualizado)
+    return derivadas
+
+"""
+    Construye el valor de un atributo srcset a partir de las derivadas de un formato.
+"""
+def srcset(objeto, formato):
+    por_ancho = (objeto.imagen_derivadas or {}).get(formato) or {}
+    storage = objeto.imagen.storage
+    return ', '.join(f"{storage.url(nombre)} {ancho}w" for ancho, nombre in sorted(por_ancho.items(), key=lambda p: int(p[0])))
@@ -0,0 +1,202 @@
+import contextvars
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal, receiver
+from django.template import base as plantillas
+
+"""
+    Instrumentación por petición: consultas SQL, consultas duplicadas, tiempo en la base de datos,
+    tiempo renderizando plantillas y latencia total, agrupados por nombre de URL.
+
+    Cada conexión lleva un execute_wrapper permanente y Template.render un envoltorio (instalados al
+    importar el módulo) que apuntan en las métricas de la petición en curso, guardadas en un contextvar.
+    Así también se cuentan las consultas de las vistas asíncronas, que el ORM ejecuta en otro hilo
+    (sync_to_async copia el contexto). De las plantillas solo se mide el nivel más externo (los
+    {% include %} ya están dentro de su plantilla padre). Con INSTRUMENTACION_CABECERAS
+    (por defecto igual a DEBUG) las métricas se añaden a la respuesta como cabeceras X-FitGym-*
+    y Server-Timing; si no, se escriben en una línea del logger 'FitGym.instrumentacion'.
+    Al terminar cada petición se envía la señal 'peticion_medida', que usan las pruebas para
+    comprobar el presupuesto de consultas de cada vista.
+"""
+
+logger = logging.getLogger(__name__)
+
+peticion_medida = Signal()  # Argumentos: request, metricas.
+
+_metricas_actuales = contextvars.ContextVar('metricas_actuales', default=())  # Medidas en curso (pueden anidarse).
+
+"""
+    Métricas de una petición.
+"""
+class Metricas:
+
+    def __init__(self):
+        self.consultas = 0
+        self.sentencias = {}  # SQL (sin parámetros) -> número de ejecuciones.
+        self.tiempo_bd = 0.0
+        self.tiempo_plantillas = 0.0
+        self.tiempo_total = 0.0
+        self.profundidad_plantillas = 0  # Plantillas anidadas en curso (solo se mide la exterior).
+
+    """
+        Número de consultas que repiten una sentencia ya ejecutada en la petición (síntoma de N+1).
+    """
+    @property
+    def duplicadas(self):
+        return sum(veces - 1 for veces in self.sentencias.values())
+
+    def anotar_consulta(self, sql, segundos):
+        self.tiempo_bd += segundos
+        self.consultas += 1
+        self.sentencias[sql] = self.sentencias.get(sql, 0) + 1
+
+    def como_diccionario(self):
+        return {
+            'consultas': self.consultas,
+            'duplicadas': self.duplicadas,
+            'bd_ms': round(self.tiempo_bd * 1000, 2),
+            'plantillas_ms': round(self.tiempo_plantillas * 1000, 2),
+            'total_ms': round(self.tiempo_total * 1000, 2),
+        }
+
+"""
+    execute_wrapper de todas las conexiones: cronometra cada consulta si hay una petición medida en curso.
+"""
+def _ejecutar_medido(execute, sql, params, many, context):
+    medidas = _metricas_actuales.get()
+    if not medidas:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        segundos = time.perf_counter() - inicio
+        for metricas in medidas:
+            metricas.anotar_consulta(sql, segundos)
+
+"""
+    Añade el envoltorio a una conexión si todavía no lo tiene.
+"""
+def _instrumentar(conexion):
+    if _ejecutar_medido not in conexion.execute_wrappers:
+        conexion.execute_wrappers.append(_ejecutar_medido)
+
+@receiver(connection_created)
+def instrumentar_conexion(sender, connection, **kwargs):
+    _instrumentar(connection)
+
+_render_original = plantillas.Template.render
+
+"""
+    Sustituye a Template.render para sumar el tiempo de renderizado a la petición en curso.
+"""
+def _render_medido(self, context):
+    medidas = _metricas_actuales.get()
+    if not medidas:
+        return _render_original(self, context)
+    for metricas in medidas:
+        metricas.profundidad_plantillas += 1
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context)
+    finally:
+        segundos = time.perf_counter() - inicio
+        for metricas in medidas:
+            metricas.profundidad_plantillas -= 1
+            if not metricas.profundidad_plantillas:
+                metricas.tiempo_plantillas += segundos
+
+plantillas.Template.render = _render_medido  # Fuera de una petición medida solo añade una lectura del contextvar.
+
+"""
+    Empieza a medir en el contexto actual. Las conexiones de este hilo abiertas antes de importar el
+    módulo no han pasado por connection_created, así que se instrumentan aquí.
+"""
+def _empezar():
+    for alias in connections:
+        _instrumentar(connections[alias])
+    metricas = Metricas()
+    return metricas, _metricas_actuales.set(_metricas_actuales.get() + (metricas,)), time.perf_counter()
+
+def _terminar(metricas, token, inicio):
+    metricas.tiempo_total = time.perf_counter() - inicio
+    _metricas_actuales.reset(token)
+
+"""
+    Ejecuta 'funcion' midiendo sus consultas y plantillas y devuelve (resultado, metricas).
+"""
+def medir(funcion, *args, **kwargs):
+    metricas, token, inicio = _empezar()
+    try:
+        resultado = funcion(*args, **kwargs)
+    finally:
+        _terminar(metricas, token, inicio)
+    return resultado, metricas
+
+"""
+    Versión asíncrona de medir: espera a la corrutina 'funcion' y devuelve (resultado, metricas).
+"""
+async def amedir(funcion, *args, **kwargs):
+    metricas, token, inicio = _empezar()
+    try:
+        resultado = await funcion(*args, **kwargs)
+    finally:
+        _terminar(metricas, token, inicio)
+    return resultado, metricas
+
+"""
+    Nombre de la URL que ha atendido la petición ('-' si no se ha resuelto, p. ej. un 404).
+"""
+def nombre_url(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return '-'
+    return coincidencia.view_name or coincidencia._func_path
+
+"""
+    Middleware que mide cada petición. Debe ir el primero de MIDDLEWARE para incluir las consultas
+    de sesión y autenticación. En las respuestas en streaming solo se mide hasta que la vista
+    devuelve la respuesta, no el envío del contenido. Funciona en modo síncrono y asíncrono, para
+    no obligar a Django a pasar las vistas asíncronas a un hilo bajo ASGI.
+"""
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        response, metricas = medir(self.get_response, request)
+        return self.publicar(request, response, metricas)
+
+    async def __acall__(self, request):
+        response, metricas = await amedir(self.get_response, request)
+        return self.publicar(request, response, metricas)
+
+    def publicar(self, request, response, metricas):
+        vista = nombre_url(request)
+        datos = metricas.como_diccionario()
+        if getattr(settings, 'INSTRUMENTACION_CABECERAS', settings.DEBUG):
+            response['X-FitGym-Vista'] = vista
+            response['X-FitGym-Consultas'] = str(datos['consultas'])
+            response['X-FitGym-Consultas-Duplicadas'] = str(datos['duplicadas'])
+            response['Server-Timing'] = (f"bd;dur={datos['bd_ms']}, plantillas;dur={datos['plantillas_ms']}, "
+                                         f"total;dur={datos['total_ms']}")
+        else:
+            logger.info(
+                'vista=%s metodo=%s estado=%s consultas=%d duplicadas=%d bd_ms=%.2f plantillas_ms=%.2f total_ms=%.2f',
+                vista, request.method, response.status_code, datos['consultas'], datos['duplicadas'],
+                datos['bd_ms'], datos['plantillas_ms'], datos['total_ms'],
+            )
+        peticion_medida.send(sender=self.__class__, request=request, metricas=metricas)
+        return response
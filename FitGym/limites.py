@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+"""
+    Límites de intentos para las vistas que calculan hashes de contraseñas (inicio de sesión y registro).
+
+    Cada hash PBKDF2 ocupa un núcleo durante decenas de milisegundos, así que una ráfaga de intentos
+    (relleno de credenciales) puede dejar sin CPU al resto de vistas. Para evitarlo:
+    - cada POST consume una ficha de dos cubetas guardadas en la caché, una por IP y otra por nombre
+      de usuario (LIMITE_INTENTOS_IP y LIMITE_INTENTOS_USUARIO). Sin fichas, la petición recibe un 429
+      antes de leer el formulario o calcular ningún hash;
+    - con HASH_HILOS los hashes se calculan en un grupo de hilos acotado y, si ya hay HASH_COLA
+      esperando, la petición recibe un 503 en lugar de encolarse.
+    La IP es REMOTE_ADDR: detrás de un proxy, este debe ponerla a partir de X-Forwarded-For.
+"""
+
+PREFIJO_LIMITE = 'fitgym:limite:'
+
+"""
+    Excepción que se lanza cuando el grupo de hilos de hash está lleno.
+"""
+class Saturado(Exception):
+    pass
+
+"""
+    Consume una ficha de la cubeta 'clave', que guarda hasta 'capacidad' fichas y recupera
+    'por_minuto' fichas cada minuto. Devuelve 0 si había ficha, o los segundos que faltan para la siguiente.
+    Leer y escribir la caché no es atómico: con peticiones simultáneas se puede colar algún intento de más.
+"""
+def consumir(clave, capacidad, por_minuto):
+    ahora = time.time()
+    fichas, instante = cache.get(clave, (capacidad, ahora))
+    fichas = min(capacidad, fichas + (ahora - instante) * por_minuto / 60)
+    if fichas < 1:
+        return (1 - fichas) * 60 / por_minuto
+    llena = math.ceil(capacidad * 60 / por_minuto)  # Pasado este tiempo la cubeta vuelve a estar llena y sobra.
+    cache.set(clave, (fichas - 1, ahora), llena)
+    return 0
+
+"""
+    Claves de las cubetas de una petición: la de su IP y, si el formulario trae nombre de usuario,
+    la de ese usuario (en minúsculas y con hash, para que sirva como clave de cualquier caché).
+"""
+def cubetas(request, vista):
+    claves = [(PREFIJO_LIMITE + f"{vista}:ip:{request.META.get('REMOTE_ADDR', '')}", settings.LIMITE_INTENTOS_IP)]
+    usuario = request.POST.get('username', '').strip().lower()
+    if usuario:
+        huella = hashlib.sha256(usuario.encode()).hexdigest()[:32]
+        claves.append((PREFIJO_LIMITE + f"{vista}:usuario:{huella}", settings.LIMITE_INTENTOS_USUARIO))
+    return claves
+
+"""
+    Respuesta mínima para los intentos rechazados: sin plantilla, sesión ni consultas.
+"""
+def rechazo(estado, segundos):
+    response = HttpResponse("Demasiados intentos, inténtelo de nuevo más tarde.", status=estado, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(segundos)))
+    return response
+
+"""
+    Decorador de vista que limita los POST por IP y por nombre de usuario, y responde 503 si
+    el grupo de hilos de hash está lleno. Los GET no consumen fichas.
+"""
+def limitar_intentos(vista):
+    @functools.wraps(vista)
+    def envoltorio(request, *args, **kwargs):
+        if request.method == 'POST':
+            for clave, (capacidad, por_minuto) in cubetas(request, vista.__name__):
+                espera = consumir(clave, capacidad, por_minuto)
+                if espera:
+                    return rechazo(429, espera)
+        try:
+            return vista(request, *args, **kwargs)
+        except Saturado:
+            return rechazo(503, 1)
+    return envoltorio
+
+_grupo = None
+_plazas = None
+_cerrojo = threading.Lock()
+
+"""
+    Grupo de hilos de hash del proceso, creado la primera vez que se usa.
+"""
+def grupo_hash():
+    global _grupo, _plazas
+    with _cerrojo:
+        if _grupo is None:
+            _grupo = ThreadPoolExecutor(max_workers=settings.HASH_HILOS, thread_name_prefix='fitgym-hash')
+            _plazas = threading.BoundedSemaphore(settings.HASH_HILOS + settings.HASH_COLA)
+    return _grupo, _plazas
+
+"""
+    Ejecuta una función que calcula hashes de contraseñas. Sin HASH_HILOS se ejecuta en el propio hilo;
+    con HASH_HILOS, en el grupo de hilos acotado, esperando el resultado. Lanza Saturado si ya hay
+    HASH_HILOS + HASH_COLA hashes en curso o esperando. La función no debe consultar la base de datos.
+"""
+def hashear(funcion, *args, **kwargs):
+    if not settings.HASH_HILOS:
+        return funcion(*args, **kwargs)
+    grupo, plazas = grupo_hash()
+    if not plazas.acquire(blocking=False):
+        raise Saturado
+    try:
+        return grupo.submit(_en_hilo, funcion, *args, **kwargs).result()
+    finally:
+        plazas.release()
+
+def _en_hilo(funcion, *args, **kwargs):
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        close_old_connections()  # Por si la función abrió una conexión en este hilo.
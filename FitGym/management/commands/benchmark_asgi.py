@@ -0,0 +1,196 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from FitGym.management.commands.benchmark_vistas import percentil
+from FitGym.models import Entrenamiento
+
+"""
+    Comando que compara las vistas síncronas con sus versiones asíncronas (FitGym/vistas_async.py)
+    servidas por uvicorn con muchas conexiones a la vez y, opcionalmente, clientes lentos que envían
+    la petición y leen la respuesta poco a poco (como un móvil con mala cobertura).
+
+    Arranca uvicorn en un subproceso con Proyecto-IDP/asgi.py, que debe usar la misma base de datos
+    que este comando (no sirve SQLite en memoria), y lanza las peticiones con asyncio y sockets, sin
+    dependencias adicionales. Escribe en JSON la latencia (p50/p95/p99), las peticiones por segundo,
+    los errores y las consultas por petición (de la cabecera X-FitGym-Consultas, si está activada).
+    Requiere uvicorn: pip install uvicorn
+    Uso: python manage.py benchmark_asgi --peticiones 500 --concurrencia 200 --lento 20 --usuario socio
+"""
+class Command(BaseCommand):
+    help = "Compara las vistas síncronas y asíncronas bajo uvicorn con alta concurrencia y clientes lentos."
+
+    PAREJAS = (  # (vista síncrona, vista asíncrona, necesita un entrenamiento)
+        ('entrenamientos', 'entrenamientos_async', False),
+        ('ejercicios', 'ejercicios_async', False),
+        ('detalles_entrenamiento', 'detalles_entrenamiento_async', True),
+        ('entrenamientos_apuntados', 'entrenamientos_apuntados_async', False),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=500, help="Peticiones por vista.")
+        parser.add_argument('--concurrencia', type=int, default=100, help="Conexiones abiertas a la vez.")
+        parser.add_argument('--lento', type=int, default=0, help="Milisegundos de espera entre cada trozo enviado o leído (0 = cliente rápido).")
+        parser.add_argument('--trozo', type=int, default=1024, help="Bytes leídos de cada vez por los clientes lentos.")
+        parser.add_argument('--workers', type=int, default=1, help="Procesos de uvicorn.")
+        parser.add_argument('--puerto', type=int, default=8765, help="Puerto en el que escucha uvicorn.")
+        parser.add_argument('--usuario', help="Usuario para las vistas con login (sin él, esas vistas redirigen).")
+        parser.add_argument('--salida', help="Fichero JSON donde guardar el resultado (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("Este comando necesita uvicorn: pip install uvicorn")
+        self.opciones = options
+        self.cookie = self.sesion(options['usuario'])
+        rutas = self.rutas()
+
+        servidor = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'Proyecto-IDP.asgi:application', '--host', '127.0.0.1',
+             '--port', str(options['puerto']), '--workers', str(options['workers']), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Proyecto-IDP.settings')},
+        )
+        try:
+            self.esperar_servidor(options['puerto'])
+            resultados = asyncio.run(self.medir_todas(rutas))
+        finally:
+            servidor.terminate()
+            servidor.wait(timeout=10)
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'peticiones': options['peticiones'],
+            'concurrencia': options['concurrencia'],
+            'lento_ms': options['lento'],
+            'workers': options['workers'],
+            'vistas': resultados,
+        }
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                fichero.write(texto + '\n')
+        else:
+            self.stdout.write(texto)
+
+    """
+        Crea una sesión para el usuario indicado y devuelve la cookie que hay que enviar (o None).
+    """
+    def sesion(self, nombre):
+        if not nombre:
+            return None
+        usuario = User.objects.filter(username=nombre).first()
+        if usuario is None:
+            raise CommandError(f"No existe el usuario '{nombre}'.")
+        cliente = Client()
+        cliente.force_login(usuario)
+        return f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def rutas(self):
+        entrenamiento = Entrenamiento.objects.order_by('pk').values_list('pk', flat=True).first()
+        rutas = []
+        for sincrona, asincrona, con_id in self.PAREJAS:
+            if con_id and entrenamiento is None:
+                continue
+            argumentos = [entrenamiento] if con_id else []
+            rutas.append((sincrona, reverse(sincrona, args=argumentos), reverse(asincrona, args=argumentos)))
+        return rutas
+
+    def esperar_servidor(self, puerto, limite=30):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            try:
+                socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"uvicorn no responde en el puerto {puerto}.")
+
+    async def medir_todas(self, rutas):
+        resultados = []
+        for nombre, sincrona, asincrona in rutas:
+            resultado = {'nombre': nombre}
+            for modo, ruta in (('sync', sincrona), ('async', asincrona)):
+                self.stderr.write(f"Midiendo {ruta}...")
+                resultado[modo] = await self.medir(ruta)
+            if resultado['sync']['peticiones_por_segundo']:
+                resultado['mejora_rendimiento'] = round(resultado['async']['peticiones_por_segundo'] / resultado['sync']['peticiones_por_segundo'], 2)
+            resultados.append(resultado)
+        return resultados
+
+    """
+        Lanza las peticiones a una ruta con la concurrencia indicada y resume las medidas.
+    """
+    async def medir(self, ruta):
+        semaforo = asyncio.Semaphore(self.opciones['concurrencia'])
+
+        async def una():
+            async with semaforo:
+                return await self.peticion(ruta)
+
+        inicio = time.perf_counter()
+        muestras = await asyncio.gather(*(una() for _ in range(self.opciones['peticiones'])))
+        duracion = time.perf_counter() - inicio
+        correctas = [m for m in muestras if m[0] is not None and m[0] < 500]
+        latencias = sorted(segundos * 1000 for _, segundos, _ in correctas)
+        consultas = [c for _, _, c in correctas if c is not None]
+        return {
+            'estados': sorted({estado for estado, _, _ in correctas}),
+            'errores': len(muestras) - len(correctas),
+            'p50_ms': percentil(latencias, 50),
+            'p95_ms': percentil(latencias, 95),
+            'p99_ms': percentil(latencias, 99),
+            'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else None,
+            'peticiones_por_segundo': round(len(correctas) / duracion, 2) if duracion else 0,
+        }
+
+    """
+        Hace una petición HTTP/1.1 con un socket. Devuelve (estado, segundos, consultas); el estado es
+        None si la conexión falla. Los clientes lentos envían y leen la respuesta a trozos con esperas.
+    """
+    async def peticion(self, ruta):
+        lento, trozo = self.opciones['lento'] / 1000, self.opciones['trozo']
+        cabeceras = [f"GET {ruta} HTTP/1.1", f"Host: 127.0.0.1:{self.opciones['puerto']}", "Connection: close"]
+        if self.cookie:
+            cabeceras.append(f"Cookie: {self.cookie}")
+        peticion = ('\r\n'.join(cabeceras) + '\r\n\r\n').encode()
+        inicio = time.perf_counter()
+        try:
+            lector, escritor = await asyncio.open_connection('127.0.0.1', self.opciones['puerto'])
+            if lento:
+                for i in range(0, len(peticion), 32):
+                    escritor.write(peticion[i:i + 32])
+                    await escritor.drain()
+                    await asyncio.sleep(lento)
+            else:
+                escritor.write(peticion)
+                await escritor.drain()
+            respuesta = bytearray()
+            while datos := await lector.read(trozo if lento else 65536):
+                respuesta += datos
+                if lento:
+                    await asyncio.sleep(lento)
+            escritor.close()
+        except OSError:
+            return None, time.perf_counter() - inicio, None
+        segundos = time.perf_counter() - inicio
+
+        cabecera = bytes(respuesta).split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        try:
+            estado = int(cabecera[0].split()[1])
+        except (IndexError, ValueError):
+            return None, segundos, None
+        consultas = None
+        for linea in cabecera[1:]:
+            nombre, _, valor = linea.partition(':')
+            if nombre.strip().lower() == 'x-fitgym-consultas':
+                consultas = int(valor)
+        return estado, segundos, consultas
@@ -0,0 +1,187 @@
+import json
+import logging
+import subprocess
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from FitGym import instrumentacion, urls
+from FitGym.models import Ejercicio, Entrenamiento
+
+"""
+    Comando que recorre todas las URL con nombre de FitGym/urls.py con el cliente de pruebas de Django
+    y mide, por URL, la latencia (p50/p95/p99), las consultas por petición y el rendimiento (peticiones
+    por segundo) con varios hilos a la vez. El resultado se escribe en JSON junto con el commit actual
+    para poder comparar ejecuciones entre commits.
+
+    Las URL con parámetros usan el primer entrenamiento o ejercicio de la base de datos. Cada petición
+    se ejecuta en una transacción que se deshace, así que las vistas que escriben no cambian los datos;
+    aun así, las URL que borran o cierran la sesión (EXCLUIDAS) solo se miden con --incluir.
+    Cada hilo abre su propia conexión: con SQLite en memoria hay que usar --concurrencia 1.
+    Uso: python manage.py benchmark_vistas --peticiones 50 --concurrencia 4 --usuario socio --salida resultados.json
+"""
+class Command(BaseCommand):
+    help = "Mide latencia, consultas y rendimiento de todas las vistas y lo escribe en JSON."
+
+    EXCLUIDAS = ('eliminar_entrenamiento', 'eliminar_ejercicio', 'cerrar_sesion')
+    LOTE = 20  # Ids pedidos a los endpoints de lote de la API.
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=50, help="Peticiones medidas por URL.")
+        parser.add_argument('--calentamiento', type=int, default=3, help="Peticiones previas sin medir por URL.")
+        parser.add_argument('--concurrencia', type=int, default=1, help="Hilos que hacen peticiones a la vez.")
+        parser.add_argument('--host', default='localhost', help="Cabecera Host de las peticiones (debe estar en ALLOWED_HOSTS).")
+        parser.add_argument('--usuario', help="Usuario con el que se inicia sesión (por defecto, anónimo).")
+        parser.add_argument('--solo', nargs='+', metavar='NOMBRE', help="Mide solo estas URL (por nombre).")
+        parser.add_argument('--incluir', nargs='+', default=[], metavar='NOMBRE', help="Mide también estas URL excluidas.")
+        parser.add_argument('--salida', help="Fichero JSON donde guardar el resultado (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        self.host = options['host']
+        self.usuario = None
+        if options['usuario']:
+            self.usuario = User.objects.filter(username=options['usuario']).first()
+            if self.usuario is None:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        resultados = []
+        registro = logging.getLogger('django.request')
+        nivel = registro.level
+        registro.setLevel(logging.CRITICAL)  # Las respuestas 4xx/5xx se anotan en el informe, no en la consola.
+        try:
+            for nombre, url in self.urls(options['solo'], options['incluir']):
+                self.stderr.write(f"Midiendo {nombre} ({url})...")
+                self.ejecutar(url, options['calentamiento'], options['concurrencia'])
+                muestras, duracion = self.ejecutar(url, options['peticiones'], options['concurrencia'])
+                resultados.append(self.resumen(nombre, url, muestras, duracion))
+        finally:
+            registro.setLevel(nivel)
+
+        informe = {
+            'commit': self.commit(),
+            'fecha': timezone.now().isoformat(),
+            'base_de_datos': settings.DATABASES['default']['ENGINE'],
+            'peticiones': options['peticiones'],
+            'concurrencia': options['concurrencia'],
+            'usuario': options['usuario'],
+            'urls': resultados,
+        }
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                fichero.write(texto + '\n')
+        else:
+            self.stdout.write(texto)
+
+    """
+        Devuelve (nombre, url) de cada patrón con nombre, rellenando los parámetros con ids existentes
+        (y la lista de ids en los endpoints de lote).
+    """
+    def urls(self, solo, incluir):
+        ids = {
+            modelo._meta.model_name: list(modelo.objects.order_by('pk').values_list('pk', flat=True)[:self.LOTE])
+            for modelo in (Ejercicio, Entrenamiento)
+        }
+        primeros = {modelo: lista[0] if lista else None for modelo, lista in ids.items()}
+        vistas = set()
+        for patron in urls.urlpatterns:
+            if not isinstance(patron, URLPattern) or not patron.name:
+                continue
+            if solo and patron.name not in solo or (patron.name in self.EXCLUIDAS and patron.name not in incluir):
+                continue
+            parametros = list(patron.pattern.converters)
+            if parametros:
+                objeto_id = primeros['ejercicio' if 'ejercicio' in patron.name else 'entrenamiento']
+                if objeto_id is None:
+                    continue
+                url = reverse(patron.name, kwargs={parametro: objeto_id for parametro in parametros})
+            else:
+                url = reverse(patron.name)
+            if patron.name.endswith('_lote'):
+                url += '?ids=' + ','.join(map(str, ids['ejercicio' if 'ejercicio' in patron.name else 'entrenamiento']))
+            if (patron.name, url) not in vistas:  # Algunos nombres se repiten con y sin parámetros.
+                vistas.add((patron.name, url))
+                yield patron.name, url
+
+    """
+        Hace 'total' peticiones GET a la URL repartidas entre 'concurrencia' hilos, cada uno con su
+        cliente y su conexión. Devuelve las muestras (estado, segundos, métricas) y la duración total.
+    """
+    def ejecutar(self, url, total, concurrencia):
+        muestras = []
+        pendientes = iter(range(total))
+        cerrojo = threading.Lock()
+
+        def trabajador():
+            cliente = Client(raise_request_exception=False, HTTP_HOST=self.host)  # Un error 500 se anota, no detiene la medida.
+            if self.usuario is not None:
+                cliente.force_login(self.usuario)
+            try:
+                while True:
+                    with cerrojo:
+                        if next(pendientes, None) is None:
+                            return
+                    muestra = self.peticion(cliente, url)
+                    with cerrojo:
+                        muestras.append(muestra)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connections.close_all()
+
+        inicio = time.perf_counter()
+        if concurrencia <= 1:
+            trabajador()
+        else:
+            hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        return muestras, time.perf_counter() - inicio
+
+    def peticion(self, cliente, url):
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            respuesta, metricas = instrumentacion.medir(cliente.get, url)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)  # El contenido en streaming se genera al leerlo.
+            transaction.set_rollback(True)
+        return respuesta.status_code, time.perf_counter() - inicio, metricas
+
+    def resumen(self, nombre, url, muestras, duracion):
+        latencias = sorted(segundos * 1000 for _, segundos, _ in muestras)
+        consultas = [metricas.consultas for _, _, metricas in muestras]
+        return {
+            'nombre': nombre,
+            'url': url,
+            'estados': sorted({estado for estado, _, _ in muestras}),
+            'p50_ms': percentil(latencias, 50),
+            'p95_ms': percentil(latencias, 95),
+            'p99_ms': percentil(latencias, 99),
+            'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else 0,
+            'consultas_max': max(consultas, default=0),
+            'duplicadas_max': max((metricas.duplicadas for _, _, metricas in muestras), default=0),
+            'bd_ms_media': round(sum(metricas.tiempo_bd for _, _, metricas in muestras) * 1000 / len(muestras), 3) if muestras else 0,
+            'peticiones_por_segundo': round(len(muestras) / duracion, 2) if duracion else 0,
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+"""
+    Percentil por el método del rango más cercano sobre una lista ya ordenada (None si está vacía).
+"""
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, -(-p * len(ordenados) // 100) - 1))
+    return round(ordenados[indice], 3)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from FitGym import almacenamiento, imagenes, tareas
+from FitGym.models import Ejercicio, Entrenamiento
+
+"""
+    Comando para pasar las imágenes subidas antes del almacenamiento por contenido a nombres por hash.
+    Cada imagen antigua se copia a 'contenido/' (las repetidas acaban en un único fichero), se apunta el
+    objeto al nombre nuevo, se borran el fichero antiguo y sus miniaturas y se encola la generación de
+    las miniaturas nuevas. Con --recontar solo recalcula los contadores de referencias desde las tablas.
+    Uso: python manage.py deduplicar_imagenes [--recontar]
+"""
+class Command(BaseCommand):
+    help = "Migra las imágenes antiguas al almacenamiento por contenido y elimina los duplicados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recontar', action='store_true', help="Solo recalcula los contadores de referencias.")
+
+    def handle(self, *args, **options):
+        if not options['recontar']:
+            for modelo in (Ejercicio, Entrenamiento):
+                self.migrar(modelo)
+        ficheros = almacenamiento.recontar_referencias()
+        self.stdout.write(self.style.SUCCESS(f"{ficheros} ficheros con referencias."))
+
+    def migrar(self, modelo):
+        nombre_modelo = modelo._meta.model_name
+        storage = modelo._meta.get_field('imagen').storage
+        objetos = (modelo.objects.exclude(imagen__startswith=almacenamiento.DIRECTORIO + '/')
+                   .exclude(imagen=imagenes.IMAGEN_POR_DEFECTO).only('pk', 'imagen', 'imagen_derivadas'))
+        migrados = perdidos = 0
+        antiguos = set()
+        for objeto in objetos.iterator(chunk_size=200):
+            anterior = objeto.imagen.name
+            if not storage.exists(anterior):
+                perdidos += 1
+                continue
+            with storage.open(anterior, 'rb') as fichero:
+                nuevo = storage.save(anterior, fichero)
+            # update() para no disparar las señales: los contadores se recalculan al final.
+            modelo.objects.filter(pk=objeto.pk).update(imagen=nuevo, imagen_derivadas={}, actualizado=timezone.now())
+            tareas.encolar('procesar_imagen', {'modelo': nombre_modelo, 'id': objeto.pk, 'imagen': nuevo},
+                           clave=f'procesar_imagen:{nombre_modelo}:{objeto.pk}:{nuevo}')
+            antiguos.add(anterior)
+            antiguos.update(n for por_ancho in (objeto.imagen_derivadas or {}).values() for n in por_ancho.values())
+            migrados += 1
+        for nombre in antiguos:
+            if not modelo.objects.filter(imagen=nombre).exists():
+                storage.delete(nombre)
+        self.stdout.write(f"{nombre_modelo}: {migrados} imágenes migradas, {perdidos} ficheros no encontrados.")
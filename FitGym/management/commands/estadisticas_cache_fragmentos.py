@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from FitGym import fragmentos
+
+"""
+    Comando que muestra los aciertos y fallos de la caché de tarjetas del catálogo.
+    Con la caché en memoria local cada proceso tiene sus propios contadores, así que para verlos
+    desde este comando hay que usar una caché compartida (por ejemplo, la de ficheros).
+    Uso: python manage.py estadisticas_cache_fragmentos [--reiniciar]
+"""
+class Command(BaseCommand):
+    help = "Muestra los contadores de aciertos y fallos de la caché de fragmentos de las tarjetas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help="Pone los contadores a cero después de mostrarlos.")
+
+    def handle(self, *args, **options):
+        datos = fragmentos.estadisticas()
+        self.stdout.write(f"Aciertos: {datos['aciertos']}")
+        self.stdout.write(f"Fallos: {datos['fallos']}")
+        self.stdout.write(f"Ratio de aciertos: {datos['ratio']:.1%}")
+        if options['reiniciar']:
+            fragmentos.reiniciar_estadisticas()
+            self.stdout.write(self.style.SUCCESS("Contadores reiniciados."))
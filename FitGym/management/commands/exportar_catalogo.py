@@ -0,0 +1,31 @@
+import sys
+from django.core.management.base import BaseCommand
+from FitGym import catalogo
+
+"""
+    Comando para exportar el catálogo de ejercicios y entrenamientos a un fichero JSONL o CSV,
+    con sus imágenes en un zip aparte. El resultado se puede cargar con 'importar_catalogo'.
+    Uso: python manage.py exportar_catalogo catalogo.jsonl [--imagenes imagenes.zip] [--formato jsonl|csv]
+"""
+class Command(BaseCommand):
+    help = "Exporta ejercicios y entrenamientos a JSONL o CSV (usa '-' para la salida estándar)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help="Fichero JSONL o CSV de salida.")
+        parser.add_argument('--imagenes', help="Zip donde se copian las imágenes.")
+        parser.add_argument('--formato', choices=['jsonl', 'csv'], help="Formato del fichero (por defecto, según la extensión).")
+        parser.add_argument('--lote', type=int, default=catalogo.TAMANO_LOTE, help="Objetos leídos por consulta.")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or catalogo.formato_de(options['fichero'])
+        a_salida = options['fichero'] == '-'
+        fichero = sys.stdout if a_salida else open(options['fichero'], 'w', encoding='utf-8', newline='')
+        # Con la salida estándar el progreso iría mezclado con los datos.
+        progreso = None if a_salida else (lambda escritos: self.stdout.write(f"  {escritos} registros exportados..."))
+        try:
+            escritos = catalogo.exportar(fichero, formato, options['imagenes'], options['lote'], progreso)
+        finally:
+            if not a_salida:
+                fichero.close()
+        if not a_salida:
+            self.stdout.write(self.style.SUCCESS(f"{escritos} registros exportados."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from FitGym import imagenes
+from FitGym.models import Ejercicio, Entrenamiento
+
+"""
+    Comando para generar las miniaturas de las imágenes ya existentes.
+    Por defecto solo procesa los objetos que todavía no tienen derivadas; con --forzar las regenera todas.
+    Uso: python manage.py generar_miniaturas [--modelo ejercicio|entrenamiento] [--forzar]
+"""
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP/AVIF de las imágenes de ejercicios y entrenamientos."
+
+    MODELOS = {'ejercicio': Ejercicio, 'entrenamiento': Entrenamiento}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=sorted(self.MODELOS), help="Procesa solo este modelo.")
+        parser.add_argument('--forzar', action='store_true', help="Regenera también las miniaturas existentes.")
+
+    def handle(self, *args, **options):
+        nombres = [options['modelo']] if options['modelo'] else sorted(self.MODELOS)
+        for nombre in nombres:
+            objetos = self.MODELOS[nombre].objects.only('pk', 'imagen', 'imagen_derivadas')
+            if not options['forzar']:
+                objetos = objetos.filter(imagen_derivadas={})
+            procesados = sin_imagen = 0
+            for objeto in objetos.iterator(chunk_size=200):
+                if imagenes.procesar_imagen(objeto):
+                    procesados += 1
+                else:
+                    sin_imagen += 1  # Imagen por defecto, vacía o que no se puede abrir.
+                if (procesados + sin_imagen) % 100 == 0:
+                    self.stdout.write(f"  {nombre}: {procesados + sin_imagen} procesados...")
+            self.stdout.write(self.style.SUCCESS(f"{nombre}: {procesados} imágenes con miniaturas, {sin_imagen} sin imagen válida."))
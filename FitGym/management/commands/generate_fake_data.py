@@ -0,0 +1,178 @@
+import io
+import random
+import time
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from FitGym import almacenamiento, busqueda, contadores, sugerencias
+from FitGym.models import Ejercicio, Entrenamiento, Inscripcion
+
+"""
+    Comando que llena la base de datos con un catálogo sintético para medir cómo escala la aplicación.
+    Crea ejercicios, entrenamientos con entre 4 y 12 ejercicios, usuarios e inscripciones con una
+    popularidad muy desigual (unos pocos entrenamientos concentran la mayoría de apuntados), todo con
+    bulk_create por lotes. Las imágenes son unas pocas imágenes de relleno compartidas, que con el
+    almacenamiento por contenido ocupan un fichero cada una. Con la misma semilla genera los mismos datos.
+    Al terminar reconstruye el índice de búsqueda de lo creado, los contadores y las referencias de imágenes;
+    las miniaturas se pueden generar después con 'generar_miniaturas'.
+    Uso: python manage.py generate_fake_data --ejercicios 100000 --entrenamientos 20000 --usuarios 50000 --inscripciones 1000000
+"""
+class Command(BaseCommand):
+    help = "Genera ejercicios, entrenamientos, usuarios e inscripciones sintéticos para pruebas de rendimiento."
+
+    PALABRAS = (
+        'press', 'banca', 'inclinado', 'sentadilla', 'búlgara', 'peso', 'muerto', 'rumano', 'dominadas',
+        'remo', 'barra', 'mancuernas', 'polea', 'jalón', 'pecho', 'espalda', 'hombro', 'militar', 'curl',
+        'bíceps', 'tríceps', 'extensión', 'zancadas', 'flexiones', 'fondos', 'plancha', 'abdominales',
+        'cardio', 'carrera', 'bicicleta', 'elevaciones', 'laterales', 'aperturas', 'glúteo', 'femoral',
+    )
+    OBJETIVOS = ('fuerza', 'hipertrofia', 'resistencia', 'movilidad', 'principiantes', 'avanzado', 'en casa', 'express')
+    COLORES = ('#1d4ed8', '#b91c1c', '#15803d', '#a16207', '#7e22ce', '#0f766e', '#be185d', '#4338ca', '#c2410c', '#334155')
+    CONTRASENA = 'sintetico-123'  # Contraseña de todos los usuarios generados.
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ejercicios', type=int, default=100000, help="Número de ejercicios.")
+        parser.add_argument('--entrenamientos', type=int, default=20000, help="Número de entrenamientos.")
+        parser.add_argument('--usuarios', type=int, default=50000, help="Número de usuarios.")
+        parser.add_argument('--inscripciones', type=int, default=1000000, help="Número aproximado de inscripciones.")
+        parser.add_argument('--imagenes', type=int, default=len(self.COLORES), help="Imágenes de relleno distintas (0 para usar la imagen por defecto).")
+        parser.add_argument('--semilla', type=int, default=42, help="Semilla para generar datos reproducibles.")
+        parser.add_argument('--lote', type=int, default=5000, help="Filas por INSERT.")
+        parser.add_argument('--sin-indice', action='store_true', help="No indexa los objetos creados en el buscador.")
+
+    def handle(self, *args, **options):
+        self.aleatorio = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.inicio = time.perf_counter()
+        imagenes = self.imagenes_de_relleno(options['imagenes'])
+
+        ejercicios = self.crear(Ejercicio, (
+            Ejercicio(nombre=self.nombre_ejercicio(), descripcion=self.descripcion(), imagen=self.elegir(imagenes))
+            for _ in range(options['ejercicios'])
+        ))
+        entrenamientos = self.crear(Entrenamiento, (
+            Entrenamiento(titulo=self.titulo_entrenamiento(), descripcion=self.descripcion(), imagen=self.elegir(imagenes))
+            for _ in range(options['entrenamientos'])
+        ))
+        self.relacionar_ejercicios(entrenamientos, ejercicios)
+        usuarios = self.crear_usuarios(options['usuarios'], options['semilla'])
+        self.inscribir(usuarios, entrenamientos, options['inscripciones'])
+
+        if not options['sin_indice']:
+            for modelo, ids in ((Ejercicio, ejercicios), (Entrenamiento, entrenamientos)):
+                if ids:
+                    busqueda.indexar_lote(modelo.objects.filter(pk__gte=ids[0]).iterator(chunk_size=busqueda.TAMANO_LOTE))
+            self.progreso("Índice de búsqueda actualizado")
+        contadores.reparar()
+        almacenamiento.recontar_referencias()
+        for modelo in sugerencias.CAMPOS:
+            sugerencias.invalidar(modelo)
+        self.stdout.write(self.style.SUCCESS(f"Datos generados en {time.perf_counter() - self.inicio:.1f} s."))
+
+    def progreso(self, mensaje):
+        self.stdout.write(f"[{time.perf_counter() - self.inicio:7.1f} s] {mensaje}")
+
+    def elegir(self, opciones):
+        return self.aleatorio.choice(opciones) if opciones else Ejercicio._meta.get_field('imagen').default
+
+    """
+        Guarda unas pocas imágenes JPEG de colores distintos y devuelve sus nombres en el almacenamiento.
+    """
+    def imagenes_de_relleno(self, cantidad):
+        storage = Ejercicio._meta.get_field('imagen').storage
+        nombres = []
+        for i in range(cantidad):
+            imagen = Image.new('RGB', (640, 480), self.COLORES[i % len(self.COLORES)])
+            imagen.paste((255, 255, 255), (0, 400, 640, 400 + 8 * (i // len(self.COLORES) + 1)))  # Distintas aunque se repita el color.
+            datos = io.BytesIO()
+            imagen.save(datos, 'JPEG', quality=80)
+            nombres.append(storage.save(f'sintetica_{i}.jpg', ContentFile(datos.getvalue())))
+        return nombres
+
+    """
+        Inserta los objetos de un generador en lotes de 'self.lote', sin tenerlos todos en memoria
+        (bulk_create convierte en lista lo que recibe).
+    """
+    def insertar(self, modelo, objetos):
+        with transaction.atomic():
+            while lote := list(islice(objetos, self.lote)):
+                modelo.objects.bulk_create(lote)
+
+    """
+        Inserta los objetos por lotes y devuelve sus ids, también en backends que no los devuelven (MySQL).
+    """
+    def crear(self, modelo, objetos):
+        ultimo = modelo.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        self.insertar(modelo, objetos)
+        ids = list(modelo.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True))
+        self.progreso(f"{len(ids)} {modelo._meta.verbose_name_plural} creados")
+        return ids
+
+    """
+        Elige 'cantidad' elementos distintos con la distribución acumulada 'pesos' (muestreo sin reemplazo).
+    """
+    def muestra(self, elementos, pesos, cantidad):
+        cantidad = min(cantidad, len(elementos))
+        elegidos = set()
+        while len(elegidos) < cantidad:
+            elegidos.update(self.aleatorio.choices(elementos, cum_weights=pesos, k=cantidad - len(elegidos)))
+        return elegidos
+
+    """
+        Pesos acumulados de una distribución de Zipf: el elemento i-ésimo es 1/(i+1)^s veces el primero.
+    """
+    def pesos_zipf(self, n, s):
+        total, acumulados = 0.0, []
+        for i in range(n):
+            total += 1 / (i + 1) ** s
+            acumulados.append(total)
+        return acumulados
+
+    def relacionar_ejercicios(self, entrenamientos, ejercicios):
+        if not ejercicios:
+            return
+        intermedia = Entrenamiento.ejercicios.through
+        orden = ejercicios[:]
+        self.aleatorio.shuffle(orden)  # Los ejercicios más usados no son los primeros creados.
+        pesos = self.pesos_zipf(len(orden), 0.7)
+        filas = (
+            intermedia(entrenamiento_id=entrenamiento, ejercicio_id=ejercicio, posicion=posicion)
+            for entrenamiento in entrenamientos
+            for posicion, ejercicio in enumerate(sorted(self.muestra(orden, pesos, self.aleatorio.randint(4, 12))))
+        )
+        self.insertar(intermedia, filas)
+        self.progreso("Ejercicios asignados a los entrenamientos")
+
+    def crear_usuarios(self, cantidad, semilla):
+        contrasena = make_password(self.CONTRASENA)  # Se calcula una sola vez: el hash es lo más caro.
+        return self.crear(User, (
+            User(username=f'sintetico{semilla}_{i}', password=contrasena) for i in range(cantidad)
+        ))
+
+    def inscribir(self, usuarios, entrenamientos, total):
+        if not usuarios or not entrenamientos:
+            return
+        orden = entrenamientos[:]
+        self.aleatorio.shuffle(orden)
+        pesos = self.pesos_zipf(len(orden), 0.9)
+        media = total / len(usuarios)
+        filas = (
+            Inscripcion(usuario_id=usuario, entrenamiento_id=entrenamiento)
+            for usuario in usuarios
+            for entrenamiento in self.muestra(orden, pesos, int(self.aleatorio.expovariate(1 / media)) if media else 0)
+        )
+        self.insertar(Inscripcion, filas)
+        self.progreso(f"{Inscripcion.objects.filter(usuario_id__gte=usuarios[0]).count()} inscripciones creadas")
+
+    def nombre_ejercicio(self):
+        return ' '.join(self.aleatorio.sample(self.PALABRAS, 3)).capitalize()
+
+    def titulo_entrenamiento(self):
+        return f"{self.aleatorio.choice(self.PALABRAS).capitalize()} y {self.aleatorio.choice(self.PALABRAS)} ({self.aleatorio.choice(self.OBJETIVOS)})"
+
+    def descripcion(self):
+        return ' '.join(self.aleatorio.choices(self.PALABRAS + self.OBJETIVOS, k=self.aleatorio.randint(15, 40))).capitalize() + '.'
@@ -0,0 +1,42 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from FitGym import catalogo
+
+"""
+    Comando para importar el catálogo de ejercicios y entrenamientos desde un fichero JSONL o CSV.
+    Los objetos se identifican por nombre (ejercicios) o título (entrenamientos): si ya existen se
+    actualizan y si no se crean. Las imágenes se toman del zip indicado con --imagenes.
+    Uso: python manage.py importar_catalogo catalogo.jsonl [--imagenes imagenes.zip] [--formato jsonl|csv] [--lote 1000]
+"""
+class Command(BaseCommand):
+    help = "Importa ejercicios y entrenamientos en bloque desde JSONL o CSV (usa '-' para la entrada estándar)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help="Fichero JSONL o CSV con el catálogo.")
+        parser.add_argument('--imagenes', help="Zip con las imágenes referenciadas en el catálogo.")
+        parser.add_argument('--formato', choices=['jsonl', 'csv'], help="Formato del fichero (por defecto, según la extensión).")
+        parser.add_argument('--lote', type=int, default=catalogo.TAMANO_LOTE, help="Registros por lote.")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or catalogo.formato_de(options['fichero'])
+        inicio = time.monotonic()
+
+        def progreso(tipo, estadisticas):
+            total = estadisticas['nuevos'] + estadisticas['actualizados']
+            self.stdout.write(f"  {tipo}: {total} importados ({total / max(time.monotonic() - inicio, 1e-6):.0f}/s)")
+
+        importador = catalogo.Importador(lote=options['lote'], imagenes_zip=options['imagenes'], progreso=progreso)
+        fichero = sys.stdin if options['fichero'] == '-' else open(options['fichero'], encoding='utf-8', newline='')
+        try:
+            estadisticas = importador.importar(catalogo.leer_registros(fichero, formato))
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            if fichero is not sys.stdin:
+                fichero.close()
+        for tipo, valores in estadisticas.items():
+            self.stdout.write(self.style.SUCCESS(f"{tipo}: {valores['nuevos']} nuevos, {valores['actualizados']} actualizados."))
+        if importador.ejercicios_desconocidos:
+            self.stdout.write(self.style.WARNING(f"{importador.ejercicios_desconocidos} ejercicios referenciados no existen y se han ignorado."))
+        self.stdout.write(f"Tiempo: {time.monotonic() - inicio:.1f}s")
@@ -0,0 +1,29 @@
+import time
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+"""
+    Comando para borrar las sesiones caducadas de la base de datos.
+    Las borra por lotes de claves, con una pausa opcional entre lotes, para no bloquear la tabla
+    de sesiones con un único DELETE enorme.
+    Uso: python manage.py limpiar_sesiones [--lote 1000] [--pausa 0.1]
+"""
+class Command(BaseCommand):
+    help = "Borra por lotes las sesiones caducadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Sesiones que se borran en cada DELETE.")
+        parser.add_argument('--pausa', type=float, default=0, help="Segundos de espera entre lotes.")
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        borradas = 0
+        while True:
+            claves = list(Session.objects.filter(expire_date__lt=ahora).values_list('session_key', flat=True)[:options['lote']])
+            if not claves:
+                break
+            borradas += Session.objects.filter(session_key__in=claves).delete()[0]
+            if options['pausa']:
+                time.sleep(options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f"{borradas} sesiones caducadas borradas."))
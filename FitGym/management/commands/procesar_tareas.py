@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from FitGym import tareas
+
+"""
+    Worker de la cola de tareas en segundo plano.
+    Se ejecuta como un proceso aparte del servidor web y va procesando las tareas pendientes.
+    Uso: python manage.py procesar_tareas [--una-vez] [--intervalo 2]
+"""
+class Command(BaseCommand):
+    help = "Ejecuta las tareas en segundo plano encoladas (miniaturas, borrado de ficheros...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Procesa las tareas pendientes y termina.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos de espera cuando la cola está vacía.")
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            procesadas = tareas.procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f"{procesadas} tareas procesadas."))
+            return
+
+        self.stdout.write("Esperando tareas (Ctrl+C para salir)...")
+        try:
+            while True:
+                close_old_connections()  # Evita reutilizar conexiones caídas en un proceso de larga duración.
+                tarea_obj = tareas.reservar()
+                if tarea_obj is None:
+                    time.sleep(options['intervalo'])
+                    continue
+                correcta = tareas.ejecutar(tarea_obj)
+                self.stdout.write(f"{tarea_obj.tipo} #{tarea_obj.pk}: {'completada' if correcta else tarea_obj.estado}")
+        except KeyboardInterrupt:
+            self.stdout.write("Worker detenido.")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from FitGym import contadores
+
+"""
+    Comando para reparar los contadores de ejercicios y apuntados de los entrenamientos y de
+    entrenamientos de los ejercicios.
+    Los recalcula en bloque desde las tablas intermedias y solo modifica los que estaban mal.
+    Uso: python manage.py recalcular_contadores [--contador num_ejercicios|num_apuntados|num_entrenamientos]
+"""
+class Command(BaseCommand):
+    help = "Recalcula los contadores desnormalizados (ejercicios y apuntados de los entrenamientos, entrenamientos de los ejercicios)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contador', choices=sorted(contadores.tablas()), help="Recalcula solo este contador.")
+
+    def handle(self, *args, **options):
+        campos = [options['contador']] if options['contador'] else None
+        corregidos = contadores.reparar(campos)
+        self.stdout.write(self.style.SUCCESS(f"{corregidos} contadores corregidos."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from FitGym import busqueda
+from FitGym.models import Ejercicio, Entrenamiento
+
+"""
+    Comando para reconstruir desde cero el índice de búsqueda de ejercicios y entrenamientos.
+    Uso: python manage.py reconstruir_indice_busqueda [--modelo ejercicio|entrenamiento]
+"""
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de texto completo de ejercicios y entrenamientos."
+
+    MODELOS = {'ejercicio': Ejercicio, 'entrenamiento': Entrenamiento}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=sorted(self.MODELOS), help="Reconstruye solo el índice de este modelo.")
+
+    def handle(self, *args, **options):
+        nombres = [options['modelo']] if options['modelo'] else sorted(self.MODELOS)
+        for nombre in nombres:
+            with transaction.atomic():  # Mientras se reconstruye, las búsquedas siguen viendo el índice anterior.
+                filas = busqueda.reconstruir(self.MODELOS[nombre])
+            self.stdout.write(self.style.SUCCESS(f"Índice de '{nombre}' reconstruido: {filas} términos."))
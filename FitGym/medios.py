@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import re
+import stat
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from .almacenamiento import DIRECTORIO
+
+"""
+    Vista para servir las imágenes subidas (MEDIA_ROOT) en producción.
+
+    MEDIA_ROOT es la raíz del proyecto, así que solo se sirven ficheros de imagen dentro de las
+    carpetas de MEDIOS_CARPETAS; cualquier otra ruta responde 404. Cada respuesta lleva ETag y
+    Last-Modified (sacados de un stat, sin leer el fichero), así que una revalidación se contesta
+    con 304. Las peticiones Range se contestan con 206 y solo el trozo pedido.
+    Los bytes no pasan por Python: FileResponse entrega el fichero al servidor WSGI
+    (wsgi.file_wrapper), que en gunicorn o uWSGI lo envía con os.sendfile. Con
+    MEDIOS_DESCARGA = 'x-accel-redirect' (nginx) o 'x-sendfile' (Apache, lighttpd) la vista solo
+    comprueba la ruta y pone las cabeceras, y es el proxy quien envía el fichero.
+"""
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif')
+MAX_AGE_CONTENIDO = 60 * 60 * 24 * 365  # Un año para los ficheros nombrados por su hash (no cambian nunca).
+MAX_AGE_OTROS = 60 * 60 * 24
+PATRON_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+PATRON_HUELLA = re.compile(r'^[0-9a-f]{64}')  # SHA-256 al principio del nombre ('<hash>.jpg', '<hash>.256w.webp').
+
+"""
+    Devuelve la ruta en disco de un medio, o lanza Http404 si está fuera de las carpetas permitidas,
+    no es una imagen o no existe.
+"""
+def localizar(ruta):
+    carpeta = ruta.split('/', 1)[0]
+    if carpeta not in settings.MEDIOS_CARPETAS or not ruta.lower().endswith(EXTENSIONES_IMAGEN):
+        raise Http404("Fichero no encontrado")
+    try:
+        camino = safe_join(settings.MEDIA_ROOT, ruta)
+    except SuspiciousFileOperation:
+        raise Http404("Ruta no válida")
+    try:
+        datos = os.stat(camino)
+    except OSError:
+        raise Http404("Fichero no encontrado")
+    if not stat.S_ISREG(datos.st_mode):
+        raise Http404("Fichero no encontrado")
+    return camino, datos
+
+"""
+    Indica si un medio está en el almacenamiento por contenido: su nombre empieza por el hash y
+    su contenido no cambia nunca.
+"""
+def es_inmutable(ruta):
+    return ruta.startswith(DIRECTORIO + '/') and PATRON_HUELLA.match(os.path.basename(ruta)) is not None
+
+"""
+    ETag de un fichero: su nombre si es inmutable y, si no, la fecha de modificación y el tamaño.
+"""
+def etag_fichero(ruta, datos):
+    if es_inmutable(ruta):
+        return quote_etag(os.path.basename(ruta))
+    return quote_etag(f"{datos.st_mtime_ns:x}-{datos.st_size:x}")
+
+"""
+    Interpreta la cabecera Range. Devuelve (inicio, fin) incluidos, None si no hay que aplicarla
+    (no hay, tiene varios rangos o If-Range no coincide) o False si no se puede satisfacer.
+"""
+def rango_pedido(request, tamano, etag):
+    cabecera = request.headers.get('Range', '').strip()
+    encaje = PATRON_RANGO.match(cabecera)
+    if not encaje or not any(encaje.groups()):
+        return None  # Sin rango o con varios: se envía el fichero completo, como permite la RFC 9110.
+    si_rango = request.headers.get('If-Range')
+    if si_rango and si_rango.strip() != etag:
+        return None  # El cliente tiene otra versión: necesita el fichero completo.
+    inicio, fin = encaje.groups()
+    if not inicio:  # 'bytes=-500': los últimos 500 bytes.
+        inicio, fin = max(0, tamano - int(fin)), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio > fin or inicio >= tamano:
+        return False
+    return inicio, fin
+
+"""
+    Fichero abierto que solo deja leer 'longitud' bytes desde la posición actual.
+    Conserva fileno(): gunicorn lo envía con os.sendfile desde la posición actual hasta
+    Content-Length, y los servidores sin sendfile leen con read() solo el trozo.
+"""
+class Tramo:
+
+    def __init__(self, fichero, inicio, longitud):
+        fichero.seek(inicio)
+        self.fichero = fichero
+        self.restante = longitud
+
+    def read(self, tamano=-1):
+        if tamano is None or tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.fichero.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def fileno(self):
+        return self.fichero.fileno()
+
+    def close(self):
+        self.fichero.close()
+
+"""
+    Sirve un fichero de MEDIA_ROOT con validación condicional, Range, caché larga y, si está
+    configurado, descarga delegada en el proxy.
+"""
+@require_safe
+def servir(request, ruta):
+    camino, datos = localizar(ruta)
+    etag = etag_fichero(ruta, datos)
+    response = get_conditional_response(request, etag=etag, last_modified=int(datos.st_mtime))
+    if response is None:
+        response = respuesta_fichero(request, ruta, camino, datos, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(datos.st_mtime)
+    if es_inmutable(ruta):
+        response['Cache-Control'] = f'public, max-age={MAX_AGE_CONTENIDO}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={MAX_AGE_OTROS}'
+    return response
+
+"""
+    Respuesta con el contenido del fichero (completo o el rango pedido) o con la cabecera que
+    indica al proxy qué fichero enviar.
+"""
+def respuesta_fichero(request, ruta, camino, datos, etag):
+    tipo = mimetypes.guess_type(camino)[0] or 'application/octet-stream'
+    descarga = settings.MEDIOS_DESCARGA
+    if descarga == 'x-accel-redirect':  # nginx atiende también el Range con su location 'internal'.
+        response = HttpResponse(content_type=tipo)
+        response['X-Accel-Redirect'] = settings.MEDIOS_PREFIJO_INTERNO + ruta
+        return response
+    if descarga == 'x-sendfile':
+        response = HttpResponse(content_type=tipo)
+        response['X-Sendfile'] = camino
+        return response
+
+    tamano = datos.st_size
+    rango = rango_pedido(request, tamano, etag)
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+        return response
+    if rango is None:
+        response = FileResponse(open(camino, 'rb'), content_type=tipo)
+    else:
+        inicio, fin = rango
+        response = FileResponse(Tramo(open(camino, 'rb'), inicio, fin - inicio + 1), content_type=tipo, status=206)
+        response['Content-Length'] = fin - inicio + 1
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0006_alter_ejercicio_descripcion_alter_ejercicio_nombre_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=50)),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.IntegerField()),
+                ('peso', models.FloatField(default=1.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['objeto_id', 'modelo'], name='termino_busqueda_objeto')],
+                'constraints': [models.UniqueConstraint(fields=('modelo', 'termino', 'objeto_id'), name='termino_busqueda_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0007_terminobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ejercicio',
+            name='imagen_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='imagen_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0009_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FicheroContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('referencias', models.IntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+"""
+    Añade la fecha de última modificación a ejercicios y entrenamientos.
+    Las filas existentes toman como valor inicial su fecha de creación.
+"""
+def copiar_creado(apps, schema_editor):
+    ahora = django.utils.timezone.now()
+    for nombre in ('Ejercicio', 'Entrenamiento'):
+        apps.get_model('FitGym', nombre).objects.using(schema_editor.connection.alias).update(actualizado=Coalesce('creado', models.Value(ahora)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0010_ficherocontenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ejercicio',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_creado, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:03
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+"""
+    Rellena los contadores de los entrenamientos existentes a partir de las tablas intermedias.
+    Si el estado de las migraciones no incluye el campo añadido a User, el número de apuntados
+    se puede calcular después con 'python manage.py recalcular_contadores'.
+"""
+def rellenar_contadores(apps, schema_editor):
+    Entrenamiento = apps.get_model('FitGym', 'Entrenamiento')
+    intermedias = {'num_ejercicios': Entrenamiento.ejercicios.through}
+    try:
+        intermedias['num_apuntados'] = apps.get_model('auth', 'User')._meta.get_field('entrenamientos_apuntados').remote_field.through
+    except (LookupError, FieldDoesNotExist):  # auth o su campo no forman parte del estado de esta migración.
+        pass
+    for campo, intermedia in intermedias.items():
+        cuenta = (intermedia.objects.filter(entrenamiento_id=OuterRef('pk'))
+                  .order_by().values('entrenamiento_id').annotate(n=Count('*')).values('n'))
+        Entrenamiento.objects.using(schema_editor.connection.alias).update(**{campo: Coalesce(Subquery(cuenta, output_field=IntegerField()), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0011_actualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='num_apuntados',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='num_ejercicios',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='entrenamiento',
+            index=models.Index(fields=['-num_apuntados', 'id'], name='entrenamiento_popularidad'),
+        ),
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
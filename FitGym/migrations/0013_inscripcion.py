@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+TABLA_ANTERIOR = 'auth_user_entrenamientos_apuntados'  # Tabla intermedia automática del ManyToMany anterior.
+
+"""
+    Copia las inscripciones de la tabla intermedia automática a Inscripcion con un INSERT ... SELECT.
+    No se conoce la fecha real en que se apuntaron, así que todas toman la de la migración.
+"""
+def copiar_inscripciones(apps, schema_editor):
+    conexion = schema_editor.connection
+    if TABLA_ANTERIOR not in conexion.introspection.table_names():
+        return
+    Inscripcion = apps.get_model('FitGym', 'Inscripcion')
+    nombre = conexion.ops.quote_name
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {nombre(Inscripcion._meta.db_table)} (usuario_id, entrenamiento_id, fecha_apuntado) "
+            f"SELECT user_id, entrenamiento_id, %s FROM {nombre(TABLA_ANTERIOR)}",
+            [timezone.now()],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0012_contadores_entrenamiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inscripcion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_apuntado', models.DateTimeField(auto_now_add=True)),
+                ('entrenamiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='FitGym.entrenamiento')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', '-fecha_apuntado'], name='inscripcion_usuario_fecha')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'entrenamiento'), name='inscripcion_unica')],
+            },
+        ),
+        migrations.RunPython(copiar_inscripciones, migrations.RunPython.noop),
+    ]
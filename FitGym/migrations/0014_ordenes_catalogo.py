@@ -0,0 +1,76 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:26
+
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+"""
+    Rellena el número de entrenamientos de los ejercicios existentes con un único UPDATE.
+"""
+def rellenar_num_entrenamientos(apps, schema_editor):
+    Ejercicio = apps.get_model('FitGym', 'Ejercicio')
+    intermedia = apps.get_model('FitGym', 'Entrenamiento').ejercicios.through
+    cuenta = (intermedia.objects.filter(ejercicio_id=OuterRef('pk'))
+              .order_by().values('ejercicio_id').annotate(n=Count('*')).values('n'))
+    Ejercicio.objects.using(schema_editor.connection.alias).update(num_entrenamientos=Coalesce(Subquery(cuenta, output_field=IntegerField()), Value(0)))
+
+"""
+    Da fecha de creación a las filas anteriores al campo (tenían NULL): un segundo antes de la más
+    antigua, para que sigan siendo las primeras. Sin nulos, los índices sobre (creado, id) sirven
+    para paginar por cursor en los dos sentidos sin condiciones OR.
+"""
+def rellenar_creado(apps, schema_editor):
+    for nombre in ('Ejercicio', 'Entrenamiento'):
+        modelo = apps.get_model('FitGym', nombre)
+        objetos = modelo.objects.using(schema_editor.connection.alias)
+        primera = objetos.aggregate(primera=Min('creado'))['primera'] or timezone.now()
+        objetos.filter(creado__isnull=True).update(creado=primera - timedelta(seconds=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0013_inscripcion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ejercicio',
+            name='num_entrenamientos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(rellenar_num_entrenamientos, migrations.RunPython.noop),  # Antes del índice, para no actualizarlo fila a fila.
+        migrations.RunPython(rellenar_creado, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ejercicio',
+            name='creado',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='entrenamiento',
+            name='creado',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddIndex(
+            model_name='ejercicio',
+            index=models.Index(fields=['creado', 'id'], name='ejercicio_creado'),
+        ),
+        migrations.AddIndex(
+            model_name='ejercicio',
+            index=models.Index(fields=['nombre', 'id'], name='ejercicio_nombre'),
+        ),
+        migrations.AddIndex(
+            model_name='ejercicio',
+            index=models.Index(fields=['-num_entrenamientos', 'id'], name='ejercicio_popularidad'),
+        ),
+        migrations.AddIndex(
+            model_name='entrenamiento',
+            index=models.Index(fields=['creado', 'id'], name='entrenamiento_creado'),
+        ),
+        migrations.AddIndex(
+            model_name='entrenamiento',
+            index=models.Index(fields=['titulo', 'id'], name='entrenamiento_titulo'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0014_ordenes_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntrenamientoSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntuacion', models.FloatField()),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('entrenamiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares_calculados', to='FitGym.entrenamiento')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_a', to='FitGym.entrenamiento')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entrenamiento', 'posicion'), name='entrenamiento_similar_posicion')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+"""
+    Tabla intermedia automática del ManyToMany creado en la migración 0002, según el estado del modelo.
+"""
+def tabla_anterior(apps):
+    Entrenamiento = apps.get_model('FitGym', 'Entrenamiento')
+    return Entrenamiento._meta.get_field('ejercicios').remote_field.through._meta.db_table
+
+"""
+    Copia los ejercicios de cada entrenamiento a EntrenamientoEjercicio con un INSERT ... SELECT.
+    Como posición se usa el id de la fila anterior, que conserva el orden en que se añadieron
+    (las posiciones solo tienen que ordenar, no ser consecutivas).
+"""
+def copiar_ejercicios(apps, schema_editor):
+    conexion = schema_editor.connection
+    anterior = tabla_anterior(apps)
+    if anterior not in conexion.introspection.table_names():
+        return
+    nueva = apps.get_model('FitGym', 'EntrenamientoEjercicio')._meta.db_table
+    nombre = conexion.ops.quote_name
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {nombre(nueva)} (entrenamiento_id, ejercicio_id, posicion) "
+            f"SELECT entrenamiento_id, ejercicio_id, id FROM {nombre(anterior)}"
+        )
+
+"""
+    Al deshacer la migración, devuelve las filas a la tabla automática (se pierden series, repeticiones y descanso).
+"""
+def devolver_ejercicios(apps, schema_editor):
+    conexion = schema_editor.connection
+    nueva = apps.get_model('FitGym', 'EntrenamientoEjercicio')._meta.db_table
+    nombre = conexion.ops.quote_name
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {nombre(tabla_anterior(apps))} (entrenamiento_id, ejercicio_id) "
+            f"SELECT entrenamiento_id, ejercicio_id FROM {nombre(nueva)} ORDER BY entrenamiento_id, posicion, id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0015_entrenamiento_similar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntrenamientoEjercicio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveIntegerField(default=0)),
+                ('series', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('repeticiones', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('descanso', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas_entrenamientos', to='FitGym.ejercicio')),
+                ('entrenamiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas_ejercicios', to='FitGym.entrenamiento')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entrenamiento', 'posicion'], name='entrenamiento_ejercicio_orden')],
+                'constraints': [models.UniqueConstraint(fields=('entrenamiento', 'ejercicio'), name='entrenamiento_ejercicio_unico')],
+            },
+        ),
+        migrations.RunPython(copiar_ejercicios, devolver_ejercicios),
+        # No se puede añadir 'through' a un ManyToMany existente: se quita (con su tabla automática) y se vuelve a crear.
+        migrations.RemoveField(
+            model_name='entrenamiento',
+            name='ejercicios',
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='ejercicios',
+            field=models.ManyToManyField(related_name='entrenamientos', through='FitGym.EntrenamientoEjercicio', to='FitGym.ejercicio', verbose_name='Ejercicios'),
+        ),
+    ]
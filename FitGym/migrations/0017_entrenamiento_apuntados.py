@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+TABLA_ANTERIOR = 'auth_user_entrenamientos_apuntados'  # Tabla intermedia automática del ManyToMany que se añadía a User.
+
+"""
+    La relación de los usuarios apuntados pasa a declararse en Entrenamiento (con Inscripcion como tabla
+    intermedia), así que deja de formar parte del estado de las migraciones de 'auth'.
+
+    Las bases de datos creadas con el campo añadido a User todavía tienen la tabla intermedia antigua.
+    0013 copiaba sus filas solo si la tabla ya existía, porque no puede depender de la migración que la
+    creaba (generada fuera del repositorio, en 'auth'). Aquí se copian las filas que falten y se borra la tabla.
+    Después hay que borrar del entorno esa migración generada ('auth/0013_user_entrenamientos_apuntados').
+"""
+def copiar_y_borrar_tabla_anterior(apps, schema_editor):
+    conexion = schema_editor.connection
+    if TABLA_ANTERIOR not in conexion.introspection.table_names():
+        return
+    Inscripcion = apps.get_model('FitGym', 'Inscripcion')
+    nombre = conexion.ops.quote_name
+    inscripciones, anterior = nombre(Inscripcion._meta.db_table), nombre(TABLA_ANTERIOR)
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {inscripciones} (usuario_id, entrenamiento_id, fecha_apuntado) "
+            f"SELECT a.user_id, a.entrenamiento_id, %s FROM {anterior} a WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {inscripciones} i WHERE i.usuario_id = a.user_id AND i.entrenamiento_id = a.entrenamiento_id)",
+            [timezone.now()],
+        )
+        cursor.execute(f"DROP TABLE {anterior}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0016_ejercicios_ordenados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Sin vuelta atrás: las inscripciones ya están en Inscripcion y el campo de User no existe.
+        migrations.RunPython(copiar_y_borrar_tabla_anterior, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='apuntados',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='entrenamientos_apuntados', through='FitGym.Inscripcion', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0017_entrenamiento_apuntados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionSugerencias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
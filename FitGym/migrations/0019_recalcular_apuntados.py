@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:40
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+"""
+    Recalcula el número de apuntados de todos los entrenamientos a partir de Inscripcion.
+    0012 no podía rellenarlo (el campo añadido a User no forma parte de su estado) y 0013/0017
+    pasan las inscripciones a Inscripcion sin tocar el contador.
+"""
+def recalcular_apuntados(apps, schema_editor):
+    Entrenamiento = apps.get_model('FitGym', 'Entrenamiento')
+    Inscripcion = apps.get_model('FitGym', 'Inscripcion')
+    alias = schema_editor.connection.alias
+    cuenta = (Inscripcion.objects.using(alias).filter(entrenamiento_id=OuterRef('pk'))
+              .order_by().values('entrenamiento_id').annotate(n=Count('*')).values('n'))
+    Entrenamiento.objects.using(alias).update(num_apuntados=Coalesce(Subquery(cuenta, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0018_version_sugerencias'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalcular_apuntados, migrations.RunPython.noop),
+    ]
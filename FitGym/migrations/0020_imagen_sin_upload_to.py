@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FitGym', '0019_recalcular_apuntados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ejercicio',
+            name='imagen',
+            field=models.ImageField(default='static/private-files/ImagenDefault.webp', upload_to='', verbose_name='Imagen'),
+        ),
+        migrations.AlterField(
+            model_name='entrenamiento',
+            name='imagen',
+            field=models.ImageField(default='static/private-files/ImagenDefault.webp', upload_to='', verbose_name='Imagen'),
+        ),
+    ]
@@ -9,14 +9,23 @@ class Ejercicio(models.Model):
     id = models.AutoField(primary_key=True)  # ID único y autoincremental para cada ejercicio.
     nombre = models.CharField(max_length=100, null=False, blank=False, default="", verbose_name='Nombre')  # Nombre obligatorio del ejercicio con máxima longitud de 100 caracteres.
     descripcion = models.TextField(null=False, blank=False, default="", verbose_name='Descripción')  # Descripción obligatoria del ejercicio.
-    imagen = models.ImageField(
-        upload_to='imagenes_ejercicio/',  # Carpeta donde se almacenarán las imágenes de los ejercicios.
+    imagen = models.ImageField(  # Sin upload_to: el almacenamiento (FitGym.almacenamiento) nombra los ficheros por su hash.
         null=False, 
         blank=False, 
         default='static/private-files/ImagenDefault.webp',  # Imagen por defecto si no se proporciona una imagen.
         verbose_name='Imagen'
     )
-    creado = models.DateTimeField(auto_now_add=True, null=True, blank=True)  # Fecha y hora de creación del ejercicio.
+    creado = models.DateTimeField(auto_now_add=True)  # Fecha y hora de creación del ejercicio (no nula, para ordenar por índice).
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Fecha y hora de la última modificación del ejercicio.
+    imagen_derivadas = models.JSONField(default=dict, blank=True, editable=False)  # Miniaturas generadas a partir de la imagen ({formato: {ancho: nombre}}).
+    num_entrenamientos = models.IntegerField(default=0, editable=False)  # Número de entrenamientos que lo incluyen (lo mantiene FitGym.contadores).
+
+    class Meta:
+        indexes = [  # Uno por cada orden del listado (FitGym.views.ORDENES_EJERCICIOS).
+            models.Index(fields=['creado', 'id'], name='ejercicio_creado'),  # Orden por defecto y, leído al revés, los más recientes.
+            models.Index(fields=['nombre', 'id'], name='ejercicio_nombre'),  # Orden alfabético.
+            models.Index(fields=['-num_entrenamientos', 'id'], name='ejercicio_popularidad'),  # Los más usados primero.
+        ]
 
     """
         Representación en cadena del ejercicio.
@@ -25,14 +34,6 @@ class Ejercicio(models.Model):
     def __str__(self):
         return f"Nombre: {self.nombre}"
 
-    """
-        Sobrescribe el método delete para eliminar la imagen del ejercicio de la memoria al eliminar el objeto.
-        Llama al método de eliminación de la clase base para eliminar el objeto.
-    """
-    def delete(self, using=None, keep_parents=False):    
-        self.imagen.storage.delete(self.imagen.name)  # Elimina la imagen del almacenamiento.
-        super().delete()  # Elimina el objeto Ejercicio de la base de datos.
-
 """
     Modelo para representar un entrenamiento.
     Cada entrenamiento tiene un título, una descripción, una lista de ejercicios asociados, 
@@ -42,15 +43,26 @@ class Entrenamiento(models.Model):
     id = models.AutoField(primary_key=True)  # ID único y autoincremental para cada entrenamiento.
     titulo = models.CharField(max_length=100, null=False, blank=False, default="", verbose_name='Titulo')  # Título obligatorio del entrenamiento con máxima longitud de 100 caracteres.
     descripcion = models.TextField(null=False, blank=False, default="", verbose_name='Descripción')  # Descripción obligatoria del entrenamiento.
-    ejercicios = models.ManyToManyField(Ejercicio, verbose_name='Ejercicios', related_name='entrenamientos')  # Relación N:M con el modelo Ejercicio.
-    imagen = models.ImageField(
-        upload_to='imagenes_entrenamiento/',  # Carpeta donde se almacenarán las imágenes de los entrenamientos.
+    ejercicios = models.ManyToManyField(Ejercicio, through='EntrenamientoEjercicio', verbose_name='Ejercicios', related_name='entrenamientos')  # Relación N:M con el modelo Ejercicio, ordenada (ver EntrenamientoEjercicio).
+    apuntados = models.ManyToManyField(User, through='Inscripcion', related_name='entrenamientos_apuntados', blank=True, editable=False)  # Usuarios apuntados (ver Inscripcion); desde el usuario, 'entrenamientos_apuntados'.
+    imagen = models.ImageField(  # Sin upload_to: el almacenamiento (FitGym.almacenamiento) nombra los ficheros por su hash.
         null=False, 
         blank=False, 
         default='static/private-files/ImagenDefault.webp',  # Imagen por defecto si no se proporciona una imagen.
         verbose_name='Imagen'
     )
-    creado = models.DateTimeField(auto_now_add=True, null=True, blank=True)  # Fecha y hora de creación del entrenamiento.
+    creado = models.DateTimeField(auto_now_add=True)  # Fecha y hora de creación del entrenamiento (no nula, para ordenar por índice).
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Fecha y hora de la última modificación del entrenamiento (también al cambiar sus ejercicios).
+    imagen_derivadas = models.JSONField(default=dict, blank=True, editable=False)  # Miniaturas generadas a partir de la imagen ({formato: {ancho: nombre}}).
+    num_ejercicios = models.IntegerField(default=0, editable=False)  # Número de ejercicios (lo mantiene FitGym.contadores).
+    num_apuntados = models.IntegerField(default=0, editable=False)  # Número de usuarios apuntados (lo mantiene FitGym.contadores).
+
+    class Meta:
+        indexes = [  # Uno por cada orden del listado (FitGym.views.ORDENES_ENTRENAMIENTOS).
+            models.Index(fields=['-num_apuntados', 'id'], name='entrenamiento_popularidad'),  # Ordenación por popularidad.
+            models.Index(fields=['creado', 'id'], name='entrenamiento_creado'),  # Orden por defecto y, leído al revés, los más recientes.
+            models.Index(fields=['titulo', 'id'], name='entrenamiento_titulo'),  # Orden alfabético.
+        ]
 
     """
         Representación en cadena del entrenamiento.
@@ -59,13 +71,150 @@ class Entrenamiento(models.Model):
     def __str__(self):
         return f"Titulo: {self.titulo}"
 
-    """
-        Sobrescribe el método delete para eliminar la imagen del entrenamiento de la memoria al eliminar el objeto.
-        Llama al método de eliminación de la clase base para eliminar el objeto.
-    """
-    def delete(self, using=None, keep_parents=False):
-        self.imagen.storage.delete(self.imagen.name)  # Elimina la imagen del almacenamiento.
-        super().delete()  # Elimina el objeto Entrenamiento de la base de datos.
+"""
+    Modelo intermedio de los ejercicios de un entrenamiento.
+    Guarda el orden de cada ejercicio dentro del entrenamiento y su prescripción (series, repeticiones
+    y descanso). Las posiciones solo sirven para ordenar: no tienen por qué ser consecutivas.
+    Los formularios lo guardan con FitGym.rutinas.guardar, que solo escribe las filas que cambian.
+"""
+class EntrenamientoEjercicio(models.Model):
+    entrenamiento = models.ForeignKey(Entrenamiento, on_delete=models.CASCADE, related_name='filas_ejercicios')
+    ejercicio = models.ForeignKey(Ejercicio, on_delete=models.CASCADE, related_name='filas_entrenamientos')
+    posicion = models.PositiveIntegerField(default=0)  # Orden del ejercicio en el entrenamiento (de menor a mayor).
+    series = models.PositiveSmallIntegerField(null=True, blank=True)
+    repeticiones = models.PositiveSmallIntegerField(null=True, blank=True)  # Repeticiones por serie.
+    descanso = models.PositiveSmallIntegerField(null=True, blank=True)  # Segundos de descanso entre series.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entrenamiento', 'ejercicio'], name='entrenamiento_ejercicio_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['entrenamiento', 'posicion'], name='entrenamiento_ejercicio_orden'),  # Lista ordenada de un entrenamiento. No es única para poder reordenar con un solo UPDATE.
+        ]
+
+    def __str__(self):
+        return f"{self.entrenamiento_id} - {self.ejercicio_id} ({self.posicion})"
+
+"""
+    Modelo intermedio de la inscripción de un usuario en un entrenamiento.
+    Guarda cuándo se apuntó, para poder ordenar y paginar la página de entrenamientos apuntados.
+"""
+class Inscripcion(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)  # Usuario apuntado.
+    entrenamiento = models.ForeignKey(Entrenamiento, on_delete=models.CASCADE)  # Entrenamiento al que se apunta.
+    fecha_apuntado = models.DateTimeField(auto_now_add=True)  # Fecha y hora en que se apuntó.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'entrenamiento'], name='inscripcion_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_apuntado'], name='inscripcion_usuario_fecha'),  # "Mis entrenamientos" por fecha.
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} - {self.entrenamiento}"
+
+"""
+    Modelo para representar una entrada del índice invertido de búsqueda.
+    Cada fila relaciona un término normalizado (sin tildes, en minúsculas y reducido a su raíz)
+    con el objeto que lo contiene y el peso que aporta al ranking. Lo mantiene FitGym.busqueda.
+"""
+class TerminoBusqueda(models.Model):
+    termino = models.CharField(max_length=50)  # Término normalizado.
+    modelo = models.CharField(max_length=20)  # Nombre del modelo indexado ('ejercicio' o 'entrenamiento').
+    objeto_id = models.IntegerField()  # ID del ejercicio o entrenamiento que contiene el término.
+    peso = models.FloatField(default=1.0)  # Peso del término en el objeto (campo y frecuencia).
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['modelo', 'termino', 'objeto_id'], name='termino_busqueda_unico'),  # Sirve también de índice para las consultas.
+        ]
+        indexes = [
+            models.Index(fields=['objeto_id', 'modelo'], name='termino_busqueda_objeto'),  # objeto_id primero para que no compita con el índice de términos.
+        ]
+
+    def __str__(self):
+        return f"{self.modelo}:{self.objeto_id} -> {self.termino}"
+
+"""
+    Modelo para representar una tarea en segundo plano.
+    Las tareas se encolan desde las vistas y señales (procesar imágenes, borrar ficheros...) y
+    las ejecuta el comando 'procesar_tareas'. La clave opcional hace que encolar dos veces la
+    misma tarea no la duplique.
+"""
+class Tarea(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)  # Nombre de la tarea registrada en FitGym.tareas.
+    clave = models.CharField(max_length=255, unique=True, null=True, blank=True)  # Clave de idempotencia.
+    datos = models.JSONField(default=dict, blank=True)  # Argumentos de la tarea.
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)  # Número de ejecuciones fallidas.
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField()  # No se ejecuta antes de esta fecha (reintentos y bloqueo de los workers).
+    error = models.TextField(blank=True, default='')  # Traza del último error.
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='tarea_estado_ejecutar'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.estado})"
+
+"""
+    Modelo para guardar los entrenamientos más parecidos a cada entrenamiento, ya calculados.
+    Cada fila es uno de los similares, con su puntuación (similitud del coseno) y su posición en la lista.
+    Lo rellena 'python manage.py calcular_similares' y lo mantiene FitGym.recomendaciones.
+"""
+class EntrenamientoSimilar(models.Model):
+    entrenamiento = models.ForeignKey(Entrenamiento, on_delete=models.CASCADE, related_name='similares_calculados')
+    similar = models.ForeignKey(Entrenamiento, on_delete=models.CASCADE, related_name='similar_a')
+    puntuacion = models.FloatField()  # Similitud del coseno entre los dos entrenamientos (0-1).
+    posicion = models.PositiveSmallIntegerField()  # 0 para el más parecido.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entrenamiento', 'posicion'], name='entrenamiento_similar_posicion'),  # Sirve de índice para leer la lista en orden.
+        ]
 
-# Se agrega un campo ManyToMany al modelo User para representar los entrenamientos apuntados por un usuario.
-User.add_to_class('entrenamientos_apuntados', models.ManyToManyField(Entrenamiento, related_name='apuntados', blank=True))
\ No newline at end of file
+    def __str__(self):
+        return f"{self.entrenamiento_id} -> {self.similar_id} ({self.puntuacion:.2f})"
+
+"""
+    Modelo para llevar la cuenta de referencias de cada fichero de imagen.
+    Con el almacenamiento por contenido varios ejercicios y entrenamientos pueden compartir el mismo
+    fichero; solo se borra del disco cuando su contador llega a cero (ver FitGym.almacenamiento).
+"""
+class FicheroContenido(models.Model):
+    nombre = models.CharField(max_length=255, unique=True)  # Nombre del fichero en el almacenamiento.
+    referencias = models.IntegerField(default=0)  # Número de ejercicios y entrenamientos que lo usan.
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias})"
+
+"""
+    Modelo para guardar la versión del índice de sugerencias de cada modelo (ver FitGym.sugerencias).
+    Solo cambia al crear, renombrar o borrar un ejercicio o entrenamiento; cada proceso la consulta
+    para saber si tiene que reconstruir su índice en memoria.
+"""
+class VersionSugerencias(models.Model):
+    modelo = models.CharField(max_length=20, unique=True)  # 'ejercicio' o 'entrenamiento'.
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.modelo} (v{self.version})"
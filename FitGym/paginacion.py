@@ -0,0 +1,204 @@
+import collections.abc
+import hashlib
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+"""
+    Paginación por cursor (keyset) para los listados del catálogo.
+
+    En lugar de COUNT(*) + OFFSET, cada página se pide con un filtro sobre la clave de
+    ordenación (por defecto (creado, id)) a partir del último elemento visto, por lo que el coste
+    de una página no depende de lo lejos que esté del principio si hay un índice con esos campos.
+    Los cursores que se envían al navegador van firmados, así que son opacos y no se pueden manipular.
+"""
+
+SAL_CURSOR = 'FitGym.paginacion.cursor'  # Sal de la firma de los cursores.
+ORDEN_PREDETERMINADO = ('creado', 'id')  # El último campo debe ser único y no nulo (el id) para desempatar.
+DURACION_TOTAL_APROXIMADO = 300  # Segundos que se guarda en caché un total aproximado.
+
+"""
+    Codifica la posición de un objeto en el orden indicado y la dirección de avance en un cursor opaco.
+    El cursor guarda también el orden, para no aplicarlo a un listado ordenado de otra forma.
+"""
+def codificar_cursor(objeto, direccion, orden=ORDEN_PREDETERMINADO):
+    valores = [getattr(objeto, campo.lstrip('-')) for campo in orden]
+    valores = [valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in valores]  # Fechas como texto ISO.
+    return signing.dumps({'o': list(orden), 'v': valores, 'd': direccion}, salt=SAL_CURSOR)
+
+"""
+    Decodifica un cursor del orden indicado. Devuelve None si no hay cursor, si no es válido o si
+    es de otro orden.
+"""
+def decodificar_cursor(cursor, orden=ORDEN_PREDETERMINADO):
+    if not cursor:
+        return None
+    try:
+        datos = signing.loads(cursor, salt=SAL_CURSOR)
+    except signing.BadSignature:
+        return None
+    if datos.get('d') not in ('n', 'p') or datos.get('o') != list(orden) or len(datos.get('v') or ()) != len(orden):
+        return None
+    return datos
+
+"""
+    Devuelve un total aproximado de filas sin pagar un COUNT(*) en cada petición.
+    En MySQL, si la consulta no tiene filtros, usa la estimación de information_schema;
+    en el resto de casos guarda el COUNT en caché durante unos minutos.
+"""
+def total_aproximado(queryset):
+    conexion = connections[queryset.db]
+    if conexion.vendor == 'mysql' and not queryset.query.where:
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table],
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] is not None:
+            return fila[0]
+
+    clave = 'fitgym:total:' + hashlib.md5(str(queryset.order_by().query).encode()).hexdigest()
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, DURACION_TOTAL_APROXIMADO)
+    return total
+
+"""
+    Página devuelta por CursorPaginator.
+    Se comporta como una secuencia (igual que django.core.paginator.Page) y expone los
+    cursores de la página anterior y siguiente para construir los enlaces.
+"""
+class PaginaCursor(collections.abc.Sequence):
+    es_cursor = True  # Permite a las plantillas distinguir este modo de la paginación numerada.
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total_aproximado=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_aproximado = total_aproximado
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def __repr__(self):
+        return f"<PaginaCursor ({len(self)} objetos)>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+"""
+    Paginador por cursor sobre un queryset, ordenado por los campos de 'orden' ('-' para
+    descendente). Los valores nulos van al principio en orden ascendente y al final en orden
+    descendente, igual que hacen MySQL y SQLite.
+"""
+class CursorPaginator:
+
+    def __init__(self, queryset, per_page, total_aproximado=False, orden=ORDEN_PREDETERMINADO):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.total_aproximado = total_aproximado
+        self.orden = tuple(orden)
+
+    """
+        Devuelve la página que empieza (o termina) en el cursor indicado.
+        Si el cursor falta o no es válido, devuelve la primera página.
+    """
+    def get_page(self, cursor=None):
+        datos = decodificar_cursor(cursor, self.orden)
+        filas = list(self._consulta(datos))
+        if self._vuelve_al_principio(datos, filas):
+            return self.get_page(None)
+        return self._pagina(datos, filas, total_aproximado(self.queryset) if self.total_aproximado else None)
+
+    """
+        Versión asíncrona de get_page para las vistas asíncronas (lee las filas con iteración asíncrona).
+    """
+    async def aget_page(self, cursor=None):
+        datos = decodificar_cursor(cursor, self.orden)
+        filas = [objeto async for objeto in self._consulta(datos)]
+        if self._vuelve_al_principio(datos, filas):
+            return await self.aget_page(None)
+        total = await sync_to_async(total_aproximado)(self.queryset) if self.total_aproximado else None
+        return self._pagina(datos, filas, total)
+
+    """
+        Consulta de las filas de la página (una más de las necesarias para saber si hay otra página).
+        Al retroceder se recorre el orden inverso, que usa el mismo índice leído al revés.
+    """
+    def _consulta(self, datos):
+        if datos is None:
+            return self.queryset.order_by(*self.orden)[:self.per_page + 1]
+        adelante = datos['d'] == 'n'
+        orden = self.orden if adelante else [campo[1:] if campo.startswith('-') else '-' + campo for campo in self.orden]
+        condicion = self._despues(0, datos['v'], adelante) & self._cota(datos['v'][0], adelante)
+        return self.queryset.filter(condicion).order_by(*orden)[:self.per_page + 1]
+
+    """
+        Al retroceder, si no quedan filas suficientes se ha llegado al principio: se devuelve la primera página completa.
+    """
+    def _vuelve_al_principio(self, datos, filas):
+        return datos is not None and datos['d'] == 'p' and len(filas) <= self.per_page
+
+    def _pagina(self, datos, filas, total):
+        if datos is None:
+            hay_mas, hay_antes = len(filas) > self.per_page, False
+        elif datos['d'] == 'n':
+            hay_mas, hay_antes = len(filas) > self.per_page, True
+        else:
+            hay_mas, hay_antes = True, True
+            filas = filas[:self.per_page][::-1]
+        filas = filas[:self.per_page]
+
+        return PaginaCursor(
+            filas,
+            next_cursor=codificar_cursor(filas[-1], 'n', self.orden) if filas and hay_mas else None,
+            previous_cursor=codificar_cursor(filas[0], 'p', self.orden) if filas and hay_antes else None,
+            total_aproximado=total,
+        )
+
+    """
+        Condición para los objetos situados después (o antes, con 'adelante' False) de la posición
+        del cursor a partir del campo 'i': estrictamente después en ese campo, o igual en él y
+        después en los siguientes.
+    """
+    def _despues(self, i, valores, adelante):
+        campo, valor = self.orden[i].lstrip('-'), valores[i]
+        condicion = self._comparar(campo, valor, menor=adelante == self.orden[i].startswith('-'))
+        if i < len(self.orden) - 1:
+            igual = Q(**{f'{campo}__isnull': True}) if valor is None else Q(**{campo: valor})
+            resto = igual & self._despues(i + 1, valores, adelante)
+            condicion = resto if condicion is None else condicion | resto
+        return condicion
+
+    """
+        Cota del primer campo, redundante con la condición de _despues pero sin OR: permite a la
+        base de datos recorrer el índice desde la posición del cursor, en orden y sin ordenar después.
+    """
+    def _cota(self, valor, adelante):
+        campo = self.orden[0].lstrip('-')
+        menor = adelante == self.orden[0].startswith('-')
+        if valor is None or (menor and self.queryset.model._meta.get_field(campo).null):
+            return Q()  # Con nulos la cota necesitaría un OR: se deja solo la condición completa.
+        return Q(**{f'{campo}__lte' if menor else f'{campo}__gte': valor})
+
+    """
+        Condición de ser estrictamente menor (o mayor) que 'valor' en un campo, teniendo en cuenta
+        que los nulos van antes que cualquier valor. Devuelve None si ninguna fila puede cumplirla.
+    """
+    def _comparar(self, campo, valor, menor):
+        if valor is None:
+            return None if menor else Q(**{f'{campo}__isnull': False})
+        condicion = Q(**{f'{campo}__lt' if menor else f'{campo}__gt': valor})
+        if menor and self.queryset.model._meta.get_field(campo).null:
+            condicion |= Q(**{f'{campo}__isnull': True})
+        return condicion
@@ -0,0 +1,205 @@
+import heapq
+import math
+from collections import defaultdict
+from django.db.models import Count
+from .models import Entrenamiento, EntrenamientoSimilar, Inscripcion
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # NumPy y SciPy son opcionales: sin ellos se usa el índice invertido en Python.
+    np = sparse = None
+
+"""
+    Recomendaciones de entrenamientos similares.
+
+    Cada entrenamiento es un vector disperso con un rasgo por cada ejercicio que incluye y por cada
+    usuario apuntado, ponderados con IDF (un ejercicio o usuario presente en pocos entrenamientos dice
+    más que uno presente en casi todos). La similitud entre dos entrenamientos es el coseno de sus
+    vectores y para cada uno se guardan los NUM_SIMILARES más parecidos en EntrenamientoSimilar, así
+    que la página de detalle los lee con una consulta indexada.
+    - 'python manage.py calcular_similares' lo recalcula todo: con NumPy/SciPy, como productos de
+      matrices dispersas por bloques de filas; sin ellos, con un índice invertido de rasgos.
+    - Al cambiar los ejercicios de un entrenamiento, la tarea 'actualizar_similares' recalcula su lista
+      y la coloca en la de sus vecinos. Si deja de estar en la lista de otro entrenamiento, esa lista se
+      queda con un similar menos hasta el siguiente cálculo completo.
+    Los rasgos presentes en más de MAX_ENTRENAMIENTOS_RASGO entrenamientos se ignoran: apenas distinguen
+    y son los que harían crecer el cálculo con el cuadrado del número de entrenamientos.
+"""
+
+NUM_SIMILARES = 6
+PESO_EJERCICIO = 1.0
+PESO_APUNTADO = 0.5  # Compartir usuarios cuenta menos que compartir ejercicios.
+MAX_ENTRENAMIENTOS_RASGO = 2000
+FILAS_POR_BLOQUE = 512  # Filas de la matriz de similitudes que se calculan a la vez con NumPy.
+
+"""
+    Relaciones de las que salen los rasgos: (consulta, campo del rasgo, tipo de rasgo, peso).
+"""
+def relaciones():
+    return (
+        (Entrenamiento.ejercicios.through.objects, 'ejercicio_id', 'e', PESO_EJERCICIO),
+        (Inscripcion.objects, 'usuario_id', 'u', PESO_APUNTADO),
+    )
+
+"""
+    Lee los rasgos de los entrenamientos indicados (o de todos): {entrenamiento_id: {rasgo: peso}},
+    donde cada rasgo es ('e', id del ejercicio) o ('u', id del usuario).
+"""
+def rasgos(ids=None):
+    pares = defaultdict(dict)
+    for consulta, campo, tipo, peso in relaciones():
+        if ids is not None:
+            consulta = consulta.filter(entrenamiento_id__in=ids)
+        for entrenamiento_id, rasgo_id in consulta.values_list('entrenamiento_id', campo).iterator(chunk_size=10000):
+            pares[entrenamiento_id][(tipo, rasgo_id)] = peso
+    return pares
+
+"""
+    Número de entrenamientos que tiene cada uno de los rasgos indicados, contado en la base de datos.
+"""
+def frecuencias(rasgos_buscados):
+    resultado = {}
+    for consulta, campo, tipo, _ in relaciones():
+        ids = [rasgo_id for t, rasgo_id in rasgos_buscados if t == tipo]
+        if ids:
+            cuentas = consulta.filter(**{f'{campo}__in': ids}).order_by().values_list(campo).annotate(n=Count('entrenamiento_id'))
+            resultado.update(((tipo, rasgo_id), n) for rasgo_id, n in cuentas)
+    return resultado
+
+"""
+    Convierte los rasgos en vectores con peso IDF y norma 1, sin los rasgos demasiado frecuentes.
+    Los entrenamientos que se quedan sin rasgos no aparecen en el resultado.
+"""
+def vectores(pares, frecuencia, total):
+    resultado = {}
+    for entrenamiento_id, rasgos_entrenamiento in pares.items():
+        vector = {rasgo: peso * math.log(1 + total / frecuencia[rasgo])
+                  for rasgo, peso in rasgos_entrenamiento.items() if 0 < frecuencia.get(rasgo, 0) <= MAX_ENTRENAMIENTOS_RASGO}
+        norma = math.sqrt(sum(valor * valor for valor in vector.values()))
+        if norma:
+            resultado[entrenamiento_id] = {rasgo: valor / norma for rasgo, valor in vector.items()}
+    return resultado
+
+"""
+    Los 'k' mejores pares (id, puntuación) con puntuación positiva; a igual puntuación, el id menor.
+"""
+def mejores(puntuaciones, k=NUM_SIMILARES):
+    return heapq.nlargest(k, ((id_, p) for id_, p in puntuaciones if p > 0), key=lambda par: (par[1], -par[0]))
+
+"""
+    Calcula los similares de todos los entrenamientos: {entrenamiento_id: [(similar_id, puntuación)]}.
+"""
+def calcular(vectores_entrenamientos, k=NUM_SIMILARES):
+    if np is not None:
+        return _calcular_matrices(vectores_entrenamientos, k)
+    indice = defaultdict(list)  # rasgo -> [(entrenamiento_id, valor)]
+    for entrenamiento_id, vector in vectores_entrenamientos.items():
+        for rasgo, valor in vector.items():
+            indice[rasgo].append((entrenamiento_id, valor))
+    resultado = {}
+    for entrenamiento_id, vector in vectores_entrenamientos.items():
+        acumulado = defaultdict(float)
+        for rasgo, valor in vector.items():
+            for otro_id, otro_valor in indice[rasgo]:
+                acumulado[otro_id] += valor * otro_valor
+        acumulado.pop(entrenamiento_id, None)
+        resultado[entrenamiento_id] = mejores(acumulado.items(), k)
+    return resultado
+
+"""
+    Versión con NumPy/SciPy de 'calcular': la matriz entrenamientos x rasgos (filas de norma 1) se
+    multiplica por su traspuesta por bloques de filas, y de cada fila se eligen los k mayores con argpartition.
+"""
+def _calcular_matrices(vectores_entrenamientos, k):
+    ids = list(vectores_entrenamientos)
+    columnas = {}
+    filas, indices, valores = [], [], []
+    for fila, entrenamiento_id in enumerate(ids):
+        for rasgo, valor in vectores_entrenamientos[entrenamiento_id].items():
+            filas.append(fila)
+            indices.append(columnas.setdefault(rasgo, len(columnas)))
+            valores.append(valor)
+    matriz = sparse.csr_matrix((np.array(valores, dtype=np.float32), (filas, indices)), shape=(len(ids), len(columnas)))
+    traspuesta = matriz.T.tocsc()
+    ids_array = np.array(ids)
+    k = min(k, len(ids) - 1)
+    resultado = {}
+    for inicio in range(0, len(ids), FILAS_POR_BLOQUE):
+        bloque = (matriz[inicio:inicio + FILAS_POR_BLOQUE] @ traspuesta).toarray()
+        filas_bloque = np.arange(bloque.shape[0])
+        bloque[filas_bloque, filas_bloque + inicio] = 0  # Sin el propio entrenamiento.
+        if k <= 0:
+            elegidos = np.empty((bloque.shape[0], 0), dtype=int)
+        else:
+            elegidos = np.argpartition(-bloque, k - 1, axis=1)[:, :k]
+        for fila, columnas_fila in zip(filas_bloque, elegidos):
+            puntuaciones = zip(ids_array[columnas_fila].tolist(), bloque[fila, columnas_fila].tolist())
+            resultado[ids[inicio + fila]] = mejores(puntuaciones, k)
+    return resultado
+
+"""
+    Sustituye las listas guardadas de los entrenamientos indicados (o de todos, con ids=None).
+    Devuelve el número de filas escritas.
+"""
+def guardar(similares, ids=None):
+    anteriores = EntrenamientoSimilar.objects.all() if ids is None else EntrenamientoSimilar.objects.filter(entrenamiento_id__in=ids)
+    anteriores.delete()
+    filas = [EntrenamientoSimilar(entrenamiento_id=entrenamiento_id, similar_id=similar_id, puntuacion=puntuacion, posicion=posicion)
+             for entrenamiento_id, lista in similares.items() for posicion, (similar_id, puntuacion) in enumerate(lista)]
+    EntrenamientoSimilar.objects.bulk_create(filas, batch_size=2000)
+    return len(filas)
+
+"""
+    Recalcula y guarda los similares de todos los entrenamientos. Devuelve el número de filas.
+"""
+def reconstruir(k=NUM_SIMILARES):
+    pares = rasgos()
+    frecuencia = defaultdict(int)
+    for rasgos_entrenamiento in pares.values():
+        for rasgo in rasgos_entrenamiento:
+            frecuencia[rasgo] += 1
+    similares = calcular(vectores(pares, frecuencia, Entrenamiento.objects.count()), k)
+    return guardar(similares)
+
+"""
+    Recalcula los similares de un entrenamiento cuya lista de ejercicios ha cambiado y lo coloca
+    (o lo quita) en las listas de los entrenamientos con los que comparte rasgos o que ya lo tenían.
+"""
+def actualizar(entrenamiento_id, k=NUM_SIMILARES):
+    propios = rasgos([entrenamiento_id]).get(entrenamiento_id, {})
+    frecuencia = frecuencias(propios)
+    utiles = [rasgo for rasgo in propios if 0 < frecuencia.get(rasgo, 0) <= MAX_ENTRENAMIENTOS_RASGO]
+    candidatos = set()
+    for consulta, campo, tipo, _ in relaciones():
+        ids = [rasgo_id for t, rasgo_id in utiles if t == tipo]
+        if ids:
+            candidatos.update(consulta.filter(**{f'{campo}__in': ids}).values_list('entrenamiento_id', flat=True))
+    candidatos.discard(entrenamiento_id)
+
+    pares = rasgos(candidatos) if candidatos else {}
+    pares[entrenamiento_id] = propios
+    frecuencia = frecuencias({rasgo for rasgos_entrenamiento in pares.values() for rasgo in rasgos_entrenamiento})
+    vectores_entrenamientos = vectores(pares, frecuencia, Entrenamiento.objects.count())
+    propio = vectores_entrenamientos.get(entrenamiento_id, {})
+    puntuaciones = {otro_id: sum(valor * vector.get(rasgo, 0) for rasgo, valor in propio.items())
+                    for otro_id, vector in vectores_entrenamientos.items() if otro_id != entrenamiento_id}
+
+    vecinos = candidatos | set(EntrenamientoSimilar.objects.filter(similar_id=entrenamiento_id).values_list('entrenamiento_id', flat=True))
+    actuales = defaultdict(list)
+    for otro_id, similar_id, puntuacion in (EntrenamientoSimilar.objects.filter(entrenamiento_id__in=vecinos)
+                                            .order_by('entrenamiento_id', 'posicion').values_list('entrenamiento_id', 'similar_id', 'puntuacion')):
+        actuales[otro_id].append((similar_id, puntuacion))
+    nuevas = {entrenamiento_id: mejores(puntuaciones.items(), k)}
+    for otro_id in vecinos:
+        lista = [(similar_id, p) for similar_id, p in actuales[otro_id] if similar_id != entrenamiento_id]
+        lista = mejores(lista + [(entrenamiento_id, puntuaciones.get(otro_id, 0))], k)
+        if lista != actuales[otro_id]:
+            nuevas[otro_id] = lista
+    guardar(nuevas, list(nuevas))
+
+"""
+    Entrenamientos similares a uno dado, ya calculados y en orden, con una sola consulta.
+"""
+def similares(entrenamiento_id):
+    return Entrenamiento.objects.filter(similar_a__entrenamiento_id=entrenamiento_id).order_by('similar_a__posicion')
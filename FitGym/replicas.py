@@ -0,0 +1,111 @@
+import contextvars
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+"""
+    Reparto de las consultas entre la base de datos primaria y las réplicas de lectura.
+
+    Durante una petición GET/HEAD las lecturas van a una de las réplicas de BD_REPLICAS y las
+    escrituras siempre a la primaria ('default'). Para que cada usuario vea sus propios cambios
+    aunque la réplica vaya con retraso:
+    - en cuanto la petición escribe, sus lecturas siguientes van a la primaria;
+    - la respuesta lleva la cookie COOKIE_PRIMARIA durante BD_SEGUNDOS_PRIMARIA segundos y,
+      mientras el navegador la envíe, todas sus peticiones leen de la primaria;
+    - los POST (formularios, inscripciones) y las lecturas dentro de una transacción también
+      leen de la primaria.
+    Fuera de una petición (comandos, worker de tareas) todo va a la primaria.
+"""
+
+COOKIE_PRIMARIA = 'fitgym_primaria'
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+"""
+    Estado de la petición actual: si debe leer de la primaria, si ya ha escrito y cuántas
+    transacciones había abiertas al empezar (las de las pruebas, o ninguna). Es mutable para que
+    las escrituras hechas en otro hilo (sync_to_async copia el contexto) se vean aquí.
+"""
+class EstadoPeticion:
+
+    def __init__(self, primaria, transacciones=0):
+        self.primaria = primaria
+        self.escrito = False
+        self.transacciones = transacciones
+
+_peticion_actual = contextvars.ContextVar('fitgym_replicas', default=None)
+
+"""
+    Router de base de datos (DATABASE_ROUTERS) que envía las lecturas a las réplicas.
+"""
+class EnrutadorReplicas:
+
+    def db_for_read(self, model, **hints):
+        estado = _peticion_actual.get()
+        replicas = settings.BD_REPLICAS
+        if estado is None or estado.primaria or estado.escrito or not replicas:
+            return DEFAULT_DB_ALIAS
+        if len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > estado.transacciones:  # Lo leído en una transacción se usa para escribir.
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        estado = _peticion_actual.get()
+        if estado is not None:
+            estado.escrito = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *settings.BD_REPLICAS}  # Todas tienen los mismos datos.
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return None
+
+"""
+    Middleware que marca el inicio y el fin de cada petición para el router y pone la cookie de
+    lectura en la primaria cuando la petición ha escrito. Debe ir antes de SessionMiddleware, porque
+    la sesión también se lee con el router. Funciona en modo síncrono y asíncrono.
+    En las respuestas en streaming, el contenido se genera fuera de la petición y se lee de la primaria.
+"""
+class ReplicasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        estado = self.estado(request, len(connections[DEFAULT_DB_ALIAS].atomic_blocks))
+        token = _peticion_actual.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        return self.recordar(estado, response)
+
+    async def __acall__(self, request):
+        estado = self.estado(request)
+        token = _peticion_actual.set(estado)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        return self.recordar(estado, response)
+
+    def estado(self, request, transacciones=0):  # En modo asíncrono las consultas se hacen en otro hilo, sin transacciones previas.
+        primaria = request.method not in METODOS_LECTURA or COOKIE_PRIMARIA in request.COOKIES
+        return EstadoPeticion(primaria, transacciones)
+
+    def recordar(self, estado, response):
+        if estado.escrito and settings.BD_REPLICAS:
+            segundos = settings.BD_SEGUNDOS_PRIMARIA
+            response.set_cookie(COOKIE_PRIMARIA, '1', max_age=segundos, httponly=True, samesite='Lax')
+        return response
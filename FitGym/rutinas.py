@@ -0,0 +1,77 @@
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed
+from django.utils import timezone
+from .models import Ejercicio, Entrenamiento, EntrenamientoEjercicio
+
+"""
+    Listas ordenadas de ejercicios de los entrenamientos, con su prescripción (series, repeticiones y descanso).
+
+    Guardar una lista solo escribe la diferencia con la que hay en la base de datos: un DELETE para
+    los ejercicios quitados, un INSERT por lotes para los añadidos y un único UPDATE (bulk_update)
+    para los que cambian de posición o de prescripción. Reordenar un entrenamiento es, por tanto,
+    una sola sentencia. Como bulk_create y delete no envían m2m_changed, se envían aquí para que
+    los contadores, las tarjetas, la fecha de modificación y los similares se mantengan igual que con .set().
+"""
+
+CAMPOS_FILA = ['posicion', 'series', 'repeticiones', 'descanso']
+ORDEN = ('posicion', 'id')  # Orden de la lista; el id desempata y permite paginar por cursor.
+
+"""
+    Ejercicios de un entrenamiento en orden, con su prescripción: filas de EntrenamientoEjercicio
+    con el ejercicio ya cargado (una sola consulta).
+"""
+def ejercicios_ordenados(entrenamiento_id):
+    return (EntrenamientoEjercicio.objects.filter(entrenamiento_id=entrenamiento_id)
+            .select_related('ejercicio').order_by(*ORDEN))
+
+"""
+    Posición y prescripción de unas filas, para que formen parte del ETag de la página que las muestra.
+"""
+def prescripciones(filas):
+    return [tuple(getattr(fila, campo) for campo in CAMPOS_FILA) for fila in filas]
+
+def _avisar(entrenamiento, accion, ids, using):
+    m2m_changed.send(sender=EntrenamientoEjercicio, instance=entrenamiento, action=accion, reverse=False,
+                     model=Ejercicio, pk_set=ids, using=using)
+
+"""
+    Sustituye la lista de ejercicios de un entrenamiento por 'filas', una secuencia ordenada de
+    (ejercicio_id, series, repeticiones, descanso); un ejercicio repetido cuenta solo la primera vez.
+    Devuelve (añadidos, quitados, actualizados).
+"""
+def guardar(entrenamiento, filas):
+    deseadas = {}
+    for ejercicio_id, series, repeticiones, descanso in filas:
+        if ejercicio_id not in deseadas:
+            deseadas[ejercicio_id] = {'posicion': len(deseadas), 'series': series, 'repeticiones': repeticiones, 'descanso': descanso}
+    using = router.db_for_write(EntrenamientoEjercicio, instance=entrenamiento)
+    with transaction.atomic(using=using, savepoint=False):  # Como .set(): sin punto de guardado propio.
+        actuales = {fila.ejercicio_id: fila for fila in
+                    EntrenamientoEjercicio.objects.using(using).filter(entrenamiento_id=entrenamiento.pk).select_for_update()}
+        quitados = set(actuales) - set(deseadas)
+        nuevos = [EntrenamientoEjercicio(entrenamiento_id=entrenamiento.pk, ejercicio_id=ejercicio_id, **valores)
+                  for ejercicio_id, valores in deseadas.items() if ejercicio_id not in actuales]
+        cambiados = []
+        for ejercicio_id, valores in deseadas.items():
+            fila = actuales.get(ejercicio_id)
+            if fila is not None and any(getattr(fila, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(fila, campo, valor)
+                cambiados.append(fila)
+
+        if quitados:
+            _avisar(entrenamiento, 'pre_remove', quitados, using)
+            EntrenamientoEjercicio.objects.using(using).filter(pk__in=[actuales[i].pk for i in quitados]).delete()
+            _avisar(entrenamiento, 'post_remove', quitados, using)
+        if cambiados:
+            EntrenamientoEjercicio.objects.using(using).bulk_update(cambiados, CAMPOS_FILA)
+        if nuevos:
+            insertados = {fila.ejercicio_id for fila in nuevos}
+            _avisar(entrenamiento, 'pre_add', insertados, using)
+            EntrenamientoEjercicio.objects.using(using).bulk_create(nuevos)
+            _avisar(entrenamiento, 'post_add', insertados, using)
+        elif cambiados and not quitados:  # Sin m2m_changed: la fecha de modificación se actualiza aquí.
+            ahora = timezone.now()
+            Entrenamiento.objects.using(using).filter(pk=entrenamiento.pk).update(actualizado=ahora)
+            entrenamiento.actualizado = ahora
+    return len(nuevos), len(quitados), len(cambiados)
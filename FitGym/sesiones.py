@@ -0,0 +1,115 @@
+import copy
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher
+from django.contrib.sessions.backends import cached_db
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from . import limites
+
+"""
+    Sesiones y autenticación con el mínimo de consultas por petición.
+
+    - SessionStore (SESSION_ENGINE = 'FitGym.sesiones') guarda las sesiones como 'cached_db': se
+      leen de la caché y solo van a la base de datos si no están. Además, la sesión solo se escribe
+      si su contenido ha cambiado de verdad, no solo porque se haya asignado una clave.
+    - BackendUsuarioCacheado (AUTHENTICATION_BACKENDS) guarda en caché el usuario de la sesión,
+      así que una petición autenticada no hace el SELECT de auth_user. Las señales borran la entrada
+      al guardar o borrar el usuario: cambiar la contraseña sigue cerrando las demás sesiones.
+      Al iniciar sesión, la contraseña se comprueba con limites.hashear (en el grupo de hilos de hash).
+    Con la sesión y el usuario en caché, una petición autenticada no hace ninguna consulta de
+    autenticación; si la caché los ha perdido, una por cada uno.
+
+    Las dos cachés necesitan una caché compartida por todos los procesos (SESSION_CACHE_ALIAS: Redis,
+    Memcached, base de datos...): con una en memoria, cerrar sesión o cambiar la contraseña en un proceso
+    no llegaría a los demás. Si la caché configurada es local al proceso y SESIONES_CACHE_LOCAL no lo
+    permite (solo sirve con un único proceso, como runserver o las pruebas), las sesiones se leen y
+    escriben solo en la base de datos y el usuario no se guarda en caché.
+"""
+
+PREFIJO_USUARIO = 'fitgym:usuario:'
+CACHES_LOCALES = {'django.core.cache.backends.locmem.LocMemCache'}  # Backends cuya caché es propia de cada proceso.
+SIN_CACHE = DummyCache('sesiones', {})  # No guarda nada: cada lectura va a la base de datos.
+
+"""
+    Devuelve la caché de las sesiones y los usuarios, o None si es local al proceso y no se permite usarla.
+"""
+def cache_compartida():
+    alias = settings.SESSION_CACHE_ALIAS
+    if settings.CACHES[alias]['BACKEND'] in CACHES_LOCALES and not settings.SESIONES_CACHE_LOCAL:
+        return None
+    return caches[alias]
+
+"""
+    Sesión 'cached_db' que no se vuelve a escribir si su contenido es el mismo que se cargó.
+"""
+class SessionStore(cached_db.SessionStore):
+    _cargada = None  # Copia de lo leído del almacenamiento (None si todavía no se ha leído).
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = cache_compartida() or SIN_CACHE  # Sin caché compartida funciona como el backend 'db'.
+
+    def load(self):
+        datos = super().load()
+        self._cargada = copy.deepcopy(datos)
+        return datos
+
+    def save(self, must_create=False):
+        if (not must_create and self.session_key is not None and self._cargada is not None
+                and not settings.SESSION_SAVE_EVERY_REQUEST and self._get_session() == self._cargada):
+            return  # Se marcó como modificada, pero tiene lo mismo que ya está guardado.
+        super().save(must_create)
+        self._cargada = copy.deepcopy(self._get_session())
+
+"""
+    Backend de autenticación que lee de la caché el usuario de la sesión y calcula los hashes
+    de las contraseñas con limites.hashear. La consulta del usuario se hace en el hilo de la petición.
+"""
+class BackendUsuarioCacheado(ModelBackend):
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        modelo = get_user_model()
+        if username is None:
+            username = kwargs.get(modelo.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            usuario = modelo._default_manager.get_by_natural_key(username)
+        except modelo.DoesNotExist:
+            limites.hashear(get_hasher().encode, password, get_hasher().salt())  # Mismo tiempo que con un usuario existente.
+            return None
+        if not limites.hashear(check_password, password, usuario.password) or not self.user_can_authenticate(usuario):
+            return None
+        if identify_hasher(usuario.password).must_update(usuario.password):  # Hash con un algoritmo o iteraciones antiguos.
+            limites.hashear(usuario.set_password, password)
+            usuario.save(update_fields=['password'])
+        return usuario
+
+    def get_user(self, user_id):
+        almacen = cache_compartida()
+        if almacen is None:
+            return super().get_user(user_id)
+        usuario = almacen.get(PREFIJO_USUARIO + str(user_id))
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                recordar_usuario(usuario)
+        return usuario if self.user_can_authenticate(usuario) else None
+
+"""
+    Borra de la caché el usuario indicado, para que la siguiente petición lo lea de la base de datos.
+"""
+def olvidar_usuario(pk):
+    almacen = cache_compartida()
+    if almacen is not None:
+        almacen.delete(PREFIJO_USUARIO + str(pk))
+
+"""
+    Guarda en caché un usuario ya cargado (al iniciar sesión), para que la siguiente petición no lo consulte.
+"""
+def recordar_usuario(usuario):
+    almacen = cache_compartida()
+    if almacen is not None:
+        almacen.set(PREFIJO_USUARIO + str(usuario.pk), usuario, settings.SESION_USUARIO_TIMEOUT)
@@ -0,0 +1,227 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import almacenamiento, busqueda, contadores, sesiones, sugerencias, tareas
+from .models import Ejercicio, Entrenamiento
+
+"""
+    Señales de la aplicación FitGym.
+    Mantienen actualizado el índice de búsqueda, generan las miniaturas y llevan la cuenta de referencias de las imágenes cada vez que se
+    guarda o se elimina un ejercicio o un entrenamiento, y mantienen los contadores de ejercicios y apuntados
+    y los entrenamientos similares. También renuevan la versión del índice de sugerencias al cambiar un título.
+    También quitan de la caché de sesiones el usuario que se modifica o se borra.
+"""
+
+"""
+    Reindexa el ejercicio o entrenamiento que se acaba de guardar.
+"""
+@receiver(post_save, sender=Ejercicio)
+@receiver(post_save, sender=Entrenamiento)
+def indexar_objeto(sender, instance, raw=False, **kwargs):
+    if raw:  # No se indexa al cargar fixtures, se hace después con 'reconstruir_indice_busqueda'.
+        return
+    busqueda.indexar(instance)
+
+"""
+    Elimina del índice de búsqueda el ejercicio o entrenamiento borrado.
+"""
+@receiver(post_delete, sender=Ejercicio)
+@receiver(post_delete, sender=Entrenamiento)
+def desindexar_objeto(sender, instance, **kwargs):
+    busqueda.desindexar(instance)
+
+"""
+    Sube la versión del índice de sugerencias del modelo cuando se crea, se borra o se guarda un
+    objeto, salvo si se guardan solo otros campos (miniaturas, contadores...).
+"""
+@receiver(post_save, sender=Ejercicio)
+@receiver(post_save, sender=Entrenamiento)
+@receiver(post_delete, sender=Ejercicio)
+@receiver(post_delete, sender=Entrenamiento)
+def invalidar_sugerencias(sender, instance, update_fields=None, **kwargs):
+    modelo = instance._meta.model_name
+    if update_fields is None or sugerencias.CAMPOS[modelo][1] in update_fields:
+        sugerencias.invalidar(modelo)
+
+"""
+    Devuelve los ids de los entrenamientos cuya lista de ejercicios cambia con un m2m_changed,
+    tanto si se modifica desde el entrenamiento como desde el ejercicio, o None si la acción no cambia nada.
+"""
+def entrenamientos_afectados(instance, action, reverse, pk_set):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return None
+    if not reverse:
+        return [instance.pk]
+    if action == 'pre_clear':  # En post_clear ya no se sabe qué entrenamientos tenía el ejercicio.
+        return list(instance.entrenamientos.values_list('pk', flat=True))
+    return list(pk_set)
+
+"""
+    Actualiza la fecha de modificación de los entrenamientos cuya lista de ejercicios cambia,
+    para que sus páginas dejen de responder 304 y sus tarjetas en caché se vuelvan a renderizar.
+"""
+@receiver(m2m_changed, sender=Entrenamiento.ejercicios.through)
+def marcar_entrenamientos_actualizados(sender, instance, action, reverse, pk_set, **kwargs):
+    ids = entrenamientos_afectados(instance, action, reverse, pk_set)
+    if ids:
+        ahora = timezone.now()
+        Entrenamiento.objects.filter(pk__in=ids).update(actualizado=ahora)
+        if not reverse:
+            instance.actualizado = ahora
+
+"""
+    Anota el nombre de la imagen que tenía el objeto antes de guardarlo, para saber después
+    si ha cambiado y hay que regenerar sus miniaturas. Si la imagen cambia, las miniaturas anteriores
+    se apartan (para liberarlas después) y se vacían: ya no corresponden a la imagen nueva.
+"""
+@receiver(pre_save, sender=Ejercicio)
+@receiver(pre_save, sender=Entrenamiento)
+def anotar_imagen_anterior(sender, instance, raw=False, **kwargs):
+    instance._derivadas_anteriores = {}
+    if raw or instance.pk is None:
+        instance._imagen_anterior = None
+        return
+    anterior = sender.objects.filter(pk=instance.pk).values_list('imagen', 'imagen_derivadas').first()
+    instance._imagen_anterior, derivadas = anterior or (None, {})
+    if instance._imagen_anterior != instance.imagen.name:
+        instance._derivadas_anteriores = derivadas or {}
+        instance.imagen_derivadas = {}
+
+"""
+    Encola la generación de miniaturas si el objeto es nuevo, si la imagen ha cambiado
+    o si todavía no tenía derivadas. La clave incluye el nombre de la imagen, así que guardar
+    varias veces el mismo objeto mientras la tarea está pendiente no repite el trabajo.
+"""
+@receiver(post_save, sender=Ejercicio)
+@receiver(post_save, sender=Entrenamiento)
+def generar_miniaturas(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    cambiada = getattr(instance, '_imagen_anterior', None) != instance.imagen.name
+    if created or cambiada or not instance.imagen_derivadas:
+        modelo = instance._meta.model_name
+        tareas.encolar(
+            'procesar_imagen', {'modelo': modelo, 'id': instance.pk, 'imagen': instance.imagen.name},
+            clave=f'procesar_imagen:{modelo}:{instance.pk}:{instance.imagen.name}',
+        )
+
+"""
+    Actualiza los contadores de referencias de las imágenes al crear un objeto o cambiar su imagen.
+    La imagen anterior (y sus miniaturas) se borra cuando ya no la usa ningún otro objeto.
+"""
+@receiver(post_save, sender=Ejercicio)
+@receiver(post_save, sender=Entrenamiento)
+def contar_referencias_imagen(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_imagen_anterior', None)
+    if created:
+        almacenamiento.sumar_referencia(instance.imagen.name)
+    elif anterior != instance.imagen.name:
+        almacenamiento.sumar_referencia(instance.imagen.name)
+        almacenamiento.liberar_referencia(instance._meta.model_name, anterior, getattr(instance, '_derivadas_anteriores', {}))
+
+"""
+    Libera la imagen del ejercicio o entrenamiento eliminado; si era la última referencia,
+    se encola el borrado del fichero y de sus miniaturas.
+"""
+@receiver(post_delete, sender=Ejercicio)
+@receiver(post_delete, sender=Entrenamiento)
+def liberar_imagen(sender, instance, **kwargs):
+    almacenamiento.liberar_referencia(instance._meta.model_name, instance.imagen.name, instance.imagen_derivadas)
+
+"""
+    Actualiza un contador ante un m2m_changed. 'es_propio' indica si la instancia que cambia es el
+    objeto que guarda el contador (si no, pk_set son los ids de esos objetos) y 'relacionados_de'
+    devuelve los objetos relacionados con la instancia antes de vaciarla.
+"""
+def actualizar_contador(campo, es_propio, instance, action, pk_set, relacionados_de):
+    if action == 'post_add':  # pk_set solo contiene las filas realmente insertadas.
+        if es_propio:
+            contadores.sumar(campo, [instance.pk], len(pk_set))
+        else:
+            contadores.sumar(campo, pk_set)
+    elif action == 'post_remove':
+        contadores.recalcular(campo, [instance.pk] if es_propio else pk_set)
+    elif action == 'pre_clear' and not es_propio:
+        instance.__dict__.setdefault('_vaciados', {})[campo] = list(relacionados_de(instance).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        contadores.recalcular(campo, [instance.pk] if es_propio else instance.__dict__.get('_vaciados', {}).pop(campo, []))
+
+"""
+    Mantiene el número de ejercicios de los entrenamientos y el de entrenamientos de los ejercicios
+    (formularios, admin, importación...).
+"""
+@receiver(m2m_changed, sender=Entrenamiento.ejercicios.through)
+def contar_ejercicios(sender, instance, action, reverse, pk_set, **kwargs):
+    actualizar_contador('num_ejercicios', not reverse, instance, action, pk_set, lambda ejercicio: ejercicio.entrenamientos)
+    actualizar_contador('num_entrenamientos', reverse, instance, action, pk_set, lambda entrenamiento: entrenamiento.ejercicios)
+
+"""
+    Mantiene el número de apuntados de los entrenamientos al apuntarse o desapuntarse un usuario.
+"""
+@receiver(m2m_changed, sender=Entrenamiento.apuntados.through)
+def contar_apuntados(sender, instance, action, reverse, pk_set, **kwargs):
+    actualizar_contador('num_apuntados', not reverse, instance, action, pk_set, lambda usuario: usuario.entrenamientos_apuntados)
+
+"""
+    Contador que hay que recalcular al borrar cada modelo y objetos relacionados que lo guardan.
+"""
+CONTADORES_AL_BORRAR = {
+    Ejercicio: ('num_ejercicios', lambda ejercicio: ejercicio.entrenamientos),
+    Entrenamiento: ('num_entrenamientos', lambda entrenamiento: entrenamiento.ejercicios),
+    User: ('num_apuntados', lambda usuario: usuario.entrenamientos_apuntados),
+}
+
+"""
+    Al borrar un ejercicio, un entrenamiento o un usuario, sus filas de las tablas intermedias se
+    borran en cascada sin m2m_changed: se anotan antes los objetos afectados para recalcular después sus contadores.
+"""
+@receiver(pre_delete, sender=Ejercicio)
+@receiver(pre_delete, sender=Entrenamiento)
+@receiver(pre_delete, sender=User)
+def anotar_relacionados(sender, instance, **kwargs):
+    _, relacionados = CONTADORES_AL_BORRAR[sender]
+    instance._relacionados_borrado = list(relacionados(instance).values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Ejercicio)
+@receiver(post_delete, sender=Entrenamiento)
+@receiver(post_delete, sender=User)
+def recalcular_contadores_relacionados(sender, instance, **kwargs):
+    campo, _ = CONTADORES_AL_BORRAR[sender]
+    contadores.recalcular(campo, instance.__dict__.pop('_relacionados_borrado', []))
+
+"""
+    Encola el recálculo de los entrenamientos similares de los entrenamientos cuya lista de ejercicios
+    cambia. Al vaciar la lista se anotan antes los afectados, porque la tarea debe ver la lista ya vacía.
+"""
+@receiver(m2m_changed, sender=Entrenamiento.ejercicios.through)
+def actualizar_similares(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._similares_vaciados = entrenamientos_afectados(instance, action, reverse, pk_set)
+        return
+    if action == 'post_clear':
+        ids = instance.__dict__.pop('_similares_vaciados', None)
+    else:
+        ids = entrenamientos_afectados(instance, action, reverse, pk_set)
+    if ids:
+        tareas.encolar('actualizar_similares', {'ids': sorted(ids)})
+
+"""
+    Quita de la caché el usuario guardado o borrado (cambio de contraseña, desactivación...),
+    para que las peticiones siguientes lo lean de nuevo de la base de datos.
+"""
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def olvidar_usuario_cacheado(sender, instance, **kwargs):
+    sesiones.olvidar_usuario(instance.pk)
+
+"""
+    Al iniciar sesión guarda el usuario en caché, ya con last_login actualizado, para que la
+    primera petición autenticada no tenga que consultarlo.
+"""
+@receiver(user_logged_in)
+def recordar_usuario_cacheado(sender, request, user, **kwargs):
+    sesiones.recordar_usuario(user)
@@ -0,0 +1,121 @@
+import bisect
+import re
+import threading
+import time
+from array import array
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .busqueda import normalizar
+from .models import Ejercicio, Entrenamiento, VersionSugerencias
+
+"""
+    Sugerencias de búsqueda mientras se escribe (autocompletado) para títulos y nombres.
+
+    Cada proceso guarda en memoria, por modelo, un índice de prefijos: una lista ordenada con una
+    clave por cada palabra de cada título (el texto normalizado desde esa palabra hasta el final),
+    así que "banc" encuentra "Press de banca". Buscar es una búsqueda binaria más un recorrido corto
+    por las claves que empiezan por el prefijo, sin más consultas que la de la versión.
+    El índice se construye la primera vez que se pide en cada proceso. Su versión es un número guardado
+    en la base de datos (VersionSugerencias, compartida por todos los procesos) que las señales suben
+    solo al crear, renombrar o borrar un objeto: los contadores y las miniaturas no la cambian. Cada
+    proceso la lee como mucho una vez cada SEGUNDOS_COMPROBACION y reconstruye el índice si ha cambiado;
+    el proceso que hace el cambio la vuelve a leer en la siguiente petición.
+"""
+
+LIMITE_SUGERENCIAS = 10
+MAX_CLAVES_RECORRIDAS = 200  # Claves que se miran como máximo por petición, para acotar el tiempo.
+LONGITUD_MINIMA = 1
+SEGUNDOS_COMPROBACION = 5  # Cada cuánto consulta cada proceso si la tabla ha cambiado.
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9ñ]+')
+
+CAMPOS = {'ejercicio': (Ejercicio, 'nombre'), 'entrenamiento': (Entrenamiento, 'titulo')}
+
+"""
+    Índice de prefijos de un modelo: claves ordenadas y, en paralelo, la posición del objeto al que
+    pertenece cada una y la palabra del título en la que empieza (0 si es el principio).
+"""
+class IndicePrefijos:
+
+    def __init__(self, filas, version):
+        self.version = version
+        self.ids = array('q')
+        self.textos = []
+        entradas = []
+        for posicion, (objeto_id, texto) in enumerate(filas):
+            self.ids.append(objeto_id)
+            self.textos.append(texto)
+            palabras = _PATRON_PALABRA.findall(normalizar(texto))
+            for inicio in range(len(palabras)):
+                entradas.append((' '.join(palabras[inicio:]), inicio, posicion))
+        entradas.sort()
+        self.claves = [clave for clave, _, _ in entradas]
+        self.inicios = array('H', (min(inicio, 65535) for _, inicio, _ in entradas))  # Arrays compactos en lugar de tuplas.
+        self.posiciones = array('L', (posicion for _, _, posicion in entradas))
+
+    """
+        Devuelve hasta 'limite' pares (id, texto): primero los que empiezan por el prefijo y después
+        los que lo tienen en otra palabra; dentro de cada grupo, los más cortos y en orden alfabético.
+    """
+    def buscar(self, prefijo, limite=LIMITE_SUGERENCIAS):
+        encontrados = {}
+        desde = bisect.bisect_left(self.claves, prefijo)
+        for indice in range(desde, min(desde + MAX_CLAVES_RECORRIDAS, len(self.claves))):
+            if not self.claves[indice].startswith(prefijo):
+                break
+            inicio, posicion = self.inicios[indice], self.posiciones[indice]
+            encontrados[posicion] = min(inicio, encontrados.get(posicion, inicio))
+        orden = sorted(encontrados, key=lambda p: (encontrados[p] > 0, len(self.textos[p]), self.textos[p]))
+        return [(self.ids[p], self.textos[p]) for p in orden[:limite]]
+
+_indices = {}
+_comprobaciones = {}  # Modelo -> (momento de la última consulta de la versión, versión leída).
+_cerrojo = threading.Lock()
+
+"""
+    Versión del índice de un modelo guardada en la base de datos (0 si todavía no se ha cambiado nada).
+"""
+def _version(modelo):
+    return VersionSugerencias.objects.filter(modelo=modelo).values_list('version', flat=True).first() or 0
+
+"""
+    Sube la versión del índice de un modelo para que todos los procesos lo reconstruyan, y hace que
+    este proceso la vuelva a leer en la siguiente petición, sin esperar a SEGUNDOS_COMPROBACION.
+"""
+def invalidar(modelo):
+    _comprobaciones.pop(modelo, None)
+    if VersionSugerencias.objects.filter(modelo=modelo).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            VersionSugerencias.objects.create(modelo=modelo, version=1)
+    except IntegrityError:  # Otro proceso ha creado la fila a la vez.
+        VersionSugerencias.objects.filter(modelo=modelo).update(version=F('version') + 1)
+
+"""
+    Devuelve el índice del modelo de este proceso, construyéndolo si no existe o si su versión ha cambiado.
+"""
+def indice(modelo):
+    ahora = time.monotonic()
+    comprobacion = _comprobaciones.get(modelo)
+    if comprobacion is None or ahora - comprobacion[0] >= SEGUNDOS_COMPROBACION:
+        comprobacion = _comprobaciones[modelo] = (ahora, _version(modelo))
+    version = comprobacion[1]
+    actual = _indices.get(modelo)
+    if actual is not None and actual.version == version:
+        return actual
+    with _cerrojo:  # Un solo hilo construye el índice; los demás esperan y lo reutilizan.
+        actual = _indices.get(modelo)
+        if actual is None or actual.version != version:
+            clase, campo = CAMPOS[modelo]
+            actual = _indices[modelo] = IndicePrefijos(clase.objects.order_by().values_list('id', campo).iterator(chunk_size=10000), version)
+    return actual
+
+"""
+    Sugerencias para lo que el usuario lleva escrito: lista de pares (id, texto).
+"""
+def sugerir(modelo, texto, limite=LIMITE_SUGERENCIAS):
+    prefijo = ' '.join(_PATRON_PALABRA.findall(normalizar(texto)))
+    if len(prefijo) < LONGITUD_MINIMA:
+        return []
+    return indice(modelo).buscar(prefijo, limite)
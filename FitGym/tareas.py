@@ -0,0 +1,175 @@
+import logging
+import traceback
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import almacenamiento, imagenes, recomendaciones
+from .models import FicheroContenido, Tarea
+
+"""
+    Cola de tareas en segundo plano guardada en la base de datos.
+
+    Las vistas y señales encolan trabajo lento (generar miniaturas, borrar ficheros) con
+    'encolar' y vuelven enseguida; el comando 'procesar_tareas' ejecuta las tareas en otro
+    proceso, con reintentos y espera exponencial. No necesita ningún broker externo.
+"""
+
+logger = logging.getLogger(__name__)
+
+DURACION_BLOQUEO = timedelta(minutes=5)  # Si un worker muere, su tarea vuelve a estar disponible pasado este tiempo.
+ESPERA_BASE_REINTENTO = 10  # Segundos de espera antes del primer reintento; se duplica en cada fallo.
+
+_REGISTRO = {}
+
+"""
+    Decorador que registra una función como tarea con el nombre indicado.
+    La función recibe como argumentos con nombre el contenido de 'datos'.
+"""
+def tarea(nombre):
+    def registrar(funcion):
+        _REGISTRO[nombre] = funcion
+        return funcion
+    return registrar
+
+"""
+    Encola una tarea y devuelve el objeto Tarea.
+    Si se indica una clave y hay una tarea pendiente o en curso con esa clave, no se crea otra: se devuelve
+    la existente. Las tareas terminadas liberan su clave, así que volver a encolarla repite el trabajo.
+    Con TAREAS_EN_LINEA la tarea se ejecuta en el momento (útil en desarrollo, sin worker).
+"""
+def encolar(tipo, datos=None, clave=None, max_intentos=5):
+    if tipo not in _REGISTRO:
+        raise ValueError(f"Tarea desconocida: {tipo}")
+    if getattr(settings, 'TAREAS_EN_LINEA', False):
+        _REGISTRO[tipo](**(datos or {}))
+        return None
+    if clave:
+        existente = Tarea.objects.filter(clave=clave, estado__in=[Tarea.PENDIENTE, Tarea.EN_CURSO]).first()
+        if existente:
+            return existente
+    try:
+        with transaction.atomic():
+            return Tarea.objects.create(
+                tipo=tipo, datos=datos or {}, clave=clave, max_intentos=max_intentos, ejecutar_despues=timezone.now(),
+            )
+    except IntegrityError:  # Otra petición ha encolado la misma clave a la vez.
+        return Tarea.objects.get(clave=clave)
+
+"""
+    Encola muchas tareas del mismo tipo con una inserción por lotes.
+    Recibe una lista de pares (datos, clave); las claves de tareas todavía pendientes o en curso se ignoran.
+"""
+def encolar_varios(tipo, lista, max_intentos=5):
+    if tipo not in _REGISTRO:
+        raise ValueError(f"Tarea desconocida: {tipo}")
+    if getattr(settings, 'TAREAS_EN_LINEA', False):
+        for datos, _ in lista:
+            _REGISTRO[tipo](**(datos or {}))
+        return
+    ahora = timezone.now()
+    Tarea.objects.bulk_create(
+        [Tarea(tipo=tipo, datos=datos or {}, clave=clave, max_intentos=max_intentos, ejecutar_despues=ahora) for datos, clave in lista],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+"""
+    Reserva la siguiente tarea disponible para este worker y la devuelve, o None si no hay ninguna.
+    La reserva es un UPDATE condicional, así que dos workers nunca se quedan con la misma tarea.
+    También recupera las tareas 'en curso' cuyo bloqueo ha caducado (el worker murió).
+"""
+def reservar():
+    ahora = timezone.now()
+    disponibles = (Tarea.objects
+                   .filter(Q(estado=Tarea.PENDIENTE) | Q(estado=Tarea.EN_CURSO), ejecutar_despues__lte=ahora)
+                   .order_by('ejecutar_despues', 'id')
+                   .values_list('id', 'estado')[:10])
+    for tarea_id, estado in disponibles:
+        reservada = Tarea.objects.filter(id=tarea_id, estado=estado, ejecutar_despues__lte=ahora).update(
+            estado=Tarea.EN_CURSO, ejecutar_despues=ahora + DURACION_BLOQUEO, actualizado=ahora,
+        )
+        if reservada:
+            return Tarea.objects.get(id=tarea_id)
+    return None
+
+"""
+    Ejecuta una tarea reservada y guarda el resultado.
+    Si falla, se reprograma con espera exponencial hasta agotar 'max_intentos'; después queda como fallida.
+    Al terminar (bien o mal) se libera la clave para que la misma tarea se pueda volver a encolar.
+"""
+def ejecutar(tarea_obj):
+    try:
+        _REGISTRO[tarea_obj.tipo](**tarea_obj.datos)
+    except Exception:
+        tarea_obj.intentos += 1
+        tarea_obj.error = traceback.format_exc()
+        if tarea_obj.intentos >= tarea_obj.max_intentos:
+            tarea_obj.estado = Tarea.FALLIDA
+            tarea_obj.clave = None
+            logger.error("La tarea %s (%s) ha fallado definitivamente", tarea_obj.pk, tarea_obj.tipo)
+        else:
+            tarea_obj.estado = Tarea.PENDIENTE
+            tarea_obj.ejecutar_despues = timezone.now() + timedelta(seconds=ESPERA_BASE_REINTENTO * 2 ** (tarea_obj.intentos - 1))
+        tarea_obj.save(update_fields=['intentos', 'error', 'estado', 'clave', 'ejecutar_despues', 'actualizado'])
+        return False
+    tarea_obj.estado = Tarea.COMPLETADA
+    tarea_obj.error = ''
+    tarea_obj.clave = None
+    tarea_obj.save(update_fields=['estado', 'error', 'clave', 'actualizado'])
+    return True
+
+"""
+    Ejecuta tareas hasta que no quede ninguna disponible (o hasta 'limite') y devuelve cuántas ha procesado.
+"""
+def procesar_pendientes(limite=None):
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        tarea_obj = reservar()
+        if tarea_obj is None:
+            break
+        ejecutar(tarea_obj)
+        procesadas += 1
+    return procesadas
+
+"""
+    Genera las miniaturas de la imagen de un ejercicio o entrenamiento.
+    Si el objeto ya no existe o su imagen ha cambiado desde que se encoló, la tarea no hace nada
+    (la imagen nueva tendrá su propia tarea).
+"""
+@tarea('procesar_imagen')
+def procesar_imagen(modelo, id, imagen):
+    objeto = apps.get_model('FitGym', modelo).objects.filter(pk=id).first()
+    if objeto is None or objeto.imagen.name != imagen:
+        return
+    imagenes.procesar_imagen(objeto)
+
+"""
+    Borra ficheros del almacenamiento de imágenes de un modelo. Nunca borra la imagen por defecto.
+"""
+@tarea('eliminar_ficheros')
+def eliminar_ficheros(modelo, nombres):
+    storage = apps.get_model('FitGym', modelo)._meta.get_field('imagen').storage
+    for nombre in nombres:
+        if not imagenes.es_imagen_por_defecto(nombre):
+            storage.delete(nombre)
+
+"""
+    Borra un fichero de imagen y sus miniaturas cuando ya no lo usa ningún ejercicio ni entrenamiento.
+    Vuelve a comprobar las referencias al ejecutarse: si entre tanto se ha subido la misma imagen, no borra nada.
+"""
+@tarea('liberar_fichero')
+def liberar_fichero(modelo, nombre, derivadas):
+    if almacenamiento.referencias_restantes(nombre) > 0:
+        return
+    FicheroContenido.objects.filter(nombre=nombre, referencias__lte=0).delete()
+    eliminar_ficheros(modelo, [nombre] + list(derivadas))
+
+"""
+    Recalcula los entrenamientos similares de los entrenamientos cuya lista de ejercicios ha cambiado.
+"""
+@tarea('actualizar_similares')
+def actualizar_similares(ids):
+    for entrenamiento_id in ids:
+        recomendaciones.actualizar(entrenamiento_id)
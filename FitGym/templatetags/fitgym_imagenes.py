@@ -0,0 +1,20 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from FitGym import imagenes
+
+register = template.Library()
+
+"""
+    Pinta la imagen de un ejercicio o entrenamiento como un <picture> con un srcset por cada
+    formato de miniatura disponible (AVIF y WebP), de modo que el navegador descarga solo el
+    tamaño que necesita. La imagen original queda como respaldo en el <img>.
+    Uso: {% imagen_responsive ejercicio clase="w-64 h-64" sizes="256px" %}
+"""
+@register.simple_tag
+def imagen_responsive(objeto, clase='', sizes='256px', alt=''):
+    fuentes = [(f'image/{formato}', imagenes.srcset(objeto, formato)) for formato in imagenes.FORMATOS]
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" alt="{}" loading="lazy" decoding="async" /></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}" />', ((tipo, valor, sizes) for tipo, valor in fuentes if valor)),
+        clase, objeto.imagen.url, alt,
+    )
@@ -1,9 +1,81 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Entrenamiento, Ejercicio
-from .forms import UserRegistrationForm, EntrenamientoForm, EjercicioForm
+from django.contrib.sessions.models import Session
+from .models import Entrenamiento, EntrenamientoEjercicio, EntrenamientoSimilar, Ejercicio, FicheroContenido, Inscripcion, Tarea, TerminoBusqueda, VersionSugerencias
+from .forms import MAX_EJERCICIOS_ENTRENAMIENTO, UserRegistrationForm, EntrenamientoForm, EjercicioForm
+from . import almacenamiento, api, busqueda, estaticos, fragmentos, imagenes, instrumentacion, limites, recomendaciones, replicas, rutinas, sesiones, sugerencias, tareas, views
+from .paginacion import ORDEN_PREDETERMINADO, CursorPaginator, codificar_cursor, decodificar_cursor
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.core.files.storage import default_storage, FileSystemStorage
+from io import BytesIO, StringIO
+from PIL import Image
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from contextlib import contextmanager
+from django.utils import timezone
+from django.utils.http import http_date
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db import connection, connections, router, transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils.datastructures import MultiValueDict
+from django.test.utils import CaptureQueriesContext
+import functools
+from urllib.parse import quote
+
+"""
+    Decorador para las pruebas de vistas: falla si alguna petición hecha durante la prueba ejecuta
+    más de 'maximo' consultas SQL. Usa las métricas que envía FitGym.instrumentacion al terminar
+    cada petición, así que no cuenta las consultas que prepara la propia prueba.
+"""
+def presupuesto_consultas(maximo):
+    def decorador(prueba):
+        @contextmanager
+        def vigilar(caso):
+            excedidas = []
+
+            def comprobar(sender, request, metricas, **kwargs):
+                if metricas.consultas > maximo:
+                    duplicadas = [sql for sql, veces in metricas.sentencias.items() if veces > 1]
+                    excedidas.append(f"{request.method} {request.get_full_path()}: {metricas.consultas} consultas, "
+                                     f"{metricas.duplicadas} duplicadas {duplicadas}")
+
+            instrumentacion.peticion_medida.connect(comprobar)
+            try:
+                yield
+            finally:
+                instrumentacion.peticion_medida.disconnect(comprobar)
+            if excedidas:
+                caso.fail(f"Presupuesto de {maximo} consultas superado:\n" + '\n'.join(excedidas))
+
+        if iscoroutinefunction(prueba):  # Pruebas de las vistas asíncronas.
+            @functools.wraps(prueba)
+            async def envoltorio_async(self, *args, **kwargs):
+                with vigilar(self):
+                    return await prueba(self, *args, **kwargs)
+            return envoltorio_async
+
+        @functools.wraps(prueba)
+        def envoltorio(self, *args, **kwargs):
+            with vigilar(self):
+                return prueba(self, *args, **kwargs)
+        return envoltorio
+    return decorador
 
 """
     Clase de prueba para las vistas del proyecto.
@@ -17,6 +89,9 @@ class ViewsTests(TestCase):
         Crea un usuario, un ejercicio y un entrenamiento para ser utilizados en las pruebas.
     """
     def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()  # Las imágenes de prueba no se escriben en el proyecto.
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
         self.client = Client()  # Inicializa el cliente para realizar peticiones HTTP.
         self.user = User.objects.create_user(username='testuser', password='Pepeylola24!')  # Crea un usuario de prueba.
         self.ejercicio = Ejercicio.objects.create(
@@ -31,9 +106,14 @@ class ViewsTests(TestCase):
         )
         self.entrenamiento.ejercicios.add(self.ejercicio)  # Asocia el ejercicio al entrenamiento.
 
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
     """
         Prueba para verificar si la vista de inicio carga correctamente.
     """
+    @presupuesto_consultas(0)
     def test_inicio_view(self):        
         response = self.client.get(reverse('inicio'))  # Realiza una petición GET a la vista 'inicio'.
         self.assertEqual(response.status_code, 200) 
@@ -42,6 +122,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si la vista de cerrar sesión funciona correctamente.
     """
+    @presupuesto_consultas(4)
     def test_cerrar_sesion_view(self):        
         self.client.login(username='testuser', password='Pepeylola24!')  # Realiza login del usuario de prueba.
         response = self.client.get(reverse('cerrar_sesion'))  
@@ -50,6 +131,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si la vista de inicio de sesión se carga correctamente en GET.
     """
+    @presupuesto_consultas(0)
     def test_inicio_sesion_view_get(self):        
         response = self.client.get(reverse('inicio_sesion')) 
         self.assertEqual(response.status_code, 200)  
@@ -58,6 +140,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si la vista de inicio de sesión funciona correctamente en POST.
     """
+    @presupuesto_consultas(9)
     def test_inicio_sesion_view_post(self):
         response = self.client.post(reverse('inicio_sesion'), {
             'username': 'testuser',
@@ -68,6 +151,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si un usuario puede apuntarse a un entrenamiento correctamente.
     """
+    @presupuesto_consultas(7)
     def test_apuntarse_entrenamiento_view(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.post(reverse('apuntarse_entrenamiento', args=[self.entrenamiento.id]))  # Realiza una petición POST para apuntarse al entrenamiento.
@@ -76,6 +160,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si la vista de entrenamientos apuntados carga correctamente.
     """
+    @presupuesto_consultas(4)
     def test_entrenamientos_apuntados_view(self):        
         self.client.login(username='testuser', password='Pepeylola24!')  
         self.user.entrenamientos_apuntados.add(self.entrenamiento)  # Asocia el entrenamiento al usuario.
@@ -86,6 +171,7 @@ class ViewsTests(TestCase):
     """
         Prueba para verificar si un usuario puede desapuntarse de un entrenamiento correctamente.
     """
+    @presupuesto_consultas(5)
     def test_desapuntarse_entrenamiento_view(self):
         self.client.login(username='testuser', password='Pepeylola24!')  
         self.user.entrenamientos_apuntados.add(self.entrenamiento) 
@@ -102,6 +188,9 @@ class EntrenamientoTests(TestCase):
         Crea un usuario, un ejercicio y un entrenamiento para ser utilizados en las pruebas.
     """
     def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
         self.client = Client() 
         self.user = User.objects.create_user(username='testuser', password='Pepeylola24!') 
         self.ejercicio = Ejercicio.objects.create(
@@ -115,10 +204,15 @@ class EntrenamientoTests(TestCase):
             imagen=SimpleUploadedFile(name='test_image.jpg', content=b'', content_type='image/jpeg')  
         )
         self.entrenamiento.ejercicios.add(self.ejercicio)  
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
         
     """
         Prueba para verificar si la vista de entrenamientos carga correctamente.
     """
+    @presupuesto_consultas(2)
     def test_entrenamientos_view(self):
         response = self.client.get(reverse('entrenamientos'))  
         self.assertEqual(response.status_code, 200)  
@@ -127,6 +221,7 @@ class EntrenamientoTests(TestCase):
     """
         Prueba para verificar si la vista de ejercicios carga correctamente.
     """
+    @presupuesto_consultas(2)
     def test_ejercicios_view(self):
         response = self.client.get(reverse('ejercicios')) 
         self.assertEqual(response.status_code, 200)  
@@ -135,6 +230,7 @@ class EntrenamientoTests(TestCase):
     """
         Prueba para verificar si la vista de detalles de un entrenamiento carga correctamente.
     """
+    @presupuesto_consultas(4)  # Incluye la lista de entrenamientos similares.
     def test_detalles_entrenamiento_view(self):
         response = self.client.get(reverse('detalles_entrenamiento', args=[self.entrenamiento.id])) 
         self.assertEqual(response.status_code, 200)  
@@ -143,6 +239,7 @@ class EntrenamientoTests(TestCase):
     """
          Prueba para verificar si la vista para crear un entrenamiento se carga correctamente en GET.
     """
+    @presupuesto_consultas(3)
     def test_crear_entrenamiento_view_get(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.get(reverse('crear_entrenamiento'))
@@ -152,6 +249,7 @@ class EntrenamientoTests(TestCase):
     """
         Prueba para verificar si la vista para crear un entrenamiento funciona correctamente en POST.
     """
+    @presupuesto_consultas(17)  # Incluye el UPDATE del número de entrenamientos de los ejercicios y la tarea de similares.
     def test_crear_entrenamiento_view_post(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.post(reverse('crear_entrenamiento'), {
@@ -170,6 +268,9 @@ class EjercicioTests(TestCase):
         Configura el entorno de prueba para los ejercicios.
     """
     def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
         self.client = Client() 
         self.user = User.objects.create_user(username='testuser', password='Pepeylola24!')  
         self.ejercicio = Ejercicio.objects.create(
@@ -178,9 +279,14 @@ class EjercicioTests(TestCase):
             imagen=SimpleUploadedFile(name='test_image.jpg', content=b'', content_type='image/jpeg')  
         )
 
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
     """
         Prueba para verificar si la vista para crear un ejercicio se carga correctamente.
     """
+    @presupuesto_consultas(2)
     def test_crear_ejercicio_view_get(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.get(reverse('crear_ejercicio'))  
@@ -190,6 +296,7 @@ class EjercicioTests(TestCase):
     """
         Prueba para verificar si la vista para crear un ejercicio funciona correctamente en POST.
     """
+    @presupuesto_consultas(9)
     def test_crear_ejercicio_view_post(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.post(reverse('crear_ejercicio'), {
@@ -202,6 +309,7 @@ class EjercicioTests(TestCase):
         Prueba para verificar si la vista de edición de un ejercicio se carga correctamente en GET.
         El usuario debe estar autenticado y debe acceder a la vista para editar un ejercicio existente.
     """
+    @presupuesto_consultas(3)
     def test_editar_ejercicio_view_get(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.get(reverse('editar_ejercicio', args=[self.ejercicio.id]))
@@ -212,6 +320,7 @@ class EjercicioTests(TestCase):
         Prueba para verificar si la vista de edición de un ejercicio se procesa correctamente en POST.
         El usuario debe ser capaz de editar la información del ejercicio.
     """
+    @presupuesto_consultas(8)
     def test_editar_ejercicio_view_post(self):
         self.client.login(username='testuser', password='Pepeylola24!')  
         response = self.client.post(reverse('editar_ejercicio', args=[self.ejercicio.id]), {
@@ -224,6 +333,7 @@ class EjercicioTests(TestCase):
         Prueba para verificar si la vista de eliminación de un ejercicio funciona correctamente.
         El usuario debe ser capaz de eliminar un ejercicio existente.
     """
+    @presupuesto_consultas(12)
     def test_eliminar_ejercicio_view(self):
         self.client.login(username='testuser', password='Pepeylola24!') 
         response = self.client.post(reverse('eliminar_ejercicio', args=[self.ejercicio.id])) 
@@ -302,6 +412,7 @@ class UserRegistrationFormTests(TestCase):
     """
         Prueba para verificar si la vista de registro de usuario se carga correctamente en GET.
     """
+    @presupuesto_consultas(0)
     def test_registro_view_get(self):
         response = self.client.get(reverse('registro'))  
         self.assertEqual(response.status_code, 200)  
@@ -404,4 +515,1862 @@ class UserRegistrationFormTests(TestCase):
         }
         form = UserRegistrationForm(data=form_data)  
         self.assertFalse(form.is_valid())  
-        self.assertIn('username', form.errors)  # Verifica que el error esté en el campo 'username'.
\ No newline at end of file
+        self.assertIn('username', form.errors)  # Verifica que el error esté en el campo 'username'.
+"""
+    Clase de prueba para el índice de búsqueda de texto completo.
+"""
+class BusquedaTests(TestCase):
+
+    """
+        Crea varios ejercicios y un entrenamiento que se indexan automáticamente al guardarse.
+    """
+    def setUp(self):
+        self.press = Ejercicio.objects.create(nombre='Press de banca', descripcion='Ejercicio de presión para el pecho')
+        self.sentadilla = Ejercicio.objects.create(nombre='Sentadilla', descripcion='Trabaja las piernas con la presión de la barra')
+        self.remo = Ejercicio.objects.create(nombre='Remo con barra', descripcion='Ejercicio para la espalda')
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Entrenamiento de Pecho', descripcion='Rutina de empuje')
+
+    """
+        Prueba que la normalización ignora tildes y mayúsculas y agrupa plurales en la misma raíz.
+    """
+    def test_normalizacion_y_raiz(self):
+        self.assertEqual(busqueda.terminos('PRESIÓN'), busqueda.terminos('presion'))
+        self.assertEqual(busqueda.terminos('presiones'), busqueda.terminos('presión'))
+        self.assertEqual(busqueda.terminos('Sentadillas'), busqueda.terminos('sentadilla'))
+        self.assertEqual(busqueda.terminos('de la con'), [])  # Palabras vacías.
+
+    """
+        Prueba que la búsqueda encuentra coincidencias en la descripción sin importar las tildes
+        y ordena primero los resultados que coinciden en el nombre.
+    """
+    def test_buscar_ordena_por_relevancia(self):
+        self.assertEqual(busqueda.buscar(Ejercicio, 'presion'), [self.press.id, self.sentadilla.id])
+        self.assertEqual(busqueda.buscar(Ejercicio, 'barra')[0], self.remo.id)
+        self.assertEqual(busqueda.buscar(Ejercicio, 'inexistente'), [])
+
+    """
+        Prueba que el último término se busca como prefijo (palabras a medio escribir) sin
+        contar dos veces un objeto que tiene varias palabras con ese prefijo, y que el total
+        de objetos para el IDF no se cuenta en cada búsqueda.
+    """
+    def test_ultimo_termino_como_prefijo(self):
+        self.assertEqual(busqueda.buscar(Ejercicio, 'sent'), [self.sentadilla.id])
+        self.assertEqual(busqueda.buscar(Ejercicio, 'pres'), [self.press.id, self.sentadilla.id])
+        self.assertEqual(busqueda.buscar(Ejercicio, 'barra pie'), [self.sentadilla.id, self.remo.id])
+        self.assertEqual(busqueda.buscar(Ejercicio, 'pi barra'), [self.remo.id, self.sentadilla.id])  # Solo el último es prefijo.
+        self.assertEqual(busqueda.buscar(Ejercicio, 'se'), [])  # Demasiado corto para buscarlo como prefijo.
+        with CaptureQueriesContext(connection) as consultas:
+            busqueda.buscar(Ejercicio, 'sentadilla')
+        self.assertFalse(any(Ejercicio._meta.db_table in c['sql'] for c in consultas.captured_queries))
+
+    """
+        Prueba que el índice se actualiza al editar y al eliminar un objeto.
+    """
+    def test_indice_incremental(self):
+        self.remo.nombre = 'Jalón al pecho'
+        self.remo.save()
+        self.assertIn(self.remo.id, busqueda.buscar(Ejercicio, 'jalon'))
+        self.assertNotIn(self.remo.id, busqueda.buscar(Ejercicio, 'remo'))
+        self.entrenamiento.delete()
+        self.assertEqual(busqueda.buscar(Entrenamiento, 'pecho'), [])
+
+    """
+        Prueba que el comando de reconstrucción vuelve a generar el índice completo.
+    """
+    def test_reconstruir_indice(self):
+        TerminoBusqueda.objects.all().delete()
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertEqual(busqueda.buscar(Ejercicio, 'sentadillas'), [self.sentadilla.id])
+
+    """
+        Prueba que las vistas de listado usan la búsqueda indexada.
+    """
+    @presupuesto_consultas(4)
+    def test_vistas_usan_indice(self):
+        response = self.client.get(reverse('ejercicios'), {'q': 'presión'})
+        self.assertEqual([e.id for e in response.context['ejercicios']], [self.press.id, self.sentadilla.id])
+        response = self.client.get(reverse('entrenamientos'), {'q': 'rutina'})
+        self.assertEqual([e.id for e in response.context['entrenamientos']], [self.entrenamiento.id])
+
+"""
+    Clase de prueba para la paginación por cursor.
+"""
+class PaginacionCursorTests(TestCase):
+
+    """
+        Crea siete ejercicios para recorrerlos en páginas de tres.
+    """
+    def setUp(self):
+        self.ejercicios = [Ejercicio.objects.create(nombre=f'Ejercicio {i}', descripcion='Descripción') for i in range(7)]
+
+    """
+        Prueba que se recorre todo el listado hacia delante y hacia atrás sin repetir ni saltar elementos.
+    """
+    def test_recorrido_completo(self):
+        paginator = CursorPaginator(Ejercicio.objects.all(), 3)
+        primera = paginator.get_page(None)
+        self.assertFalse(primera.has_previous())
+        segunda = paginator.get_page(primera.next_cursor)
+        tercera = paginator.get_page(segunda.next_cursor)
+        self.assertFalse(tercera.has_next())
+        self.assertEqual(list(primera) + list(segunda) + list(tercera), self.ejercicios)
+
+        self.assertEqual(list(paginator.get_page(tercera.previous_cursor)), list(segunda))
+        self.assertEqual(list(paginator.get_page(segunda.previous_cursor)), list(primera))
+
+    """
+        Prueba que un cursor manipulado devuelve la primera página.
+    """
+    def test_cursor_invalido(self):
+        paginator = CursorPaginator(Ejercicio.objects.all(), 3)
+        self.assertEqual(list(paginator.get_page('manipulado')), self.ejercicios[:3])
+
+    """
+        Prueba que la vista usa la paginación por cursor con un número de consultas que no depende de la página
+        y que muestra un total aproximado.
+    """
+    @override_settings(PAGINACION_CURSOR=True, PAGINACION_TOTAL_APROXIMADO=True)
+    @presupuesto_consultas(2)
+    def test_vista_con_cursor(self):
+        response = self.client.get(reverse('ejercicios'))
+        pagina = response.context['ejercicios']
+        self.assertEqual(pagina.total_aproximado, 7)
+        with self.assertNumQueries(1):  # Solo la consulta de la página: el total ya está en caché.
+            response = self.client.get(reverse('ejercicios'), {'cursor': pagina.next_cursor})
+        self.assertEqual(list(response.context['ejercicios']), self.ejercicios[3:6])
+
+    """
+        Prueba que los enlaces de la paginación por cursor conservan el orden elegido y nada más.
+    """
+    @override_settings(PAGINACION_CURSOR=True)
+    def test_enlaces_conservan_orden(self):
+        primera = self.client.get(reverse('ejercicios'), {'orden': 'recientes'}).context['ejercicios']
+        response = self.client.get(reverse('ejercicios'), {'orden': 'recientes', 'cursor': primera.next_cursor})
+        segunda = response.context['ejercicios']
+        self.assertContains(response, 'href="?orden=recientes"')
+        self.assertContains(response, f'href="?cursor={quote(segunda.next_cursor)}&orden=recientes"')
+        self.assertNotContains(response, '&mostrar_')
+
+"""
+    Clase de prueba para la caché de fragmentos de las tarjetas del catálogo.
+"""
+class FragmentosTests(TestCase):
+
+    """
+        Vacía la caché y crea un ejercicio y un entrenamiento.
+    """
+    def setUp(self):
+        cache.clear()
+        self.ejercicio = Ejercicio.objects.create(nombre='Dominadas', descripcion='Tirón vertical')
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Espalda', descripcion='Rutina de espalda')
+
+    """
+        Prueba que la segunda visita al listado reutiliza las tarjetas guardadas.
+    """
+    @presupuesto_consultas(2)
+    def test_aciertos_y_fallos(self):
+        self.client.get(reverse('ejercicios'))
+        self.assertEqual(fragmentos.estadisticas()['fallos'], 1)
+        self.client.get(reverse('ejercicios'))
+        self.assertEqual(fragmentos.estadisticas(), {'aciertos': 1, 'fallos': 1, 'ratio': 0.5})
+
+    """
+        Prueba que al editar un objeto su tarjeta se vuelve a renderizar con los datos nuevos.
+    """
+    @presupuesto_consultas(2)
+    def test_invalidacion_al_guardar(self):
+        self.client.get(reverse('ejercicios'))
+        self.ejercicio.nombre = 'Dominadas lastradas'
+        self.ejercicio.save()
+        response = self.client.get(reverse('ejercicios'))
+        self.assertContains(response, 'Dominadas lastradas')
+        self.assertEqual(fragmentos.estadisticas()['fallos'], 2)
+
+    """
+        Prueba que los cambios en la lista de ejercicios invalidan la tarjeta del entrenamiento,
+        también cuando se hacen desde el lado del ejercicio.
+    """
+    def test_invalidacion_m2m(self):
+        tarjeta = lambda: fragmentos.renderizar_tarjetas([Entrenamiento.objects.get(pk=self.entrenamiento.pk)], 'entrenamientos/tarjeta_entrenamiento.html', lambda e: 'publico', lambda e: {'entrenamiento': e})
+        tarjeta()
+        self.entrenamiento.ejercicios.add(self.ejercicio)
+        tarjeta()
+        self.ejercicio.entrenamientos.clear()
+        tarjeta()
+        self.assertEqual(fragmentos.estadisticas()['fallos'], 3)
+
+    """
+        Prueba que un cambio hecho desde otro proceso (sin señales en este) también renueva la tarjeta,
+        porque la versión es la fecha de modificación guardada en la base de datos.
+    """
+    @presupuesto_consultas(2)
+    def test_cambio_desde_otro_proceso(self):
+        self.client.get(reverse('ejercicios'))
+        Ejercicio.objects.filter(pk=self.ejercicio.pk).update(nombre='Dominadas supinas', actualizado=timezone.now())
+        response = self.client.get(reverse('ejercicios'))
+        self.assertContains(response, 'Dominadas supinas')
+
+    """
+        Prueba que la caché también funciona con el backend de ficheros.
+    """
+    @presupuesto_consultas(2)
+    def test_cache_en_ficheros(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio}}):
+                self.client.get(reverse('entrenamientos'))
+                response = self.client.get(reverse('entrenamientos'))
+                self.assertContains(response, 'Espalda')
+                self.assertEqual(fragmentos.estadisticas()['aciertos'], 1)
+
+"""
+    Crea en memoria una imagen PNG válida para las pruebas de miniaturas.
+"""
+def imagen_png(nombre='foto.png', ancho=800, alto=600):
+    contenido = BytesIO()
+    Image.new('RGB', (ancho, alto), (200, 30, 30)).save(contenido, format='PNG')
+    return SimpleUploadedFile(name=nombre, content=contenido.getvalue(), content_type='image/png')
+
+"""
+    Clase de prueba para la generación de miniaturas de las imágenes.
+    Las imágenes se guardan en un directorio temporal para no ensuciar el proyecto.
+"""
+class MiniaturasTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    """
+        Prueba que al crear un ejercicio se generan las derivadas sin ampliar la imagen original.
+    """
+    def test_generacion_al_crear(self):
+        ejercicio = Ejercicio.objects.create(nombre='Fondos', descripcion='Tríceps', imagen=imagen_png())
+        self.assertEqual(ejercicio.imagen_derivadas, {})  # La imagen se procesa fuera de la petición.
+        tareas.procesar_pendientes()
+        ejercicio.refresh_from_db()
+        webp = ejercicio.imagen_derivadas['webp']
+        self.assertEqual(sorted(webp, key=int), ['256', '512', '800'])
+        self.assertEqual(webp['256'], imagenes.nombre_derivada(ejercicio.imagen.name, 256, 'webp'))
+        with default_storage.open(webp['256']) as fichero:
+            self.assertEqual(Image.open(fichero).size, (256, 192))
+        self.assertIn('256w', imagenes.srcset(ejercicio, 'webp'))
+
+    """
+        Prueba que al cambiar la imagen se regeneran las derivadas y al borrar el objeto se eliminan.
+    """
+    def test_regeneracion_y_borrado(self):
+        ejercicio = Ejercicio.objects.create(nombre='Fondos', descripcion='Tríceps', imagen=imagen_png())
+        tareas.procesar_pendientes()
+        ejercicio.refresh_from_db()
+        anteriores = ejercicio.imagen_derivadas['webp'].values()
+        ejercicio.imagen = imagen_png('otra.png', 300, 300)
+        with self.captureOnCommitCallbacks(execute=True):
+            ejercicio.save()
+        tareas.procesar_pendientes()
+        ejercicio.refresh_from_db()
+        self.assertEqual(sorted(ejercicio.imagen_derivadas['webp'], key=int), ['256', '300'])
+        self.assertFalse(any(default_storage.exists(n) for n in anteriores))
+        nuevas = list(ejercicio.imagen_derivadas['webp'].values()) + [ejercicio.imagen.name]
+        with self.captureOnCommitCallbacks(execute=True):
+            ejercicio.delete()
+        self.assertTrue(all(default_storage.exists(n) for n in nuevas))  # El borrado también va a la cola.
+        tareas.procesar_pendientes()
+        self.assertFalse(any(default_storage.exists(n) for n in nuevas))
+
+    """
+        Prueba que volver a una imagen anterior (A, B y otra vez A) regenera sus miniaturas
+        en lugar de seguir apuntando a las de B, que ya se han borrado.
+    """
+    def test_volver_a_la_imagen_anterior(self):
+        ejercicio = Ejercicio.objects.create(nombre='Fondos', descripcion='Tríceps', imagen=imagen_png())
+        tareas.procesar_pendientes()
+        for imagen in (imagen_png('otra.png', 300, 300), imagen_png()):
+            ejercicio.imagen = imagen
+            ejercicio.save()
+            self.assertEqual(ejercicio.imagen_derivadas, {})
+            tareas.procesar_pendientes()
+        ejercicio.refresh_from_db()
+        derivadas = ejercicio.imagen_derivadas['webp']
+        self.assertEqual(sorted(derivadas, key=int), ['256', '512', '800'])
+        self.assertTrue(all(default_storage.exists(n) for n in derivadas.values()))
+
+    """
+        Prueba que el comando de relleno genera las miniaturas de los objetos que no las tienen
+        y que la tarjeta usa el srcset.
+    """
+    @presupuesto_consultas(2)
+    def test_comando_y_plantilla(self):
+        entrenamiento = Entrenamiento.objects.create(titulo='Pecho', descripcion='Empuje', imagen=imagen_png())
+        call_command('generar_miniaturas', stdout=StringIO())
+        entrenamiento.refresh_from_db()
+        self.assertIn('webp', entrenamiento.imagen_derivadas)
+        response = self.client.get(reverse('entrenamientos'))
+        self.assertContains(response, '.256w.webp 256w')
+
+"""
+    Clase de prueba para el almacenamiento por contenido y el recuento de referencias de las imágenes.
+"""
+class AlmacenamientoContenidoTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    """
+        Prueba que la misma imagen subida dos veces se guarda una sola vez con su hash como nombre.
+    """
+    def test_deduplicacion(self):
+        primero = Ejercicio.objects.create(nombre='Remo', descripcion='Espalda', imagen=imagen_png('a.png'))
+        segundo = Entrenamiento.objects.create(titulo='Tirón', descripcion='Espalda', imagen=imagen_png('b.png'))
+        self.assertEqual(primero.imagen.name, segundo.imagen.name)
+        self.assertTrue(primero.imagen.name.startswith('contenido/'))
+        self.assertEqual(FicheroContenido.objects.get(nombre=primero.imagen.name).referencias, 2)
+        tareas.procesar_pendientes()
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual(primero.imagen_derivadas, segundo.imagen_derivadas)  # Las miniaturas también se comparten.
+
+    """
+        Prueba que el fichero compartido solo se borra, con sus miniaturas, al eliminar el último objeto que lo usa.
+    """
+    def test_borrado_por_referencias(self):
+        primero = Ejercicio.objects.create(nombre='Remo', descripcion='Espalda', imagen=imagen_png())
+        segundo = Ejercicio.objects.create(nombre='Jalón', descripcion='Espalda', imagen=imagen_png())
+        tareas.procesar_pendientes()
+        segundo.refresh_from_db()
+        nombres = [segundo.imagen.name] + [n for d in segundo.imagen_derivadas.values() for n in d.values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        tareas.procesar_pendientes()
+        self.assertTrue(all(default_storage.exists(n) for n in nombres))
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.delete()
+        tareas.procesar_pendientes()
+        self.assertFalse(any(default_storage.exists(n) for n in nombres))
+        self.assertFalse(FicheroContenido.objects.exists())
+
+    """
+        Prueba que el borrado del fichero se encola al confirmar la transacción, y no si el borrado se deshace.
+    """
+    def test_borrado_al_confirmar(self):
+        ejercicio = Ejercicio.objects.create(nombre='Remo', descripcion='Espalda', imagen=imagen_png())
+        with self.captureOnCommitCallbacks(execute=True) as pendientes:
+            with self.assertRaises(ValueError), transaction.atomic():
+                Ejercicio.objects.get(pk=ejercicio.pk).delete()
+                raise ValueError("Se deshace el borrado")
+        self.assertEqual(pendientes, [])
+        self.assertFalse(Tarea.objects.filter(tipo='liberar_fichero').exists())
+
+        with self.captureOnCommitCallbacks() as pendientes:
+            ejercicio.delete()
+        self.assertFalse(Tarea.objects.filter(tipo='liberar_fichero').exists())  # Todavía sin confirmar.
+        pendientes[0]()
+        self.assertTrue(Tarea.objects.filter(tipo='liberar_fichero').exists())
+
+    """
+        Prueba que el recuento por lotes suma las referencias de los dos modelos a un mismo fichero.
+    """
+    def test_recontar_por_lotes(self):
+        Ejercicio.objects.bulk_create([Ejercicio(nombre=f'E{i}', descripcion='-', imagen=f'contenido/{i % 3}.png') for i in range(7)])
+        Entrenamiento.objects.bulk_create([Entrenamiento(titulo=f'T{i}', descripcion='-', imagen=f'contenido/{i}.png') for i in range(5)])
+        Entrenamiento.objects.create(titulo='Sin imagen', descripcion='-')
+        self.assertEqual(almacenamiento.recontar_referencias(lote=2), 5)
+        self.assertEqual(dict(FicheroContenido.objects.values_list('nombre', 'referencias')), {
+            'contenido/0.png': 4, 'contenido/1.png': 3, 'contenido/2.png': 3, 'contenido/3.png': 1, 'contenido/4.png': 1,
+        })
+
+    """
+        Prueba que el comando migra las imágenes antiguas a nombres por hash, uniendo las repetidas,
+        y recalcula los contadores.
+    """
+    def test_comando_deduplicar(self):
+        contenido = imagen_png().read()
+        for nombre in ('imagenes_ejercicio/uno.png', 'imagenes_ejercicio/dos.png'):
+            FileSystemStorage().save(nombre, SimpleUploadedFile(nombre, contenido))
+        Ejercicio.objects.bulk_create([
+            Ejercicio(nombre='Uno', descripcion='Uno', imagen='imagenes_ejercicio/uno.png'),
+            Ejercicio(nombre='Dos', descripcion='Dos', imagen='imagenes_ejercicio/dos.png'),
+        ])
+        call_command('deduplicar_imagenes', stdout=StringIO())
+        nombres = set(Ejercicio.objects.values_list('imagen', flat=True))
+        self.assertEqual(len(nombres), 1)
+        self.assertTrue(nombres.pop().startswith('contenido/'))
+        self.assertFalse(default_storage.exists('imagenes_ejercicio/uno.png'))
+        self.assertEqual(FicheroContenido.objects.get().referencias, 2)
+
+"""
+    Clase de prueba para la cola de tareas en segundo plano.
+"""
+class TareasTests(TestCase):
+
+    """
+        Registra una tarea de prueba que falla las veces indicadas antes de funcionar.
+    """
+    def setUp(self):
+        self.ejecuciones = []
+
+        @tareas.tarea('prueba')
+        def prueba(valor, fallos=0):
+            self.ejecuciones.append(valor)
+            if len(self.ejecuciones) <= fallos:
+                raise RuntimeError("Fallo de prueba")
+
+    """
+        Prueba que encolar dos veces con la misma clave no duplica la tarea.
+    """
+    def test_clave_idempotente(self):
+        primera = tareas.encolar('prueba', {'valor': 1}, clave='unica')
+        segunda = tareas.encolar('prueba', {'valor': 1}, clave='unica')
+        self.assertEqual(primera.pk, segunda.pk)
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        self.assertEqual(self.ejecuciones, [1])
+        tercera = tareas.encolar('prueba', {'valor': 2}, clave='unica')  # Terminada: la clave queda libre.
+        self.assertNotEqual(tercera.pk, primera.pk)
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        self.assertEqual(self.ejecuciones, [1, 2])
+
+    """
+        Prueba que una tarea que falla se reprograma con espera y termina como fallida al agotar los intentos.
+    """
+    def test_reintentos(self):
+        tarea_obj = tareas.encolar('prueba', {'valor': 1, 'fallos': 10}, max_intentos=2)
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        tarea_obj.refresh_from_db()
+        self.assertEqual((tarea_obj.estado, tarea_obj.intentos), (Tarea.PENDIENTE, 1))
+        self.assertGreater(tarea_obj.ejecutar_despues, timezone.now())
+        self.assertEqual(tareas.procesar_pendientes(), 0)  # Todavía no ha pasado la espera.
+
+        Tarea.objects.update(ejecutar_despues=timezone.now())
+        tareas.procesar_pendientes()
+        tarea_obj.refresh_from_db()
+        self.assertEqual(tarea_obj.estado, Tarea.FALLIDA)
+        self.assertIn('Fallo de prueba', tarea_obj.error)
+
+    """
+        Prueba que una tarea en curso cuyo worker murió vuelve a estar disponible al caducar el bloqueo.
+    """
+    def test_recupera_bloqueo_caducado(self):
+        tareas.encolar('prueba', {'valor': 1})
+        self.assertIsNotNone(tareas.reservar())
+        self.assertIsNone(tareas.reservar())
+        Tarea.objects.update(ejecutar_despues=timezone.now() - timedelta(seconds=1))
+        self.assertIsNotNone(tareas.reservar())
+
+    """
+        Prueba que borrar un objeto con la imagen por defecto nunca borra esa imagen y que el comando
+        del worker procesa la cola.
+    """
+    def test_no_borra_imagen_por_defecto(self):
+        Ejercicio.objects.create(nombre='Plancha', descripcion='Core').delete()
+        salida = StringIO()
+        with mock.patch('django.core.files.storage.FileSystemStorage.delete') as borrar:
+            call_command('procesar_tareas', '--una-vez', stdout=salida)
+        self.assertIn('tareas procesadas', salida.getvalue())
+        borrar.assert_not_called()
+        self.assertFalse(Tarea.objects.exclude(estado=Tarea.COMPLETADA).exists())
+
+"""
+    Clase de prueba para la importación y exportación masiva del catálogo.
+"""
+class CatalogoTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    """
+        Escribe unas líneas en un fichero del directorio temporal y devuelve su ruta.
+    """
+    def fichero(self, nombre, lineas):
+        ruta = f"{self.directorio.name}/{nombre}"
+        with open(ruta, 'w', encoding='utf-8') as fichero:
+            fichero.write('\n'.join(lineas) + '\n')
+        return ruta
+
+    """
+        Prueba que importar dos veces actualiza por nombre en lugar de duplicar y que se
+        sustituyen los ejercicios del entrenamiento.
+    """
+    def test_importar_jsonl_actualiza_por_clave_natural(self):
+        ruta = self.fichero('catalogo.jsonl', [
+            '{"tipo": "ejercicio", "nombre": "Sentadilla", "descripcion": "Piernas"}',
+            '{"tipo": "ejercicio", "nombre": "Zancada", "descripcion": "Piernas"}',
+            '{"tipo": "entrenamiento", "titulo": "Pierna", "descripcion": "Día de pierna", "ejercicios": ["Sentadilla", "Zancada", "Nadie"]}',
+        ])
+        salida = StringIO()
+        call_command('importar_catalogo', ruta, stdout=salida)
+        self.assertIn('1 ejercicios referenciados no existen', salida.getvalue())
+        self.assertEqual(Entrenamiento.objects.get(titulo='Pierna').ejercicios.count(), 2)
+
+        ruta = self.fichero('cambios.jsonl', [
+            '{"tipo": "ejercicio", "nombre": "Sentadilla", "descripcion": "Cuádriceps y glúteo"}',
+            '{"tipo": "entrenamiento", "titulo": "Pierna", "descripcion": "Día de pierna", "ejercicios": ["Sentadilla"]}',
+        ])
+        call_command('importar_catalogo', ruta, stdout=StringIO())
+        self.assertEqual(Ejercicio.objects.count(), 2)
+        self.assertEqual(Ejercicio.objects.get(nombre='Sentadilla').descripcion, 'Cuádriceps y glúteo')
+        self.assertEqual(list(Entrenamiento.objects.get().ejercicios.values_list('nombre', flat=True)), ['Sentadilla'])
+        self.assertEqual(busqueda.buscar(Ejercicio, 'gluteo'), [Ejercicio.objects.get(nombre='Sentadilla').pk])
+
+    """
+        Prueba que importar entrenamientos encola el cálculo de sus similares, aunque la tabla
+        intermedia se escriba sin m2m_changed.
+    """
+    def test_importar_actualiza_similares(self):
+        ruta = self.fichero('catalogo.jsonl', [
+            '{"tipo": "ejercicio", "nombre": "Sentadilla", "descripcion": "Piernas"}',
+            '{"tipo": "ejercicio", "nombre": "Zancada", "descripcion": "Piernas"}',
+            '{"tipo": "entrenamiento", "titulo": "Pierna", "descripcion": "Día de pierna", "ejercicios": ["Sentadilla", "Zancada"]}',
+            '{"tipo": "entrenamiento", "titulo": "Glúteo", "descripcion": "Día de glúteo", "ejercicios": ["Zancada"]}',
+        ])
+        call_command('importar_catalogo', ruta, stdout=StringIO())
+        tareas.procesar_pendientes()
+        pierna, gluteo = Entrenamiento.objects.get(titulo='Pierna'), Entrenamiento.objects.get(titulo='Glúteo')
+        self.assertEqual(list(recomendaciones.similares(pierna.pk)), [gluteo])
+        self.assertEqual(list(recomendaciones.similares(gluteo.pk)), [pierna])
+
+    """
+        Prueba que el número de consultas de la importación depende de los lotes y no de los registros.
+    """
+    def test_importar_csv_por_lotes(self):
+        def consultas(cantidad, prefijo):
+            lineas = ['tipo,nombre,descripcion,imagen,ejercicios']
+            lineas += [f'ejercicio,{prefijo} {i},Descripción {i},,' for i in range(cantidad)]
+            lineas.append(f'entrenamiento,Rutina {prefijo},Todo,,{"|".join(f"{prefijo} {i}" for i in range(cantidad))}')
+            ruta = self.fichero(f'{prefijo}.csv', lineas)
+            with CaptureQueriesContext(connection) as capturadas:
+                call_command('importar_catalogo', ruta, '--lote', '500', stdout=StringIO())
+            return len(capturadas)
+
+        poco, mucho = consultas(10, 'Poco'), consultas(300, 'Mucho')
+        self.assertLessEqual(mucho, poco + 10)  # Solo crecen los trozos en que el SGBD parte las inserciones.
+        self.assertEqual(Entrenamiento.objects.get(titulo='Rutina Mucho').ejercicios.count(), 300)
+
+    """
+        Prueba que lo exportado (con sus imágenes) se puede volver a importar en una base vacía.
+    """
+    def test_exportar_e_importar_con_imagenes(self):
+        ejercicio = Ejercicio.objects.create(nombre='Remo', descripcion='Espalda', imagen=imagen_png())
+        entrenamiento = Entrenamiento.objects.create(titulo='Tirón', descripcion='Espalda', imagen=imagen_png())
+        entrenamiento.ejercicios.add(ejercicio)
+        ruta, zip_imagenes = f"{self.directorio.name}/catalogo.jsonl", f"{self.directorio.name}/imagenes.zip"
+        call_command('exportar_catalogo', ruta, '--imagenes', zip_imagenes, stdout=StringIO())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Entrenamiento.objects.all().delete()
+            Ejercicio.objects.all().delete()
+        tareas.procesar_pendientes()
+        self.assertFalse(default_storage.exists(ejercicio.imagen.name))
+
+        call_command('importar_catalogo', ruta, '--imagenes', zip_imagenes, stdout=StringIO())
+        importado = Entrenamiento.objects.get(titulo='Tirón')
+        self.assertEqual(importado.imagen.name, ejercicio.imagen.name)
+        self.assertTrue(default_storage.exists(importado.imagen.name))
+        self.assertEqual([e.nombre for e in importado.ejercicios.all()], ['Remo'])
+        self.assertEqual(FicheroContenido.objects.get().referencias, 2)
+        tareas.procesar_pendientes()
+        importado.refresh_from_db()
+        self.assertIn('webp', importado.imagen_derivadas)
+
+"""
+    Clase de prueba para la API JSON de solo lectura.
+"""
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.ejercicios = [Ejercicio.objects.create(nombre=f'Ejercicio {i}', descripcion='Pecho') for i in range(3)]
+        self.entrenamientos = []
+        for i in range(5):
+            entrenamiento = Entrenamiento.objects.create(titulo=f'Rutina {i}', descripcion='Empuje')
+            entrenamiento.ejercicios.set(self.ejercicios[:2])
+            self.entrenamientos.append(entrenamiento)
+
+    """
+        Prueba que el listado devuelve los entrenamientos con sus ejercicios anidados en un número fijo de consultas.
+    """
+    @presupuesto_consultas(4)
+    def test_listado_con_ejercicios(self):
+        with self.assertNumQueries(4):  # COUNT, página, versión de los ejercicios y ejercicios de toda la página.
+            response = self.client.get(reverse('api_entrenamientos'), {'por_pagina': 4})
+        datos = response.json()
+        self.assertEqual((datos['total'], datos['siguiente'], len(datos['resultados'])), (5, 2, 4))
+        self.assertEqual([e['nombre'] for e in datos['resultados'][0]['ejercicios']], ['Ejercicio 0', 'Ejercicio 1'])
+
+    """
+        Prueba la selección de campos: solo se devuelven los pedidos y sin ejercicios no se consultan.
+    """
+    @presupuesto_consultas(1)
+    def test_seleccion_de_campos(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_entrenamiento', args=[self.entrenamientos[0].id]), {'campos': 'titulo,id'})
+        self.assertEqual(response.json(), {'titulo': 'Rutina 0', 'id': self.entrenamientos[0].id})
+        response = self.client.get(reverse('api_ejercicios'), {'campos': 'nombre,peso'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('peso', response.json()['error'])
+
+    """
+        Prueba que el endpoint por lotes devuelve los objetos en el orden pedido con una consulta por tabla.
+    """
+    @presupuesto_consultas(3)
+    def test_lote(self):
+        ids = [self.entrenamientos[3].id, 999, self.entrenamientos[1].id]
+        with self.assertNumQueries(3):  # Entrenamientos, versión de los ejercicios y ejercicios.
+            response = self.client.get(reverse('api_entrenamientos_lote'), {'ids': ','.join(map(str, ids))})
+        datos = response.json()
+        self.assertEqual([e['id'] for e in datos['resultados']], [ids[0], ids[2]])
+        self.assertEqual(datos['no_encontrados'], [999])
+        self.assertEqual(self.client.get(reverse('api_ejercicios_lote'), {'ids': 'a,b'}).status_code, 400)
+
+    """
+        Prueba que una petición con el ETag de la versión actual recibe un 304 y que al cambiar el objeto deja de coincidir.
+    """
+    @presupuesto_consultas(1)
+    def test_etag(self):
+        url = reverse('api_ejercicio', args=[self.ejercicios[0].id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.ejercicios[0].descripcion = 'Tríceps'
+        self.ejercicios[0].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 405)
+        self.assertEqual(self.client.get(reverse('api_ejercicio', args=[999])).status_code, 404)
+
+    """
+        Prueba que un listado no modificado responde 304 sin cargar los ejercicios ni serializar, que
+        cambiar un ejercicio anidado o el campo pedido cambia la versión, y que la búsqueda también lee
+        solo las columnas de los campos pedidos.
+    """
+    @presupuesto_consultas(4)
+    def test_listado_no_modificado(self):
+        url = reverse('api_entrenamientos')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(3), mock.patch.object(api, 'serializar_entrenamiento') as serializar:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)  # COUNT, página y versión de los ejercicios.
+        self.assertEqual(response.status_code, 304)
+        serializar.assert_not_called()
+        self.assertNotEqual(self.client.get(url, {'campos': 'id'})['ETag'], etag)
+
+        self.ejercicios[1].nombre = 'Fondos'
+        self.ejercicios[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'q': 'rutina', 'campos': 'titulo'})
+        self.assertEqual(len(response.json()['resultados']), 5)
+        self.assertFalse(any('"descripcion"' in c['sql'] for c in consultas.captured_queries))
+
+"""
+    Clase de prueba para la fecha de modificación y las respuestas condicionales de las páginas.
+"""
+class CondicionalTests(TestCase):
+
+    def setUp(self):
+        self.ejercicio = Ejercicio.objects.create(nombre='Dominadas', descripcion='Espalda')
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Tirón', descripcion='Espalda')
+        self.url = reverse('detalles_entrenamiento', args=[self.entrenamiento.id])
+
+    """
+        Marca como antigua la fecha de modificación del entrenamiento para poder comparar.
+    """
+    def envejecer(self):
+        antes = timezone.now() - timedelta(days=1)
+        Entrenamiento.objects.update(actualizado=antes)
+        return antes
+
+    """
+        Prueba que cambiar los ejercicios actualiza la fecha del entrenamiento desde ambos lados de la relación.
+    """
+    def test_actualizado_al_cambiar_ejercicios(self):
+        antes = self.envejecer()
+        self.entrenamiento.ejercicios.add(self.ejercicio)
+        self.assertGreater(Entrenamiento.objects.get().actualizado, antes)
+        antes = self.envejecer()
+        self.ejercicio.entrenamientos.clear()
+        self.assertGreater(Entrenamiento.objects.get().actualizado, antes)
+
+    """
+        Prueba que el detalle responde 304 con el mismo ETag y deja de hacerlo al cambiar un ejercicio.
+    """
+    @presupuesto_consultas(4)  # Los similares forman parte del ETag.
+    def test_detalle_no_modificado(self):
+        self.entrenamiento.ejercicios.add(self.ejercicio)
+        url = self.url + '?mostrar=ejercicios'
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.ejercicio.descripcion = 'Dorsales'
+        self.ejercicio.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    """
+        Prueba que el listado cambia de versión al apuntarse el usuario o al iniciar sesión.
+    """
+    @presupuesto_consultas(5)
+    def test_listado_depende_del_usuario(self):
+        url = reverse('entrenamientos')
+        etag_anonimo = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag_anonimo).status_code, 304)
+
+        usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.force_login(usuario)
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, etag_anonimo)
+        usuario.entrenamientos_apuntados.add(self.entrenamiento)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    """
+        Prueba que el listado no envía Last-Modified: borrar un entrenamiento no cambia la fecha
+        más reciente de los que quedan, y un If-Modified-Since no debe devolver la página antigua.
+    """
+    def test_listado_sin_last_modified(self):
+        Entrenamiento.objects.create(titulo='Empuje', descripcion='Pecho')
+        url = reverse('entrenamientos')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.entrenamiento.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Tirón')
+
+"""
+    Clase de prueba para los contadores desnormalizados de ejercicios y apuntados.
+"""
+class ContadoresTests(TestCase):
+
+    def setUp(self):
+        self.ejercicios = [Ejercicio.objects.create(nombre=f'Ejercicio {i}', descripcion='Core') for i in range(3)]
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Core', descripcion='Abdominales')
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+
+    def contadores(self):
+        self.entrenamiento.refresh_from_db()
+        return self.entrenamiento.num_ejercicios, self.entrenamiento.num_apuntados
+
+    """
+        Prueba que el número de ejercicios se mantiene desde ambos lados de la relación y al borrar un ejercicio.
+    """
+    def test_num_ejercicios(self):
+        self.entrenamiento.ejercicios.add(*self.ejercicios)
+        self.entrenamiento.ejercicios.add(self.ejercicios[0])  # Ya estaba: no suma.
+        self.assertEqual(self.contadores(), (3, 0))
+        self.entrenamiento.ejercicios.remove(self.ejercicios[0], Ejercicio(id=999))  # El inexistente no resta.
+        self.assertEqual(self.contadores(), (2, 0))
+        self.ejercicios[1].entrenamientos.clear()
+        self.assertEqual(self.contadores(), (1, 0))
+        self.ejercicios[2].delete()
+        self.assertEqual(self.contadores(), (0, 0))
+
+    """
+        Prueba que apuntarse y desapuntarse desde las vistas actualiza el número de apuntados.
+    """
+    @presupuesto_consultas(7)
+    def test_num_apuntados_desde_las_vistas(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('apuntarse_entrenamiento', args=[self.entrenamiento.id]))
+        self.client.get(reverse('apuntarse_entrenamiento', args=[self.entrenamiento.id]))
+        self.assertEqual(self.contadores(), (0, 1))
+        self.client.get(reverse('desapuntarse_entrenamiento', args=[self.entrenamiento.id]))
+        self.assertEqual(self.contadores(), (0, 0))
+        self.entrenamiento.apuntados.add(self.usuario)
+        self.usuario.delete()
+        self.assertEqual(self.contadores(), (0, 0))
+
+    """
+        Prueba que el comando de reparación corrige los contadores desincronizados.
+    """
+    def test_comando_reparacion(self):
+        self.entrenamiento.ejercicios.add(*self.ejercicios)
+        Entrenamiento.objects.update(num_ejercicios=42, num_apuntados=7)
+        salida = StringIO()
+        call_command('recalcular_contadores', stdout=salida)
+        self.assertIn('2 contadores corregidos', salida.getvalue())
+        self.assertEqual(self.contadores(), (3, 0))
+
+    """
+        Prueba que el listado ordena por popularidad leyendo solo la columna, sin agregaciones.
+    """
+    @presupuesto_consultas(2)
+    def test_orden_por_popularidad(self):
+        popular = Entrenamiento.objects.create(titulo='Popular', descripcion='Todos lo hacen')
+        popular.apuntados.add(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('entrenamientos'), {'orden': 'populares'})
+        self.assertEqual(response.context['entrenamientos'][0], popular)
+        self.assertContains(response, '1 apuntado')
+        self.assertFalse(any('JOIN' in c['sql'] for c in consultas.captured_queries))
+
+"""
+    Clase de prueba para la migración que recalcula el número de apuntados a partir de Inscripcion.
+    Migra hacia atrás y hacia delante, así que necesita transacciones reales (SQLite no cambia el
+    esquema dentro de un bloque atómico).
+"""
+class MigracionApuntadosTests(TransactionTestCase):
+    anterior = [('FitGym', '0018_version_sugerencias')]
+    migracion = [('FitGym', '0019_recalcular_apuntados')]
+
+    def tearDown(self):
+        # Deja la base de datos en la última migración para el resto de pruebas.
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    """
+        Prueba que la migración rellena num_apuntados con las inscripciones que ya existían.
+    """
+    def test_rellena_inscripciones_existentes(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.anterior)
+        apps = executor.loader.project_state(self.anterior).apps
+        Entrenamiento = apps.get_model('FitGym', 'Entrenamiento')
+        Inscripcion = apps.get_model('FitGym', 'Inscripcion')
+        Usuario = apps.get_model('auth', 'User')
+        usuarios = [Usuario.objects.create(username=f'socio{i}') for i in range(3)]
+        popular = Entrenamiento.objects.create(titulo='Popular', descripcion='Todos lo hacen')
+        vacio = Entrenamiento.objects.create(titulo='Vacío', descripcion='Nadie', num_apuntados=5)
+        Inscripcion.objects.bulk_create(Inscripcion(usuario=u, entrenamiento=popular) for u in usuarios)
+        self.assertEqual(Entrenamiento.objects.get(pk=popular.pk).num_apuntados, 0)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migracion)
+        self.assertEqual(Entrenamiento.objects.get(pk=popular.pk).num_apuntados, 3)
+        self.assertEqual(Entrenamiento.objects.get(pk=vacio.pk).num_apuntados, 0)
+
+"""
+    Clase de prueba para apuntarse y desapuntarse de varios entrenamientos a la vez.
+"""
+class ApuntarseVariosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.force_login(self.usuario)
+        self.entrenamientos = [Entrenamiento.objects.create(titulo=f'Rutina {i}', descripcion='Cuerpo completo') for i in range(4)]
+        self.ids = [e.id for e in self.entrenamientos]
+
+    """
+        Prueba que solo se inserta la diferencia y se borran los que tenía, ignorando los inexistentes.
+    """
+    @presupuesto_consultas(8)
+    def test_diferencia_de_conjuntos(self):
+        self.usuario.entrenamientos_apuntados.add(self.entrenamientos[0], self.entrenamientos[3])
+        response = self.client.post(
+            reverse('apuntarse_varios'),
+            {'apuntar': f'{self.ids[0]},{self.ids[1]},{self.ids[2]},999', 'desapuntar': [self.ids[3]]},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'apuntados': self.ids[1:3], 'desapuntados': [self.ids[3]], 'ignorados': sorted([self.ids[0], 999]),
+        })
+        self.assertEqual(sorted(self.usuario.entrenamientos_apuntados.values_list('id', flat=True)), self.ids[:3])
+        self.assertEqual(Entrenamiento.objects.get(id=self.ids[1]).num_apuntados, 1)
+
+    """
+        Prueba que el número de consultas no depende de cuántos entrenamientos se envían.
+    """
+    @presupuesto_consultas(6)
+    def test_consultas_constantes(self):
+        def consultas(ids):
+            with CaptureQueriesContext(connection) as capturadas:
+                self.client.post(reverse('apuntarse_varios'), {'apuntar': ids}, HTTP_ACCEPT='application/json')
+            return len(capturadas)
+
+        pocos = consultas(self.ids[:1])
+        self.usuario.entrenamientos_apuntados.clear()
+        self.assertEqual(consultas(self.ids), pocos)
+        self.assertEqual(self.client.get(reverse('apuntarse_varios')).status_code, 405)
+
+    """
+        Prueba que un formulario del navegador (Accept con */*) recibe siempre la redirección, también
+        con ids no válidos, y que el mensaje de error se muestra en la página anterior.
+    """
+    @presupuesto_consultas(6)
+    def test_formulario_del_navegador(self):
+        url, anterior = reverse('apuntarse_varios'), reverse('entrenamientos')
+        accept = 'text/html,application/xhtml+xml,*/*;q=0.8'
+        response = self.client.post(url, {'apuntar': self.ids[0]}, HTTP_ACCEPT='*/*', HTTP_REFERER=anterior)
+        self.assertRedirects(response, anterior)
+        response = self.client.post(url, {'apuntar': 'abc'}, HTTP_ACCEPT=accept, HTTP_REFERER=anterior, follow=True)
+        self.assertRedirects(response, anterior)
+        self.assertContains(response, 'Los ids deben ser números')
+        self.assertEqual(list(self.usuario.entrenamientos_apuntados.values_list('id', flat=True)), self.ids[:1])
+
+    """
+        Prueba que se responde en JSON cuando se envía JSON, aunque no se indique en Accept, también los errores.
+    """
+    def test_peticion_json(self):
+        url = reverse('apuntarse_varios')
+        response = self.client.post(url, {'apuntar': self.ids[:2]}, content_type='application/json')
+        self.assertEqual(response.json()['apuntados'], self.ids[:2])
+        response = self.client.post(url, {'apuntar': ['abc']}, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'Los ids deben ser números'}))
+        response = self.client.post(url, {'apuntar': 'abc'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    """
+        Prueba que el listado marca con una insignia los entrenamientos en los que ya está apuntado.
+    """
+    @presupuesto_consultas(5)
+    def test_insignia_apuntado(self):
+        self.usuario.entrenamientos_apuntados.add(self.entrenamientos[0])
+        response = self.client.get(reverse('entrenamientos'))
+        self.assertContains(response, '>Apuntado</span>', count=1)
+        self.assertContains(response, 'form="apuntarse-varios"', count=2)
+
+
+"""
+    Pruebas de la página de entrenamientos apuntados: paginación, ordenación y modo streaming.
+"""
+class EntrenamientosApuntadosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.force_login(self.usuario)
+        self.entrenamientos = [Entrenamiento.objects.create(titulo=f'Rutina {letra}', descripcion='Cuerpo completo') for letra in 'CAB']
+        for entrenamiento in self.entrenamientos:
+            self.usuario.entrenamientos_apuntados.add(entrenamiento)
+        # Fechas de inscripción distintas para que el orden sea determinista: C, A, B.
+        for i, entrenamiento in enumerate(self.entrenamientos):
+            Inscripcion.objects.filter(entrenamiento=entrenamiento).update(fecha_apuntado=timezone.now() - timedelta(days=3 - i))
+
+    def titulos(self, response):
+        return [t.entrenamiento.titulo for t in response.context['entrenamientos']]
+
+    """
+        Prueba que la relación se declara en FitGym (no en User), así que las migraciones de 'auth' no cambian.
+    """
+    def test_relacion_fuera_de_auth(self):
+        self.assertFalse(User._meta.get_field('entrenamientos_apuntados').concrete)  # Solo el acceso inverso.
+        estado = MigrationLoader(None, ignore_no_migrations=True).project_state()
+        self.assertNotIn('entrenamientos_apuntados', estado.models['auth', 'user'].fields)
+        self.assertIn('apuntados', estado.models['FitGym', 'entrenamiento'].fields)
+
+    """
+        Prueba que la inscripción guarda la fecha en que el usuario se apuntó.
+    """
+    @presupuesto_consultas(7)
+    def test_fecha_apuntado(self):
+        nuevo = Entrenamiento.objects.create(titulo='Nuevo', descripcion='Nuevo')
+        self.client.get(reverse('apuntarse_entrenamiento', args=[nuevo.id]))
+        inscripcion = Inscripcion.objects.get(usuario=self.usuario, entrenamiento=nuevo)
+        self.assertLessEqual(timezone.now() - inscripcion.fecha_apuntado, timedelta(minutes=1))
+
+    """
+        Prueba los tres órdenes disponibles y que un orden desconocido usa la fecha de inscripción.
+    """
+    @presupuesto_consultas(4)
+    def test_ordenes(self):
+        url = reverse('entrenamientos_apuntados')
+        self.assertEqual(self.titulos(self.client.get(url)), ['Rutina B', 'Rutina A', 'Rutina C'])
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'titulo'})), ['Rutina A', 'Rutina B', 'Rutina C'])
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'recientes'})), ['Rutina B', 'Rutina A', 'Rutina C'])
+        self.assertEqual(self.client.get(url, {'orden': 'otro'}).context['orden'], 'fecha')
+
+    """
+        Prueba que la página hace las mismas consultas con pocos o muchos apuntados y que pagina.
+    """
+    @presupuesto_consultas(4)
+    def test_consultas_constantes_y_paginacion(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                response = self.client.get(reverse('entrenamientos_apuntados'))
+            return len(capturadas), response
+
+        pocas, _ = consultas()
+        for i in range(20):
+            self.usuario.entrenamientos_apuntados.add(Entrenamiento.objects.create(titulo=f'Extra {i}', descripcion='x'))
+        muchas, response = consultas()
+        self.assertEqual(muchas, pocas)
+        self.assertEqual(len(response.context['tarjetas']), 9)
+        self.assertEqual(response.context['entrenamientos'].paginator.num_pages, 3)
+
+    """
+        Prueba que el modo streaming envía todas las tarjetas dentro de la plantilla completa.
+    """
+    @presupuesto_consultas(3)
+    def test_streaming(self):
+        response = self.client.get(reverse('entrenamientos_apuntados'), {'todos': '1', 'orden': 'titulo'})
+        self.assertTrue(response.streaming)
+        html = b''.join(response.streaming_content).decode()
+        self.assertNotIn('<!--tarjetas-->', html)
+        self.assertLess(html.index('Rutina A'), html.index('Rutina B'))
+        self.assertLess(html.index('Rutina B'), html.index('Rutina C'))
+        self.assertIn('</html>', html)
+
+    """
+        Prueba que sin inscripciones se muestra el mensaje de lista vacía.
+    """
+    @presupuesto_consultas(3)
+    def test_sin_apuntados(self):
+        self.usuario.entrenamientos_apuntados.clear()
+        self.assertContains(self.client.get(reverse('entrenamientos_apuntados')), 'No te has apuntado')
+
+
+"""
+    Pruebas del middleware de instrumentación y del presupuesto de consultas.
+"""
+class InstrumentacionTests(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            Entrenamiento.objects.create(titulo=f'Rutina {i}', descripcion='Cuerpo completo')
+
+    """
+        Prueba que con INSTRUMENTACION_CABECERAS las métricas se envían en las cabeceras.
+    """
+    @override_settings(INSTRUMENTACION_CABECERAS=True)
+    def test_cabeceras(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(reverse('entrenamientos'))
+        self.assertEqual(response['X-FitGym-Vista'], 'entrenamientos')
+        self.assertEqual(int(response['X-FitGym-Consultas']), len(capturadas))
+        self.assertEqual(response['X-FitGym-Consultas-Duplicadas'], '0')
+        self.assertRegex(response['Server-Timing'], r'^bd;dur=[\d.]+, plantillas;dur=[\d.]+, total;dur=[\d.]+$')
+
+    """
+        Prueba que sin cabeceras se escribe una línea de log por petición con las métricas.
+    """
+    @override_settings(INSTRUMENTACION_CABECERAS=False)
+    def test_linea_de_log(self):
+        with self.assertLogs('FitGym.instrumentacion', 'INFO') as registros:
+            response = self.client.get(reverse('ejercicios'))
+        self.assertNotIn('X-FitGym-Consultas', response)
+        self.assertRegex(registros.output[0], r'vista=ejercicios metodo=GET estado=200 consultas=\d+ duplicadas=0')
+
+    """
+        Prueba que se detectan las consultas duplicadas y que se mide el tiempo de plantillas.
+    """
+    def test_duplicadas_y_plantillas(self):
+        def vista():
+            for entrenamiento in Entrenamiento.objects.all():  # N+1 a propósito.
+                list(entrenamiento.ejercicios.all())
+            return render_to_string('entrenamientos/tarjeta_apuntado.html', {'entrenamiento': Entrenamiento.objects.first()})
+
+        _, metricas = instrumentacion.medir(vista)
+        self.assertEqual(metricas.consultas, 5)
+        self.assertEqual(metricas.duplicadas, 2)
+        self.assertGreater(metricas.tiempo_plantillas, 0)
+        self.assertGreaterEqual(metricas.tiempo_total, metricas.tiempo_bd)
+
+    """
+        Prueba que el decorador falla cuando una vista supera su presupuesto de consultas.
+    """
+    def test_presupuesto_superado(self):
+        prueba = presupuesto_consultas(0)(lambda caso: caso.client.get(reverse('entrenamientos')))
+        with self.assertRaisesMessage(AssertionError, 'Presupuesto de 0 consultas superado'):
+            prueba(self)
+
+
+"""
+    Pruebas del generador de datos sintéticos y del benchmark de vistas.
+"""
+class DatosSinteticosTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    def generar(self):
+        call_command('generate_fake_data', ejercicios=40, entrenamientos=10, usuarios=8, inscripciones=30,
+                     imagenes=2, semilla=7, stdout=StringIO())
+        return (list(Entrenamiento.objects.order_by('pk').values_list('titulo', 'num_ejercicios', 'num_apuntados')),
+                sorted(Inscripcion.objects.values_list('usuario__username', 'entrenamiento__titulo')))
+
+    """
+        Prueba que con la misma semilla se generan los mismos datos y que los contadores quedan al día.
+    """
+    def test_reproducible(self):
+        primera = self.generar()
+        self.assertEqual(Ejercicio.objects.count(), 40)
+        self.assertEqual(User.objects.count(), 8)
+        self.assertTrue(all(4 <= num_ejercicios <= 12 for _, num_ejercicios, _ in primera[0]))
+        self.assertEqual(sum(apuntados for _, _, apuntados in primera[0]), len(primera[1]))
+        self.assertEqual(FicheroContenido.objects.count(), 2)
+        self.assertTrue(busqueda.buscar(Entrenamiento, primera[0][0][0]))
+
+        Inscripcion.objects.all().delete()
+        for modelo in (User, Entrenamiento, Ejercicio):
+            modelo.objects.all().delete()
+        self.assertEqual(self.generar(), primera)
+
+    """
+        Prueba que el benchmark mide las URL pedidas y devuelve percentiles y consultas en JSON.
+    """
+    def test_benchmark_vistas(self):
+        Entrenamiento.objects.create(titulo='Rutina', descripcion='Cuerpo completo')
+        salida = StringIO()
+        call_command('benchmark_vistas', peticiones=4, calentamiento=0, host='testserver',
+                     solo=['entrenamientos', 'api_entrenamientos_lote', 'eliminar_entrenamiento'], stdout=salida, stderr=StringIO())
+        informe = json.loads(salida.getvalue())
+        self.assertEqual([u['nombre'] for u in informe['urls']], ['entrenamientos', 'api_entrenamientos_lote'])  # Eliminar está excluida.
+        medida = informe['urls'][0]
+        self.assertEqual(medida['estados'], [200])
+        self.assertLessEqual(medida['p50_ms'], medida['p99_ms'])
+        self.assertGreater(medida['consultas_max'], 0)
+        self.assertEqual(Entrenamiento.objects.count(), 1)
+
+
+"""
+    Pruebas de las vistas asíncronas: mismas respuestas y mismas consultas que las síncronas.
+"""
+class VistasAsyncTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.ejercicio = Ejercicio.objects.create(nombre='Sentadilla', descripcion='Piernas')
+        self.entrenamientos = [Entrenamiento.objects.create(titulo=f'Rutina {i}', descripcion='Cuerpo completo') for i in range(5)]
+        self.entrenamientos[0].ejercicios.add(self.ejercicio)
+        self.usuario.entrenamientos_apuntados.add(*self.entrenamientos[:2])
+
+    """
+        Prueba que los listados y el detalle asíncronos devuelven el mismo HTML que los síncronos.
+    """
+    @presupuesto_consultas(5)
+    async def test_mismo_html(self):
+        for sincrona, asincrona, argumentos, parametros in (
+            ('entrenamientos', 'entrenamientos_async', [], {'page': 2}),
+            ('entrenamientos', 'entrenamientos_async', [], {'orden': 'populares'}),
+            ('ejercicios', 'ejercicios_async', [], {'q': 'sentadilla'}),
+            ('detalles_entrenamiento', 'detalles_entrenamiento_async', [self.entrenamientos[0].id], {'mostrar': 'ejercicios'}),
+        ):
+            esperado = await sync_to_async(self.client.get)(reverse(sincrona, args=argumentos), parametros)
+            response = await self.async_client.get(reverse(asincrona, args=argumentos), parametros)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, esperado.content)
+
+    """
+        Prueba que con paginación por cursor la vista asíncrona avanza igual que la síncrona.
+    """
+    @override_settings(PAGINACION_CURSOR=True, PAGINACION_TOTAL_APROXIMADO=True)
+    async def test_cursor(self):
+        primera = await self.async_client.get(reverse('entrenamientos_async'))
+        siguiente = await self.async_client.get(reverse('entrenamientos_async'), {'cursor': primera.context['entrenamientos'].next_cursor})
+        self.assertEqual([e.titulo for e in siguiente.context['entrenamientos']], ['Rutina 3', 'Rutina 4'])
+
+    """
+        Prueba el login asíncrono, la paginación y el modo streaming de los entrenamientos apuntados.
+    """
+    @presupuesto_consultas(4)
+    async def test_apuntados(self):
+        url = reverse('entrenamientos_apuntados_async')
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('inicio_sesion'), response['Location'])
+
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        response = await self.async_client.get(url, {'orden': 'titulo'})
+        self.assertEqual([t.entrenamiento.titulo for t in response.context['entrenamientos']], ['Rutina 0', 'Rutina 1'])
+
+        response = await self.async_client.get(url, {'todos': '1', 'orden': 'titulo'})
+        html = b''.join([parte async for parte in response.streaming_content]).decode()
+        self.assertLess(html.index('Rutina 0'), html.index('Rutina 1'))
+        self.assertNotIn('Rutina 2', html)
+
+
+"""
+    Pruebas de los estáticos con hash en el nombre y versiones precomprimidas.
+"""
+class EstaticosTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directorio = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.directorio, ignore_errors=True)
+        ajustes = override_settings(
+            STATIC_ROOT=cls.directorio,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'FitGym.estaticos.EstaticosComprimidos'}},
+        )
+        ajustes.enable()
+        try:
+            call_command('collectstatic', interactive=False, verbosity=0)  # Una vez para toda la clase: recoge también el admin.
+        finally:
+            ajustes.disable()
+        with open(os.path.join(cls.directorio, 'staticfiles.json')) as manifiesto:
+            cls.hashes = json.load(manifiesto)['paths']
+
+    """
+        Prueba que collectstatic guarda los CSS con hash y sus versiones gzip (y brotli si está instalado).
+    """
+    def test_collectstatic_comprime(self):
+        nombre = self.hashes['css/dist/styles.css']
+        self.assertRegex(nombre, r'^css/dist/styles\.[0-9a-f]{12}\.css$')
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, 'rb') as original, gzip.open(ruta + '.gz') as comprimido:
+            self.assertEqual(comprimido.read(), original.read())
+        self.assertEqual(os.path.exists(ruta + '.br'), estaticos.brotli is not None)
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, self.hashes['private-files/Logo-FitGym.png']) + '.gz'))
+
+    """
+        Prueba que la vista elige la versión comprimida según Accept-Encoding y cachea un año los ficheros con hash.
+    """
+    def test_servir(self):
+        with self.settings(STATIC_ROOT=self.directorio):
+            nombre = self.hashes['css/dist/styles.css']
+            fabrica = RequestFactory()
+            response = estaticos.servir(fabrica.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), nombre)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            response.close()
+
+            response = estaticos.servir(fabrica.get('/'), 'css/dist/styles.css')
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+            response.close()
+            with self.assertRaises(Http404):
+                estaticos.servir(fabrica.get('/'), '../manage.py')
+
+    """
+        Prueba que la plantilla base enlaza el favicon con la etiqueta static y que todos los estáticos
+        que enlaza existen en el manifiesto (si faltara alguno, {% static %} fallaría con DEBUG = False).
+    """
+    def test_plantilla_enlaza_estaticos_existentes(self):
+        html = self.client.get(reverse('entrenamientos')).content.decode()
+        self.assertIn('href="/static/private-files/Logo-FitGym.', html)
+        for ruta in re.findall(r'(?:href|src)="/static/([^"?]+)"', html):
+            self.assertIn(ruta, self.hashes)
+
+"""
+    Clase de prueba para la vista que sirve las imágenes subidas.
+"""
+class MediosTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(MEDIA_ROOT=self.directorio.name)
+        self.ajustes.enable()
+        self.ejercicio = Ejercicio.objects.create(nombre='Fondos', descripcion='Tríceps', imagen=imagen_png())
+        self.url = default_storage.url(self.ejercicio.imagen.name)
+        with default_storage.open(self.ejercicio.imagen.name) as fichero:
+            self.contenido = fichero.read()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+    """
+        Prueba que la imagen se sirve con ETag y caché de un año, y que la revalidación responde 304.
+    """
+    def test_etag_y_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.contenido)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    """
+        Prueba que las peticiones Range devuelven solo el trozo pedido y 416 si está fuera del fichero.
+    """
+    def test_range(self):
+        tamano = len(self.contenido)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{tamano}')
+        self.assertEqual(b''.join(response.streaming_content), self.contenido[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.contenido[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-', HTTP_IF_RANGE='"otra-version"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={tamano}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{tamano}')
+
+    """
+        Prueba que solo se sirven imágenes de las carpetas permitidas y que se puede delegar el envío en el proxy.
+    """
+    def test_raiz_restringida_y_descarga_delegada(self):
+        with open(os.path.join(self.directorio.name, 'settings.py'), 'w') as fichero:
+            fichero.write('SECRET_KEY = "x"')
+        prefijo = settings.MEDIA_URL
+        self.assertEqual(self.client.get(prefijo + 'settings.py').status_code, 404)
+        self.assertEqual(self.client.get(prefijo + 'contenido/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get(prefijo + 'contenido/no-existe.png').status_code, 404)
+
+        ruta = self.ejercicio.imagen.name
+        with self.settings(MEDIOS_DESCARGA='x-accel-redirect'):
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Accel-Redirect'], settings.MEDIOS_PREFIJO_INTERNO + ruta)
+            self.assertEqual(response.content, b'')
+        with self.settings(MEDIOS_DESCARGA='x-sendfile'):
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Sendfile'], os.path.join(self.directorio.name, ruta))
+
+"""
+    Clase de prueba para el reparto de consultas entre la primaria y la réplica.
+    La réplica es otra base de datos SQLite vacía, así que lo que se lee de ella no incluye lo
+    creado en la primaria: así se ve a cuál ha ido cada consulta.
+"""
+@override_settings(BD_REPLICAS=['replica'])
+class ReplicasTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Solo en primaria', descripcion='Cuerpo completo')
+
+    """
+        Prueba que las lecturas de una petición GET van a la réplica y que fuera de una petición van a la primaria.
+    """
+    def test_lecturas_en_replica(self):
+        with CaptureQueriesContext(connections['replica']) as consultas:
+            response = self.client.get(reverse('entrenamientos'))
+        self.assertNotContains(response, 'Solo en primaria')
+        self.assertTrue(consultas.captured_queries)
+        self.assertNotIn(replicas.COOKIE_PRIMARIA, response.cookies)
+        self.assertEqual(router.db_for_read(Entrenamiento), 'default')
+        self.assertEqual(router.db_for_write(Entrenamiento), 'default')
+
+    """
+        Prueba que tras escribir el usuario lee de la primaria mientras tenga la cookie, y de la réplica después.
+    """
+    def test_lectura_de_lo_escrito(self):
+        self.client.force_login(self.usuario)
+        response = self.client.post(reverse('apuntarse_entrenamiento', args=[self.entrenamiento.id]))
+        self.assertEqual(response.cookies[replicas.COOKIE_PRIMARIA]['max-age'], settings.BD_SEGUNDOS_PRIMARIA)
+        self.assertTrue(Inscripcion.objects.filter(usuario=self.usuario, entrenamiento=self.entrenamiento).exists())
+
+        response = self.client.get(reverse('entrenamientos_apuntados'))
+        self.assertContains(response, 'Solo en primaria')
+
+        del self.client.cookies[replicas.COOKIE_PRIMARIA]  # Caducada: la sesión se busca en la réplica, que no la tiene.
+        cache.clear()  # Sin la copia de la sesión en caché.
+        response = self.client.get(reverse('entrenamientos_apuntados'))
+        self.assertEqual(response.status_code, 302)
+
+"""
+    Clase de prueba para los órdenes de los listados del catálogo y los índices que los sirven.
+"""
+class OrdenesCatalogoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.ejercicios = [Ejercicio.objects.create(nombre=nombre, descripcion='Descripción') for nombre in ('Sentadilla', 'Dominadas', 'Plancha')]
+        self.entrenamientos = [Entrenamiento.objects.create(titulo=titulo, descripcion='Descripción') for titulo in ('Pierna', 'Abdomen', 'Espalda', 'Core')]
+        self.entrenamientos[2].ejercicios.add(*self.ejercicios[1:])
+        self.entrenamientos[3].ejercicios.add(self.ejercicios[2])
+        self.entrenamientos[2].apuntados.add(self.usuario)
+
+    def titulos(self, response, clave='entrenamientos'):
+        return [getattr(objeto, 'titulo', None) or objeto.nombre for objeto in response.context[clave]]
+
+    """
+        Prueba los tres órdenes de los dos listados y que un orden desconocido usa el orden por defecto.
+    """
+    @presupuesto_consultas(3)
+    def test_ordenes(self):
+        url = reverse('entrenamientos')
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'alfabetico'})), ['Abdomen', 'Core', 'Espalda'])
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'recientes'})), ['Core', 'Espalda', 'Abdomen'])
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'populares'}))[0], 'Espalda')
+        response = self.client.get(url, {'orden': 'otro'})
+        self.assertEqual(self.titulos(response), ['Pierna', 'Abdomen', 'Espalda'])
+        self.assertEqual(response.context['orden'], '')
+
+        url = reverse('ejercicios')
+        self.assertEqual(self.titulos(self.client.get(url, {'orden': 'alfabetico'}), 'ejercicios'), ['Dominadas', 'Plancha', 'Sentadilla'])
+        response = self.client.get(url, {'orden': 'populares'})
+        self.assertEqual(self.titulos(response, 'ejercicios'), ['Plancha', 'Dominadas', 'Sentadilla'])
+        self.assertContains(response, 'href="?orden=populares" class="no-underline text-blue-700"')
+
+    """
+        Prueba que el número de entrenamientos de cada ejercicio se mantiene al cambiar y borrar entrenamientos.
+    """
+    def test_contador_entrenamientos(self):
+        contadores_actuales = lambda: list(Ejercicio.objects.order_by('id').values_list('num_entrenamientos', flat=True))
+        self.assertEqual(contadores_actuales(), [0, 1, 2])
+        self.entrenamientos[0].ejercicios.add(*self.ejercicios)
+        self.ejercicios[2].entrenamientos.remove(self.entrenamientos[3])
+        self.assertEqual(contadores_actuales(), [1, 2, 2])
+        self.entrenamientos[2].delete()
+        self.assertEqual(contadores_actuales(), [1, 1, 1])
+
+    """
+        Prueba con EXPLAIN que cada orden, y la página siguiente y anterior de su cursor, se leen
+        recorriendo un índice en lugar de la tabla completa y sin ordenar después.
+    """
+    def test_explain_usa_indice(self):
+        listados = ((Entrenamiento, views.ORDENES_ENTRENAMIENTOS, 'entrenamiento'), (Ejercicio, views.ORDENES_EJERCICIOS, 'ejercicio'))
+        indices = {'creado': 'creado', 'titulo': 'titulo', 'nombre': 'nombre', 'num_apuntados': 'popularidad', 'num_entrenamientos': 'popularidad'}
+        for modelo, ordenes, prefijo in listados:
+            for campos in (*ordenes.values(), ORDEN_PREDETERMINADO):
+                indice = f"{prefijo}_{indices[campos[0].lstrip('-')]}"
+                paginator = CursorPaginator(modelo.objects.all(), 3, orden=campos)
+                pagina = paginator.get_page(None)
+                consultas = [modelo.objects.order_by(*campos)[:3]]
+                consultas += [paginator._consulta(decodificar_cursor(cursor, campos)) for cursor in (pagina.next_cursor, codificar_cursor(pagina[1], 'p', campos))]
+                for consulta in consultas:
+                    plan = consulta.explain()
+                    with self.subTest(modelo=modelo.__name__, orden=campos, plan=plan):
+                        self.assertIn(indice, plan)
+                        self.assertNotIn('TEMP B-TREE', plan)  # SQLite: ordenación aparte.
+                        self.assertNotIn('filesort', plan)  # MySQL.
+
+    """
+        Prueba que la paginación por cursor recorre un orden alfabético en los dos sentidos y que
+        un cursor de otro orden vuelve a la primera página.
+    """
+    def test_cursor_con_orden(self):
+        paginator = CursorPaginator(Entrenamiento.objects.all(), 3, orden=views.ORDENES_ENTRENAMIENTOS['alfabetico'])
+        primera = paginator.get_page(None)
+        segunda = paginator.get_page(primera.next_cursor)
+        self.assertEqual([e.titulo for e in list(primera) + list(segunda)], ['Abdomen', 'Core', 'Espalda', 'Pierna'])
+        self.assertEqual(list(paginator.get_page(segunda.previous_cursor)), list(primera))
+        otro = CursorPaginator(Entrenamiento.objects.all(), 3, orden=views.ORDENES_ENTRENAMIENTOS['recientes'])
+        self.assertEqual(list(otro.get_page(primera.next_cursor)), list(otro.get_page(None)))
+
+"""
+    Clase de prueba para las sesiones en caché y el usuario cacheado de FitGym.sesiones.
+"""
+class SesionesTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.login(username='socio', password='clave-segura-123')
+
+    def consultas_autenticacion(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in consultas.captured_queries if 'django_session' in q['sql'] or 'auth_user"' in q['sql']]
+
+    """
+        Prueba que, con la sesión y el usuario en caché, una petición autenticada no consulta ni la
+        sesión ni el usuario, y que sin caché hace una consulta de cada.
+    """
+    def test_peticion_autenticada_sin_consultas(self):
+        response, consultas = self.consultas_autenticacion(reverse('entrenamientos_apuntados'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(consultas, [])
+
+        cache.clear()
+        response, consultas = self.consultas_autenticacion(reverse('entrenamientos_apuntados'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(consultas), 2)
+
+    """
+        Prueba que con una caché local al proceso (y sin permitirla) las sesiones y el usuario se leen
+        siempre de la base de datos, para que un cierre de sesión en otro proceso se note enseguida.
+    """
+    @override_settings(SESIONES_CACHE_LOCAL=False)
+    def test_sin_cache_compartida(self):
+        cache.clear()  # Lo que guardó el inicio de sesión de setUp.
+        self.client.login(username='socio', password='clave-segura-123')
+        for _ in range(2):
+            response, consultas = self.consultas_autenticacion(reverse('entrenamientos_apuntados'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(consultas), 2)
+        self.assertIsNone(cache.get(sesiones.PREFIJO_USUARIO + str(self.usuario.pk)))
+        Session.objects.all().delete()  # Como un cierre de sesión hecho por otro proceso.
+        self.assertEqual(self.client.get(reverse('entrenamientos_apuntados')).status_code, 302)
+
+    """
+        Prueba que una sesión solo se vuelve a escribir cuando su contenido cambia.
+    """
+    def test_sesion_solo_se_guarda_si_cambia(self):
+        clave = self.client.session.session_key
+        sesion = sesiones.SessionStore(clave)
+        sesion['_auth_user_id'] = str(self.usuario.pk)  # Mismo valor: la sesión queda marcada como modificada.
+        self.assertTrue(sesion.modified)
+        with self.assertNumQueries(0):
+            sesion.save()
+
+        sesion['pestaña'] = 'ejercicios'
+        with CaptureQueriesContext(connection) as consultas:
+            sesion.save()
+        self.assertTrue(consultas.captured_queries)
+        self.assertEqual(sesiones.SessionStore(clave)['pestaña'], 'ejercicios')
+
+    """
+        Prueba que cambiar la contraseña quita el usuario de la caché y cierra las demás sesiones.
+    """
+    def test_cambio_de_contrasena(self):
+        self.assertEqual(self.client.get(reverse('entrenamientos_apuntados')).status_code, 200)
+        self.usuario.set_password('otra-clave-456')
+        self.usuario.save()
+        self.assertIsNone(cache.get(sesiones.PREFIJO_USUARIO + str(self.usuario.pk)))
+        self.assertEqual(self.client.get(reverse('entrenamientos_apuntados')).status_code, 302)
+
+    """
+        Prueba que el comando limpiar_sesiones borra por lotes solo las sesiones caducadas.
+    """
+    def test_limpiar_sesiones(self):
+        caducada = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create([Session(session_key=f'caducada{i}', session_data='', expire_date=caducada) for i in range(5)])
+        salida = StringIO()
+        call_command('limpiar_sesiones', lote=2, stdout=salida)
+        self.assertIn('5 sesiones', salida.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.client.session.session_key])
+
+"""
+    Clase de prueba para el límite de intentos de inicio de sesión y registro y el grupo de hilos de hash.
+"""
+@override_settings(LIMITE_INTENTOS_IP=(4, 1), LIMITE_INTENTOS_USUARIO=(2, 1))
+class LimitesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='socio', password='clave-segura-123')
+
+    def intento(self, usuario, ip='10.0.0.1', password='incorrecta'):
+        return self.client.post(reverse('inicio_sesion'), {'username': usuario, 'password': password}, REMOTE_ADDR=ip)
+
+    """
+        Prueba que los intentos con el mismo usuario se cortan con un 429 sin consultas ni hashes,
+        aunque vengan de otra IP, y que otro usuario sigue pudiendo entrar.
+    """
+    def test_limite_por_usuario(self):
+        self.assertEqual(self.intento('socio').status_code, 200)
+        self.assertEqual(self.intento('SOCIO', ip='10.0.0.2').status_code, 200)
+        with mock.patch('FitGym.sesiones.check_password') as comprobar, self.assertNumQueries(0):
+            response = self.intento('socio', ip='10.0.0.3', password='clave-segura-123')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        comprobar.assert_not_called()
+        self.assertEqual(self.intento('otro', ip='10.0.0.3').status_code, 200)
+
+    """
+        Prueba que una IP se corta al agotar su cubeta, que los GET no cuentan y que la cubeta se rellena con el tiempo.
+    """
+    def test_limite_por_ip(self):
+        for numero in range(4):
+            self.assertEqual(self.intento(f'usuario{numero}').status_code, 200)
+        self.assertEqual(self.client.get(reverse('inicio_sesion'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+        self.assertEqual(self.client.post(reverse('registro'), {'username': 'nuevo'}, REMOTE_ADDR='10.0.0.1').status_code, 200)
+        self.assertEqual(self.intento('usuario5').status_code, 429)
+        with mock.patch('FitGym.limites.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.intento('usuario6').status_code, 200)
+
+    """
+        Prueba que con HASH_HILOS el inicio de sesión y el registro funcionan, el hash se calcula en
+        el grupo de hilos y, si está lleno, la petición recibe un 503.
+    """
+    @override_settings(HASH_HILOS=1, HASH_COLA=0)
+    def test_grupo_de_hilos(self):
+        limites._grupo = None  # Grupo nuevo con estos ajustes.
+        self.assertEqual(limites.hashear(lambda: threading.current_thread().name), 'fitgym-hash_0')
+        response = self.intento('socio', password='clave-segura-123')
+        self.assertRedirects(response, reverse('inicio'), fetch_redirect_response=False)
+
+        _, plazas = limites.grupo_hash()
+        plazas.acquire()  # Un hash en curso ocupa la única plaza.
+        try:
+            self.assertEqual(self.intento('otro', ip='10.0.0.2').status_code, 503)
+        finally:
+            plazas.release()
+            limites._grupo = None
+
+"""
+    Clase de prueba para las recomendaciones de entrenamientos similares.
+"""
+class RecomendacionesTests(TestCase):
+
+    def setUp(self):
+        self.ejercicios = [Ejercicio.objects.create(nombre=f'Ejercicio {i}', descripcion='Descripción') for i in range(6)]
+        self.entrenamientos = [Entrenamiento.objects.create(titulo=titulo, descripcion='Descripción') for titulo in ('Pierna', 'Pierna y glúteo', 'Espalda', 'Espalda y bíceps')]
+        pierna, pierna_gluteo, espalda, espalda_biceps = self.entrenamientos
+        pierna.ejercicios.add(*self.ejercicios[:3])
+        pierna_gluteo.ejercicios.add(*self.ejercicios[:2])
+        espalda.ejercicios.add(*self.ejercicios[3:5])
+        espalda_biceps.ejercicios.add(*self.ejercicios[3:])
+        usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        usuario.entrenamientos_apuntados.add(pierna, espalda)
+
+    def lista(self, entrenamiento):
+        return [similar.titulo for similar in recomendaciones.similares(entrenamiento.id)]
+
+    """
+        Prueba que el cálculo completo ordena por similitud del coseno (los ejercicios pesan más que los
+        apuntados) y que la página de detalle muestra los similares con una sola consulta más.
+    """
+    def test_reconstruir_y_mostrar(self):
+        salida = StringIO()
+        call_command('calcular_similares', stdout=salida)
+        self.assertIn('similares guardados', salida.getvalue())
+        pierna, _, espalda, _ = self.entrenamientos
+        self.assertEqual(self.lista(pierna), ['Pierna y glúteo', 'Espalda'])
+        self.assertEqual(self.lista(espalda), ['Espalda y bíceps', 'Pierna'])
+        puntuaciones = list(EntrenamientoSimilar.objects.filter(entrenamiento=pierna).values_list('puntuacion', flat=True))
+        self.assertGreater(puntuaciones[0], puntuaciones[1])
+
+        response = self.client.get(reverse('detalles_entrenamiento', args=[pierna.id]))
+        self.assertContains(response, 'Entrenamientos similares')
+        self.assertEqual([e.titulo for e in response.context['similares']], ['Pierna y glúteo', 'Espalda'])
+
+    """
+        Prueba que el cálculo en Python (sin NumPy) da lo mismo que comparar cada par de vectores.
+    """
+    def test_calculo_coincide_con_pares(self):
+        vectores = {1: {'a': 0.6, 'b': 0.8}, 2: {'a': 1.0}, 3: {'b': 0.6, 'c': 0.8}, 4: {'d': 1.0}}
+        with mock.patch.object(recomendaciones, 'np', None):
+            resultado = recomendaciones.calcular(vectores, 2)
+        for id_, vector in vectores.items():
+            pares = [(otro, sum(valor * otro_vector.get(r, 0) for r, valor in vector.items())) for otro, otro_vector in vectores.items() if otro != id_]
+            self.assertEqual(resultado[id_], recomendaciones.mejores(pares, 2))
+        self.assertEqual(resultado[4], [])
+
+    """
+        Prueba que el cálculo con NumPy/SciPy (por bloques de filas) da los mismos similares que el cálculo en Python.
+    """
+    @skipUnless(recomendaciones.np is not None, "NumPy y SciPy no están instalados")
+    def test_calculo_con_matrices_coincide(self):
+        vectores = {1: {'a': 0.6, 'b': 0.8}, 2: {'a': 1.0}, 3: {'b': 0.6, 'c': 0.8}, 4: {'d': 1.0}, 5: {'a': 0.28, 'c': 0.96}}
+        with mock.patch.object(recomendaciones, 'FILAS_POR_BLOQUE', 2):
+            con_matrices = recomendaciones.calcular(vectores, 2)
+        with mock.patch.object(recomendaciones, 'np', None):
+            en_python = recomendaciones.calcular(vectores, 2)
+        self.assertEqual(con_matrices.keys(), en_python.keys())
+        for id_, lista in en_python.items():
+            self.assertEqual([otro for otro, _ in con_matrices[id_]], [otro for otro, _ in lista])
+            for (_, puntuacion), (_, esperada) in zip(con_matrices[id_], lista):
+                self.assertAlmostEqual(puntuacion, esperada, places=5)
+
+    """
+        Prueba que al cambiar los ejercicios de un entrenamiento se recalculan su lista y la de sus vecinos.
+    """
+    @override_settings(TAREAS_EN_LINEA=True)
+    def test_actualizacion_incremental(self):
+        recomendaciones.reconstruir()
+        pierna, pierna_gluteo, espalda, espalda_biceps = self.entrenamientos
+        pierna_gluteo.ejercicios.set(self.ejercicios[3:])  # Ahora es de espalda.
+        self.assertEqual(self.lista(pierna_gluteo), ['Espalda y bíceps', 'Espalda'])
+        self.assertNotIn('Pierna y glúteo', self.lista(pierna))
+        self.assertEqual(self.lista(espalda_biceps)[0], 'Pierna y glúteo')
+
+        pierna_gluteo.ejercicios.clear()
+        self.assertEqual(self.lista(pierna_gluteo), [])
+        self.assertNotIn('Pierna y glúteo', self.lista(espalda_biceps))
+
+"""
+    Clase de prueba para las sugerencias de autocompletado y su índice de prefijos en memoria.
+"""
+class SugerenciasTests(TestCase):
+
+    def setUp(self):
+        for titulo in ('Press de banca', 'Pierna completa', 'Prensa y sentadilla', 'Espalda con press militar'):
+            Entrenamiento.objects.create(titulo=titulo, descripcion='Descripción')
+        Ejercicio.objects.create(nombre='Elevación de talones', descripcion='Descripción')
+
+    def textos(self, url, q):
+        return [r['texto'] for r in self.client.get(url, {'q': q}).json()['resultados']]
+
+    """
+        Prueba que las sugerencias ignoran tildes y mayúsculas, encuentran palabras del medio del título
+        y ponen primero los títulos que empiezan por lo escrito; con el índice construido, sin consultas.
+    """
+    def test_sugerencias(self):
+        url = reverse('api_entrenamientos_sugerencias')
+        self.assertEqual(self.textos(url, 'PRÉS'), ['Press de banca', 'Espalda con press militar'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.textos(url, 'pr'), ['Press de banca', 'Prensa y sentadilla', 'Espalda con press militar'])
+            self.assertEqual(self.textos(url, 'press m'), ['Espalda con press militar'])
+            self.assertEqual(self.textos(url, ''), [])
+        self.assertEqual(self.textos(reverse('api_ejercicios_sugerencias'), 'elevacion'), ['Elevación de talones'])
+        response = self.client.get(url, {'q': 'pierna'})
+        self.assertEqual(response['Cache-Control'], f'max-age={api.CACHE_SUGERENCIAS}')
+
+    """
+        Prueba que crear, renombrar o borrar un entrenamiento cambia la versión y el índice se reconstruye,
+        y que guardar solo otros campos no la cambia.
+    """
+    def test_indice_se_renueva(self):
+        url = reverse('api_entrenamientos_sugerencias')
+        self.assertEqual(self.textos(url, 'core'), [])
+        core = Entrenamiento.objects.create(titulo='Core intenso', descripcion='Descripción')
+        self.assertEqual(self.textos(url, 'inten'), ['Core intenso'])
+        version = sugerencias.indice('entrenamiento').version
+        core.save(update_fields=['descripcion'])
+        usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        core.apuntados.add(usuario)  # Los contadores cambian 'actualizado', pero no los títulos.
+        with mock.patch.object(sugerencias, 'SEGUNDOS_COMPROBACION', 0):
+            self.assertEqual(sugerencias.indice('entrenamiento').version, version)
+        core.titulo = 'Abdominales'
+        core.save()
+        self.assertEqual(self.textos(url, 'core'), [])
+        self.assertEqual(self.textos(url, 'abdo'), ['Abdominales'])
+        core.delete()
+        self.assertEqual(self.textos(url, 'abdo'), [])
+
+    """
+        Prueba que un cambio hecho por otro proceso (sin señales en este) se nota en cuanto
+        toca volver a consultar la versión en la base de datos.
+    """
+    def test_cambio_desde_otro_proceso(self):
+        url = reverse('api_entrenamientos_sugerencias')
+        self.assertEqual(self.textos(url, 'pierna'), ['Pierna completa'])
+        # Otro proceso renombra y sube la versión; este no recibe la señal.
+        Entrenamiento.objects.filter(titulo='Pierna completa').update(titulo='Glúteo completo', actualizado=timezone.now())
+        VersionSugerencias.objects.filter(modelo='entrenamiento').update(version=F('version') + 1)
+        self.assertEqual(self.textos(url, 'pierna'), ['Pierna completa'])  # Todavía dentro del intervalo.
+        with mock.patch.object(sugerencias, 'SEGUNDOS_COMPROBACION', 0):
+            self.assertEqual(self.textos(url, 'pierna'), [])
+            self.assertEqual(self.textos(url, 'glut'), ['Glúteo completo'])
+
+    """
+        Prueba que con 100.000 títulos cada sugerencia tarda menos de 5 ms.
+    """
+    def test_tiempo_con_catalogo_grande(self):
+        palabras = ['press', 'prensa', 'remo', 'curl', 'sentadilla', 'plancha', 'dominadas', 'zancada']
+        filas = [(i, f'{palabras[i % 8]} {palabras[(i // 8) % 8]} {i}') for i in range(100000)]
+        indice = sugerencias.IndicePrefijos(filas, 'prueba')
+        for prefijo in ('p', 'pre', 'remo cu', 'zancada plancha 99', 'x'):
+            inicio = time.perf_counter()
+            indice.buscar(prefijo)
+            self.assertLess(time.perf_counter() - inicio, 0.005, prefijo)
+
+"""
+    Clase de prueba para el selector de ejercicios de los formularios de entrenamiento.
+"""
+class SelectorEjerciciosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.force_login(self.usuario)
+        Ejercicio.objects.bulk_create([Ejercicio(nombre=f'Ejercicio {i:03}', descripcion='Descripción') for i in range(300)])
+        self.ejercicios = list(Ejercicio.objects.order_by('id'))
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Pierna', descripcion='Descripción')
+        self.entrenamiento.ejercicios.add(self.ejercicios[5])
+
+    """
+        Prueba que las páginas del formulario no cargan el catálogo: solo muestran los ejercicios elegidos.
+    """
+    @presupuesto_consultas(3)
+    def test_formulario_sin_catalogo(self):
+        response = self.client.get(reverse('crear_entrenamiento'))
+        self.assertContains(response, 'selector-ejercicios')
+        self.assertNotContains(response, 'Ejercicio 250')
+        response = self.client.get(reverse('editar_entrenamiento', args=[self.entrenamiento.id]))
+        self.assertContains(response, f'value="{self.ejercicios[5].id}" checked')
+        self.assertNotContains(response, 'Ejercicio 250')
+
+    """
+        Prueba que los ids enviados se validan con una sola consulta IN y que se rechazan los que no
+        existen, los que no son números y las listas demasiado largas.
+    """
+    def test_validacion_de_ids(self):
+        datos = {'titulo': ['Espalda'], 'descripcion': ['Descripción']}
+        ids = [str(e.id) for e in self.ejercicios[:3]]
+        formulario = EntrenamientoForm(MultiValueDict({**datos, 'ejercicios': ids}))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(formulario.is_valid(), formulario.errors)
+        consultas_ejercicios = [q['sql'] for q in consultas.captured_queries if 'FitGym_ejercicio' in q['sql']]
+        self.assertEqual(len(consultas_ejercicios), 1)
+        self.assertIn(' IN ', consultas_ejercicios[0])
+        self.assertEqual([f.ejercicio.nombre for f in formulario.ejercicios_elegidos()], ['Ejercicio 000', 'Ejercicio 001', 'Ejercicio 002'])
+
+        for enviados in (['999999'], ['uno'], [str(e.id) for e in self.ejercicios[:MAX_EJERCICIOS_ENTRENAMIENTO + 1]]):
+            formulario = EntrenamientoForm(MultiValueDict({**datos, 'ejercicios': enviados}))
+            self.assertFalse(formulario.is_valid())
+            self.assertIn('ejercicios', formulario.errors)
+
+    """
+        Prueba que un formulario con errores vuelve a mostrar los ejercicios que se habían elegido.
+    """
+    def test_errores_conservan_eleccion(self):
+        response = self.client.post(reverse('crear_entrenamiento'), {'titulo': '', 'descripcion': 'Descripción', 'ejercicios': [self.ejercicios[7].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'value="{self.ejercicios[7].id}" checked')
+
+"""
+    Clase de prueba para las listas ordenadas de ejercicios con series, repeticiones y descanso.
+"""
+class RutinasTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='socio', password='clave-segura-123')
+        self.client.force_login(self.usuario)
+        self.ejercicios = [Ejercicio.objects.create(nombre=f'Ejercicio {i}', descripcion='Descripción') for i in range(4)]
+        self.entrenamiento = Entrenamiento.objects.create(titulo='Pierna', descripcion='Descripción')
+        a, b, c, _ = self.ejercicios
+        rutinas.guardar(self.entrenamiento, [(a.id, 3, 10, 60), (b.id, None, None, None), (c.id, 4, 8, 90)])
+
+    def orden(self):
+        return [(f.ejercicio.nombre, f.series) for f in rutinas.ejercicios_ordenados(self.entrenamiento.id)]
+
+    def escrituras(self, consultas):
+        tabla = '"FitGym_entrenamientoejercicio"'
+        return [q['sql'].split()[0] for q in consultas.captured_queries
+                if q['sql'].startswith((f'INSERT INTO {tabla}', f'UPDATE {tabla}', f'DELETE FROM {tabla}'))]
+
+    """
+        Prueba que guardar una lista solo escribe la diferencia: un DELETE, un INSERT y un UPDATE,
+        y que los contadores siguen siendo correctos.
+    """
+    def test_diferencia_minima(self):
+        a, b, c, d = self.ejercicios
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(rutinas.guardar(self.entrenamiento, [(c.id, 4, 8, 90), (a.id, 5, 5, 120), (d.id, 3, 12, None)]), (1, 1, 2))
+        self.assertEqual(sorted(self.escrituras(consultas)), ['DELETE', 'INSERT', 'UPDATE'])
+        self.assertEqual(self.orden(), [('Ejercicio 2', 4), ('Ejercicio 0', 5), ('Ejercicio 3', 3)])
+        self.entrenamiento.refresh_from_db()
+        self.assertEqual(self.entrenamiento.num_ejercicios, 3)
+        self.assertEqual({e.nombre: e.num_entrenamientos for e in Ejercicio.objects.all()},
+                         {'Ejercicio 0': 1, 'Ejercicio 1': 0, 'Ejercicio 2': 1, 'Ejercicio 3': 1})
+
+    """
+        Prueba que reordenar es un único UPDATE y que guardar la misma lista no escribe nada.
+    """
+    def test_reordenar_con_un_update(self):
+        a, b, c, _ = self.ejercicios
+        antes = Entrenamiento.objects.get(pk=self.entrenamiento.pk).actualizado
+        with CaptureQueriesContext(connection) as consultas:
+            rutinas.guardar(self.entrenamiento, [(c.id, 4, 8, 90), (b.id, None, None, None), (a.id, 3, 10, 60)])
+        self.assertEqual(self.escrituras(consultas), ['UPDATE'])
+        self.assertEqual(self.orden(), [('Ejercicio 2', 4), ('Ejercicio 1', None), ('Ejercicio 0', 3)])
+        self.assertGreater(Entrenamiento.objects.get(pk=self.entrenamiento.pk).actualizado, antes)  # Cambia el ETag del detalle.
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(rutinas.guardar(self.entrenamiento, [(c.id, 4, 8, 90), (b.id, None, None, None), (a.id, 3, 10, 60)]), (0, 0, 0))
+        self.assertEqual(self.escrituras(consultas), [])
+
+    """
+        Prueba que el formulario guarda el orden enviado y la prescripción de cada ejercicio, y que
+        el detalle la muestra en ese orden leyendo la lista con una sola consulta.
+    """
+    def test_formulario_y_detalle(self):
+        a, b, c, d = self.ejercicios
+        self.client.post(reverse('editar_entrenamiento', args=[self.entrenamiento.id]), {
+            'titulo': 'Pierna', 'descripcion': 'Descripción', 'ejercicios': [d.id, a.id],
+            f'series_{d.id}': '5', f'repeticiones_{d.id}': '5', f'descanso_{d.id}': '180', f'series_{a.id}': '3',
+        })
+        self.assertEqual(self.orden(), [('Ejercicio 3', 5), ('Ejercicio 0', 3)])
+        with self.assertNumQueries(4):  # Entrenamiento, COUNT, página de la lista con sus ejercicios y similares.
+            response = self.client.get(reverse('detalles_entrenamiento', args=[self.entrenamiento.id]), {'mostrar': 'ejercicios'})
+        contenido = response.content.decode()
+        self.assertLess(contenido.index('Ejercicio 3'), contenido.index('Ejercicio 0'))
+        self.assertContains(response, '5 series x 5 repeticiones')
+        self.assertContains(response, '180 s de descanso')
+
+        response = self.client.post(reverse('editar_entrenamiento', args=[self.entrenamiento.id]), {
+            'titulo': 'Pierna', 'descripcion': 'Descripción', 'ejercicios': [a.id], f'series_{a.id}': '-1',
+        })
+        self.assertEqual(response.status_code, 200)  # Prescripción no válida: no se guarda nada.
+        self.assertEqual(self.orden(), [('Ejercicio 3', 5), ('Ejercicio 0', 3)])
@@ -1,7 +1,6 @@
-from django.urls import path
-from . import views
+from django.urls import path, re_path
+from . import api, medios, views, vistas_async
 from django.conf import settings
-from django.contrib.staticfiles.urls import static
 
 urlpatterns = [
     path('', views.inicio, name='inicio'),
@@ -22,6 +21,22 @@ urlpatterns = [
     path('entrenamiento/<int:id>/apuntarse/', views.apuntarse_entrenamiento, name='apuntarse_entrenamiento'),
     path('entrenamiento/<int:id>/desapuntarse/', views.desapuntarse_entrenamiento, name='desapuntarse_entrenamiento'),
     path('entrenamientos/apuntados', views.entrenamientos_apuntados, name='entrenamientos_apuntados'),
+    path('entrenamientos/apuntarse', views.apuntarse_varios, name='apuntarse_varios'),
+    path('api/v1/entrenamientos', api.entrenamientos, name='api_entrenamientos'),
+    path('api/v1/entrenamientos/lote', api.entrenamientos_lote, name='api_entrenamientos_lote'),
+    path('api/v1/entrenamientos/sugerencias', api.entrenamientos_sugerencias, name='api_entrenamientos_sugerencias'),
+    path('api/v1/entrenamientos/<int:id>', api.entrenamiento, name='api_entrenamiento'),
+    path('api/v1/ejercicios', api.ejercicios, name='api_ejercicios'),
+    path('api/v1/ejercicios/lote', api.ejercicios_lote, name='api_ejercicios_lote'),
+    path('api/v1/ejercicios/sugerencias', api.ejercicios_sugerencias, name='api_ejercicios_sugerencias'),
+    path('api/v1/ejercicios/<int:id>', api.ejercicio, name='api_ejercicio'),
+    # Versiones asíncronas de las vistas de lectura, para servirlas con ASGI (ver FitGym/vistas_async.py).
+    path('async/entrenamientos', vistas_async.entrenamientos, name='entrenamientos_async'),
+    path('async/ejercicios', vistas_async.ejercicios, name='ejercicios_async'),
+    path('async/entrenamiento/<int:id>/', vistas_async.detalles_entrenamiento, name='detalles_entrenamiento_async'),
+    path('async/entrenamientos/apuntados', vistas_async.entrenamientos_apuntados, name='entrenamientos_apuntados_async'),
+    # Imágenes subidas, con ETag, Range y caché larga (ver FitGym/medios.py).
+    re_path(r'^%s(?P<ruta>.+)$' % settings.MEDIA_URL.lstrip('/'), medios.servir, name='medios'),
 
 
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
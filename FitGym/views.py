@@ -1,12 +1,43 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator
-from .models import Entrenamiento, Ejercicio
+from django.conf import settings
+from .models import Entrenamiento, Ejercicio, Inscripcion
 from .forms import EntrenamientoForm, EjercicioForm
+from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.db import IntegrityError
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django import forms
+from django.utils.datastructures import MultiValueDict
+import json
 from .forms import UserRegistrationForm
+from . import busqueda as motor_busqueda
+from . import condicional, fragmentos, limites, recomendaciones, rutinas
+from .paginacion import ORDEN_PREDETERMINADO, CursorPaginator
+
+ORDENES_ENTRENAMIENTOS = {  # Órdenes del listado de entrenamientos ('?orden='); cada uno tiene su índice en Entrenamiento.Meta.
+    'recientes': ('-creado', '-id'),  # Índice 'entrenamiento_creado' leído al revés.
+    'alfabetico': ('titulo', 'id'),
+    'populares': ('-num_apuntados', 'id'),  # Más apuntados primero, sin agregar.
+}
+ORDENES_EJERCICIOS = {  # Órdenes del listado de ejercicios; cada uno tiene su índice en Ejercicio.Meta.
+    'recientes': ('-creado', '-id'),
+    'alfabetico': ('nombre', 'id'),
+    'populares': ('-num_entrenamientos', 'id'),  # Los incluidos en más entrenamientos primero.
+}
+MAX_APUNTADOS_LOTE = 200  # Entrenamientos como máximo en una petición de 'apuntarse_varios'.
+ORDENES_APUNTADOS = {  # Órdenes de la página de entrenamientos apuntados (el primero es el predeterminado).
+    'fecha': ('-fecha_apuntado', '-id'),  # Último apuntado primero (usa el índice 'inscripcion_usuario_fecha').
+    'titulo': ('entrenamiento__titulo', 'id'),
+    'recientes': ('-entrenamiento__creado', '-id'),  # Entrenamientos más nuevos primero.
+}
+APUNTADOS_POR_PAGINA = 9
+TAMANO_BLOQUE_STREAMING = 200  # Tarjetas renderizadas por bloque en el modo 'todos'.
+MARCADOR_TARJETAS = '<!--tarjetas-->'  # Punto de la plantilla donde se insertan las tarjetas en streaming.
 
 """
     Vista de inicio que renderiza la página principal.
@@ -14,64 +45,166 @@ from .forms import UserRegistrationForm
 def inicio(request):
     return render(request, 'paginas/inicio.html', {'show_navbar': True})
 
+"""
+    Devuelve la clave y los campos del orden pedido con '?orden=' entre los de 'ordenes', o una
+    clave vacía y el orden por defecto (creado, id) si no se pide ninguno o no es válido.
+"""
+def orden_pedido(request, ordenes):
+    clave = request.GET.get('orden', '')
+    if clave in ordenes:
+        return clave, ordenes[clave]
+    return '', ORDEN_PREDETERMINADO
+
+"""
+    Pagina un queryset del catálogo ordenado por los campos de 'orden' (por defecto, (creado, id)).
+    Si PAGINACION_CURSOR está activado usa la paginación por cursor, cuyo coste no depende de la
+    profundidad de la página; si no, la paginación numerada clásica con COUNT + OFFSET.
+"""
+def paginar(request, queryset, por_pagina, orden=ORDEN_PREDETERMINADO):
+    if getattr(settings, 'PAGINACION_CURSOR', False):
+        paginator = CursorPaginator(queryset, por_pagina, total_aproximado=getattr(settings, 'PAGINACION_TOTAL_APROXIMADO', False), orden=orden)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(queryset.order_by(*orden), por_pagina)
+    return paginator.get_page(request.GET.get('page'))
+
+"""
+    Pagina los resultados de una búsqueda en el índice de texto completo.
+    Se pagina la lista de ids ordenada por relevancia y solo se cargan de la base de datos
+    los objetos de la página solicitada (desde 'queryset', si se indica).
+"""
+def paginar_busqueda(modelo, busqueda, num_pag, por_pagina, queryset=None):
+    ids = motor_busqueda.buscar(modelo, busqueda)
+    obj = Paginator(ids, por_pagina).get_page(num_pag)
+    obj.object_list = motor_busqueda.objetos_ordenados(modelo, list(obj.object_list), queryset)
+    return obj
+
+"""
+    Devuelve los ids de los entrenamientos de una página en los que está apuntado el usuario,
+    con una única consulta para toda la página (vacío para anónimos y staff, que no ven el botón).
+"""
+def ids_apuntados(request, entrenamientos):
+    if not request.user.is_authenticated or request.user.is_staff:
+        return set()
+    ids = [e.id for e in entrenamientos]
+    if not ids:
+        return set()
+    return set(request.user.entrenamientos_apuntados.filter(id__in=ids).values_list('id', flat=True))
+
+"""
+    Devuelve el HTML de las tarjetas de una página de entrenamientos usando la caché de fragmentos.
+    'apuntados' son los ids de la página en los que está apuntado el usuario (ver ids_apuntados).
+"""
+def tarjetas_entrenamientos(request, entrenamientos, apuntados):
+    entrenamientos = list(entrenamientos)
+    mostrar_apuntarse = request.user.is_authenticated and not request.user.is_staff
+
+    def variante(entrenamiento):
+        if not mostrar_apuntarse:
+            return 'publico'
+        return 'apuntado' if entrenamiento.id in apuntados else 'no_apuntado'
+
+    return fragmentos.renderizar_tarjetas(
+        entrenamientos, 'entrenamientos/tarjeta_entrenamiento.html', variante,
+        lambda e: {'entrenamiento': e, 'mostrar_apuntarse': mostrar_apuntarse, 'apuntado': e.id in apuntados},
+    )
+
+"""
+    Devuelve el HTML de las tarjetas de una página de ejercicios usando la caché de fragmentos.
+"""
+def tarjetas_ejercicios(request, ejercicios):
+    es_staff = request.user.is_staff
+    return fragmentos.renderizar_tarjetas(
+        list(ejercicios), 'ejercicios/tarjeta_ejercicio.html',
+        lambda e: 'staff' if es_staff else 'publico',
+        lambda e: {'ejercicio': e, 'es_staff': es_staff},
+    )
+
 """
     Vista que muestra todos los entrenamientos o los que coinciden con una búsqueda.
+    La búsqueda usa el índice invertido sobre título y descripción, sin distinguir tildes ni mayúsculas.
+    Responde 304 si no ha cambiado ningún entrenamiento de la página ni las inscripciones del usuario.
 """
 def entrenamientos(request):
     busqueda = request.GET.get('q', '') 
-    entrenamientos = Entrenamiento.objects.filter(titulo__icontains=busqueda) if busqueda else Entrenamiento.objects.all()
-    paginator = Paginator(entrenamientos, 3)  # Paginación de los entrenamientos de 3 en 3
     num_pag = request.GET.get('page')  # Obtiene la página actual
-    obj = paginator.get_page(num_pag)  # Obtiene los entrenamientos correspondientes a la página solicitada
+    orden = ''
+    if busqueda:
+        obj = paginar_busqueda(Entrenamiento, busqueda, num_pag, 3)  # Resultados ordenados por relevancia
+    else:
+        orden, campos = orden_pedido(request, ORDENES_ENTRENAMIENTOS)  # Recientes, alfabético o populares, cada uno con su índice
+        obj = paginar(request, Entrenamiento.objects.all(), 3, campos)  # Paginación de los entrenamientos de 3 en 3
+    apuntados = ids_apuntados(request, obj)
+    version = condicional.version(request, obj, condicional.estado_paginacion(obj), sorted(apuntados))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:  # El navegador ya tiene esta página: 304 sin renderizar
+        return no_modificada
 
-    return render(request, 'entrenamientos/index.html', {
+    return condicional.anotar(render(request, 'entrenamientos/index.html', {
         'entrenamientos': obj,
+        'tarjetas': tarjetas_entrenamientos(request, obj, apuntados),
         'mostrar_ejercicios': False, 
         'show_navbar': True,
-        'busqueda': busqueda
-    })
+        'busqueda': busqueda,
+        'orden': orden,
+    }), version)
 
 """
     Vista que muestra todos los ejercicios o los que coinciden con una búsqueda.
+    La búsqueda usa el índice invertido sobre nombre y descripción, sin distinguir tildes ni mayúsculas.
+    Responde 304 si no ha cambiado ningún ejercicio de la página.
 """
 def ejercicios(request):
     busqueda = request.GET.get('q', '') 
-    ejercicios = Ejercicio.objects.filter(nombre__icontains=busqueda) if busqueda else Ejercicio.objects.all()
-    paginator = Paginator(ejercicios, 3) 
     num_pag = request.GET.get('page')  
-    obj = paginator.get_page(num_pag) 
+    orden = ''
+    if busqueda:
+        obj = paginar_busqueda(Ejercicio, busqueda, num_pag, 3)
+    else:
+        orden, campos = orden_pedido(request, ORDENES_EJERCICIOS)
+        obj = paginar(request, Ejercicio.objects.all(), 3, campos)
+    version = condicional.version(request, obj, condicional.estado_paginacion(obj))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:
+        return no_modificada
 
-    return render(request, 'entrenamientos/index.html', {
+    return condicional.anotar(render(request, 'entrenamientos/index.html', {
         'ejercicios': obj,
+        'tarjetas': tarjetas_ejercicios(request, obj),
         'mostrar_ejercicios': True, 
         'show_navbar': True,
-        'busqueda': busqueda
-    })
+        'busqueda': busqueda,
+        'orden': orden,
+    }), version)
 
 """
     Vista que muestra los detalles de un entrenamiento específico, incluyendo sus ejercicios.
+    Responde 304 si ni el entrenamiento ni sus ejercicios han cambiado desde la última visita.
 """
 def detalles_entrenamiento(request, id):
     entrenamiento = get_object_or_404(Entrenamiento, id=id)  # Obtiene el entrenamiento o muestra un error 404 si no existe
-    ejercicios = entrenamiento.ejercicios.all()  # Obtiene los ejercicios asociados al entrenamiento
-    paginator = Paginator(ejercicios, 4) 
-    num_pag = request.GET.get('page') 
-    pagina_ejercicios = paginator.get_page(num_pag)  # Obtiene los ejercicios correspondientes a la página solicitada
+    filas = rutinas.ejercicios_ordenados(entrenamiento.id)  # Ejercicios en orden con su prescripción, en una sola consulta
+    pagina_ejercicios = paginar(request, filas, 4, rutinas.ORDEN)  # Obtiene los ejercicios correspondientes a la página solicitada
     mostrar = request.GET.get('mostrar', 'descripcion')  # Define qué parte mostrar del entrenamiento (descripcion o ejercicios)
+    similares = list(recomendaciones.similares(entrenamiento.id))  # Ya calculados: una consulta indexada
+    version = condicional.version(request, [entrenamiento, *(fila.ejercicio for fila in pagina_ejercicios), *similares],
+                                  condicional.estado_paginacion(pagina_ejercicios), rutinas.prescripciones(pagina_ejercicios))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:  # Ni el entrenamiento ni sus ejercicios han cambiado: 304 sin renderizar
+        return no_modificada
 
-    return render(request, 'entrenamientos/entrenamiento.html', {
+    return condicional.anotar(render(request, 'entrenamientos/entrenamiento.html', {
         'entrenamiento': entrenamiento,
         'ejercicios': pagina_ejercicios,
+        'similares': similares,
         'mostrar': mostrar,
         'show_navbar': True
-    })
+    }), version)
 
 """
     Vista protegida por login para crear un nuevo entrenamiento.
 """
 @login_required
 def crear_entrenamiento(request):
-    ejercicios = Ejercicio.objects.all()  # Obtiene todos los ejercicios disponibles
     formulario = EntrenamientoForm(request.POST or None, request.FILES or None)  # Inicializa el formulario de entrenamiento
     
     if formulario.is_valid():  # Si el formulario es válido, guarda el nuevo entrenamiento
@@ -80,7 +213,6 @@ def crear_entrenamiento(request):
     
     return render(request, 'entrenamientos/crear_entrenamiento.html', {
         'formulario': formulario,
-        'ejercicios': ejercicios,
         'show_navbar': True
     })
 
@@ -89,7 +221,6 @@ def crear_entrenamiento(request):
 """
 @login_required
 def editar_entrenamiento(request, id):
-    ejercicios = Ejercicio.objects.all()  # Obtiene todos los ejercicios disponibles
     entrenamiento = Entrenamiento.objects.get(id=id)  # Obtiene el entrenamiento a editar
     is_editing = True if entrenamiento else False
     formulario = EntrenamientoForm(request.POST or None, request.FILES or None, instance=entrenamiento)  # Rellena el formulario con los datos del entrenamiento
@@ -98,7 +229,7 @@ def editar_entrenamiento(request, id):
         formulario.save()
         return redirect('entrenamientos') 
     
-    return render(request, 'entrenamientos/editar_entrenamiento.html', {'formulario': formulario, 'ejercicios': ejercicios, 'is_editing': is_editing, 'show_navbar': True})
+    return render(request, 'entrenamientos/editar_entrenamiento.html', {'formulario': formulario, 'is_editing': is_editing, 'show_navbar': True})
 
 """
     Vista protegida por login para eliminar un entrenamiento.
@@ -147,12 +278,14 @@ def eliminar_ejercicio(request, id):
 """
     Vista para registrar un nuevo usuario.
 """
+@limites.limitar_intentos
 def registro(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)  # Inicializa el formulario de registro
         if form.is_valid():  # Si el formulario es válido, guarda el usuario y lo loguea
             try:
-                usuario = form.save()
+                usuario = limites.hashear(form.save, commit=False)  # Solo calcula el hash de la contraseña
+                usuario.save()
                 login(request, usuario)
                 return redirect('entrenamientos')  
             except IntegrityError:  # Si hay un error de integridad (por ejemplo, el usuario ya existe), muestra un mensaje de error
@@ -185,6 +318,7 @@ class LoginForm(forms.Form):
 """
     Vista para el inicio de sesión de un usuario.
 """
+@limites.limitar_intentos
 def inicio_sesion(request):
     error = ""
     if request.method == 'POST':
@@ -209,18 +343,137 @@ def inicio_sesion(request):
 @login_required
 def apuntarse_entrenamiento(request, id):
     entrenamiento = get_object_or_404(Entrenamiento, id=id) 
-    if entrenamiento in request.user.entrenamientos_apuntados.all():
+    if request.user.entrenamientos_apuntados.filter(id=id).exists():  # Comprobación indexada, sin cargar todos sus entrenamientos
         return redirect('entrenamientos')  # Si el usuario ya está apuntado, redirige a la vista de entrenamientos
     request.user.entrenamientos_apuntados.add(entrenamiento)  # Si no está apuntado, lo agrega a la lista de entrenamientos del usuario
     return redirect('entrenamientos')
 
+"""
+    Lee una lista de ids de entrenamiento enviada en un formulario (campos repetidos o separados por comas).
+"""
+def ids_enviados(datos, campo):
+    ids = set()
+    for valor in datos.getlist(campo):
+        ids.update(int(i) for i in str(valor).split(',') if i.strip())
+    return ids
+
+"""
+    Indica si el cliente pide explícitamente JSON, en la cabecera Accept o enviando JSON.
+    No sirve request.accepts('application/json'): un formulario del navegador acepta */*.
+"""
+def pide_json(request):
+    return 'application/json' in request.headers.get('Accept', '') or request.content_type == 'application/json'
+
+"""
+    Devuelve los datos enviados por POST: los del formulario o, si el cuerpo es JSON, un objeto
+    como {"apuntar": [1, 2]} con la misma forma que request.POST. Lanza ValueError si no es válido.
+"""
+def datos_enviados(request):
+    if request.content_type != 'application/json':
+        return request.POST
+    datos = json.loads(request.body or '{}')
+    if not isinstance(datos, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    return MultiValueDict({campo: valor if isinstance(valor, list) else [valor] for campo, valor in datos.items()})
+
+"""
+    Vista protegida por login para apuntarse y desapuntarse de varios entrenamientos a la vez.
+    Recibe por POST los ids en 'apuntar' y 'desapuntar'. Con una sola consulta sabe qué entrenamientos
+    existen y en cuáles ya está apuntado el usuario; después inserta solo la diferencia y borra
+    solo los que tenía, con una operación por lotes cada una (los contadores se actualizan por señales).
+    Responde en JSON solo si se pide explícitamente (ver pide_json); si no, vuelve a la página
+    anterior, con un mensaje si la petición no era válida.
+"""
+@login_required
+@require_POST
+def apuntarse_varios(request):
+    def error(mensaje):
+        if pide_json(request):
+            return JsonResponse({'error': mensaje}, status=400)
+        messages.error(request, mensaje)
+        return redirect(request.META.get('HTTP_REFERER', 'entrenamientos_apuntados'))
+
+    try:
+        datos = datos_enviados(request)
+        apuntar, desapuntar = ids_enviados(datos, 'apuntar'), ids_enviados(datos, 'desapuntar')
+    except ValueError:
+        return error("Los ids deben ser números")
+    if len(apuntar) + len(desapuntar) > MAX_APUNTADOS_LOTE:
+        return error(f"Como máximo {MAX_APUNTADOS_LOTE} entrenamientos por petición")
+    apuntar, desapuntar = apuntar - desapuntar, desapuntar - apuntar  # Si un id viene en ambas listas, se ignora.
+
+    relacion = request.user.entrenamientos_apuntados
+    intermedia = relacion.through.objects.filter(usuario_id=request.user.pk, entrenamiento_id=OuterRef('pk'))
+    estado = dict(Entrenamiento.objects.filter(id__in=apuntar | desapuntar)
+                  .annotate(apuntado=Exists(intermedia)).values_list('id', 'apuntado'))
+    nuevos = {i for i in apuntar if estado.get(i) is False}
+    quitados = {i for i in desapuntar if estado.get(i)}
+    if nuevos:
+        relacion.add(*nuevos)
+    if quitados:
+        relacion.remove(*quitados)
+
+    if pide_json(request):
+        return JsonResponse({
+            'apuntados': sorted(nuevos),
+            'desapuntados': sorted(quitados),
+            'ignorados': sorted((apuntar | desapuntar) - nuevos - quitados),  # Inexistentes o sin cambios.
+        })
+    return redirect(request.META.get('HTTP_REFERER', 'entrenamientos_apuntados'))
+
+"""
+    Devuelve el HTML de las tarjetas de los entrenamientos apuntados usando la caché de fragmentos.
+"""
+def tarjetas_apuntados(entrenamientos):
+    return fragmentos.renderizar_tarjetas(
+        list(entrenamientos), 'entrenamientos/tarjeta_apuntado.html',
+        lambda e: 'apuntado', lambda e: {'entrenamiento': e},
+    )
+
+"""
+    Genera la página de entrenamientos apuntados por partes: primero la cabecera de la plantilla,
+    después las tarjetas en bloques leídos con un cursor del servidor (iterator) y por último el pie.
+    Así la memoria no depende del número de inscripciones y el navegador empieza a pintar antes.
+"""
+def streaming_apuntados(request, inscripciones, contexto):
+    cabecera, pie = render_to_string('entrenamientos/apuntados.html', contexto, request).split(MARCADOR_TARJETAS, 1)
+    yield cabecera
+    bloque = []
+    for inscripcion in inscripciones.iterator(chunk_size=TAMANO_BLOQUE_STREAMING):
+        bloque.append(inscripcion.entrenamiento)
+        if len(bloque) == TAMANO_BLOQUE_STREAMING:
+            yield ''.join(tarjetas_apuntados(bloque))
+            bloque = []
+    if bloque:
+        yield ''.join(tarjetas_apuntados(bloque))
+    yield pie
+
 """
     Vista protegida por login que muestra los entrenamientos a los que el usuario está apuntado.
+    Se ordenan por fecha de inscripción, título o novedad ('orden') y se paginan con una sola
+    consulta sobre la tabla de inscripciones que trae también el entrenamiento (select_related).
+    Con 'todos=1' muestra todas las inscripciones en una única página enviada en streaming.
 """
 @login_required
 def entrenamientos_apuntados(request):
-    entrenamientos = request.user.entrenamientos_apuntados.all()  # Obtiene los entrenamientos apuntados por el usuario
-    return render(request, 'entrenamientos/apuntados.html', {'entrenamientos': entrenamientos, 'show_navbar': True})
+    orden = request.GET.get('orden')
+    if orden not in ORDENES_APUNTADOS:
+        orden = next(iter(ORDENES_APUNTADOS))
+    inscripciones = (Inscripcion.objects.filter(usuario=request.user)
+                     .select_related('entrenamiento').order_by(*ORDENES_APUNTADOS[orden]))
+    contexto = {'orden': orden, 'show_navbar': True}
+
+    if request.GET.get('todos'):
+        contexto.update(streaming=True, hay_apuntados=inscripciones.exists(), marcador=MARCADOR_TARJETAS)
+        return StreamingHttpResponse(streaming_apuntados(request, inscripciones, contexto))
+
+    pagina = Paginator(inscripciones, APUNTADOS_POR_PAGINA).get_page(request.GET.get('page'))
+    contexto.update(
+        entrenamientos=pagina,
+        hay_apuntados=pagina.paginator.count > 0,
+        tarjetas=tarjetas_apuntados(inscripcion.entrenamiento for inscripcion in pagina),
+    )
+    return render(request, 'entrenamientos/apuntados.html', contexto)
 
 """
     Vista protegida por login para desapuntarse de un entrenamiento.
@@ -0,0 +1,194 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.template.loader import render_to_string
+from . import condicional, recomendaciones, rutinas, views
+from .models import Ejercicio, Entrenamiento, Inscripcion
+from .paginacion import ORDEN_PREDETERMINADO, CursorPaginator
+
+"""
+    Versiones asíncronas de las vistas de lectura del catálogo, para servirlas con ASGI (Proyecto-IDP/asgi.py).
+
+    Las consultas usan el ORM asíncrono (acount, aget, iteración con async for), así que la vista no
+    ocupa un hilo mientras espera a la base de datos. El usuario se resuelve con request.auser() antes
+    de entrar en la vista; a partir de ahí request.user es el usuario ya cargado y las plantillas y los
+    helpers síncronos de views pueden usarlo sin consultas. Las partes que siguen siendo síncronas
+    (búsqueda, caché de tarjetas y plantillas) se ejecutan con sync_to_async.
+    Las respuestas son las mismas que las de las vistas síncronas de FitGym.views.
+"""
+
+arender = sync_to_async(render)
+
+"""
+    Decorador que resuelve el usuario de la sesión de forma asíncrona y lo deja en request.user.
+"""
+def con_usuario(vista):
+    @wraps(vista)
+    async def envoltorio(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await vista(request, *args, **kwargs)
+    return envoltorio
+
+"""
+    Equivalente asíncrono de login_required: redirige al inicio de sesión sin pasar por ningún hilo.
+"""
+def login_requerido(vista):
+    @wraps(vista)
+    async def envoltorio(request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await vista(request, *args, **kwargs)
+    return envoltorio
+
+"""
+    Versión asíncrona de views.paginar: con PAGINACION_CURSOR usa CursorPaginator.aget_page y,
+    si no, la paginación numerada.
+"""
+async def apaginar(request, queryset, por_pagina, orden=ORDEN_PREDETERMINADO):
+    if getattr(settings, 'PAGINACION_CURSOR', False):
+        paginator = CursorPaginator(queryset, por_pagina, total_aproximado=getattr(settings, 'PAGINACION_TOTAL_APROXIMADO', False), orden=orden)
+        return await paginator.aget_page(request.GET.get('cursor'))
+    return await apaginar_numerada(request, queryset, por_pagina, orden)
+
+"""
+    Paginación numerada asíncrona: cuenta con acount() y carga la página con async for.
+"""
+async def apaginar_numerada(request, queryset, por_pagina, orden):
+    paginator = Paginator(queryset.order_by(*orden), por_pagina)
+    paginator.count = await paginator.object_list.acount()  # Paginator.count es una cached_property: así no hace el COUNT síncrono.
+    pagina = paginator.get_page(request.GET.get('page'))
+    pagina.object_list = [objeto async for objeto in pagina.object_list]
+    return pagina
+
+"""
+    Versión asíncrona de views.ids_apuntados.
+"""
+async def aids_apuntados(request, entrenamientos):
+    if not request.user.is_authenticated or request.user.is_staff:
+        return set()
+    ids = [e.id for e in entrenamientos]
+    if not ids:
+        return set()
+    consulta = request.user.entrenamientos_apuntados.filter(id__in=ids).values_list('id', flat=True)
+    return {i async for i in consulta}
+
+"""
+    Vista asíncrona que muestra todos los entrenamientos o los que coinciden con una búsqueda.
+"""
+@con_usuario
+async def entrenamientos(request):
+    busqueda = request.GET.get('q', '')
+    orden = ''
+    if busqueda:
+        obj = await sync_to_async(views.paginar_busqueda)(Entrenamiento, busqueda, request.GET.get('page'), 3)
+    else:
+        orden, campos = views.orden_pedido(request, views.ORDENES_ENTRENAMIENTOS)
+        obj = await apaginar(request, Entrenamiento.objects.all(), 3, campos)
+    apuntados = await aids_apuntados(request, obj)
+    version = condicional.version(request, obj, condicional.estado_paginacion(obj), sorted(apuntados))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:
+        return no_modificada
+
+    return condicional.anotar(await arender(request, 'entrenamientos/index.html', {
+        'entrenamientos': obj,
+        'tarjetas': await sync_to_async(views.tarjetas_entrenamientos)(request, obj, apuntados),
+        'mostrar_ejercicios': False,
+        'show_navbar': True,
+        'busqueda': busqueda,
+        'orden': orden,
+    }), version)
+
+"""
+    Vista asíncrona que muestra todos los ejercicios o los que coinciden con una búsqueda.
+"""
+@con_usuario
+async def ejercicios(request):
+    busqueda = request.GET.get('q', '')
+    orden = ''
+    if busqueda:
+        obj = await sync_to_async(views.paginar_busqueda)(Ejercicio, busqueda, request.GET.get('page'), 3)
+    else:
+        orden, campos = views.orden_pedido(request, views.ORDENES_EJERCICIOS)
+        obj = await apaginar(request, Ejercicio.objects.all(), 3, campos)
+    version = condicional.version(request, obj, condicional.estado_paginacion(obj))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:
+        return no_modificada
+
+    return condicional.anotar(await arender(request, 'entrenamientos/index.html', {
+        'ejercicios': obj,
+        'tarjetas': await sync_to_async(views.tarjetas_ejercicios)(request, obj),
+        'mostrar_ejercicios': True,
+        'show_navbar': True,
+        'busqueda': busqueda,
+        'orden': orden,
+    }), version)
+
+"""
+    Vista asíncrona que muestra los detalles de un entrenamiento y una página de sus ejercicios.
+"""
+@con_usuario
+async def detalles_entrenamiento(request, id):
+    entrenamiento = await aget_object_or_404(Entrenamiento, id=id)
+    pagina_ejercicios = await apaginar(request, rutinas.ejercicios_ordenados(entrenamiento.id), 4, rutinas.ORDEN)
+    similares = [similar async for similar in recomendaciones.similares(entrenamiento.id)]
+    version = condicional.version(request, [entrenamiento, *(fila.ejercicio for fila in pagina_ejercicios), *similares],
+                                  condicional.estado_paginacion(pagina_ejercicios), rutinas.prescripciones(pagina_ejercicios))
+    no_modificada = condicional.no_modificada(request, version)
+    if no_modificada:
+        return no_modificada
+
+    return condicional.anotar(await arender(request, 'entrenamientos/entrenamiento.html', {
+        'entrenamiento': entrenamiento,
+        'ejercicios': pagina_ejercicios,
+        'similares': similares,
+        'mostrar': request.GET.get('mostrar', 'descripcion'),
+        'show_navbar': True
+    }), version)
+
+"""
+    Genera en streaming la página de entrenamientos apuntados leyendo las inscripciones con async for.
+"""
+async def astreaming_apuntados(request, inscripciones, contexto):
+    plantilla = await sync_to_async(render_to_string)('entrenamientos/apuntados.html', contexto, request)
+    cabecera, pie = plantilla.split(views.MARCADOR_TARJETAS, 1)
+    yield cabecera
+    bloque = []
+    async for inscripcion in inscripciones:
+        bloque.append(inscripcion.entrenamiento)
+        if len(bloque) == views.TAMANO_BLOQUE_STREAMING:
+            yield ''.join(await sync_to_async(views.tarjetas_apuntados)(bloque))
+            bloque = []
+    if bloque:
+        yield ''.join(await sync_to_async(views.tarjetas_apuntados)(bloque))
+    yield pie
+
+"""
+    Vista asíncrona que muestra los entrenamientos a los que el usuario está apuntado.
+"""
+@login_requerido
+async def entrenamientos_apuntados(request):
+    orden = request.GET.get('orden')
+    if orden not in views.ORDENES_APUNTADOS:
+        orden = next(iter(views.ORDENES_APUNTADOS))
+    inscripciones = Inscripcion.objects.filter(usuario=request.user).select_related('entrenamiento')
+    contexto = {'orden': orden, 'show_navbar': True}
+
+    if request.GET.get('todos'):
+        inscripciones = inscripciones.order_by(*views.ORDENES_APUNTADOS[orden])
+        contexto.update(streaming=True, hay_apuntados=await inscripciones.aexists(), marcador=views.MARCADOR_TARJETAS)
+        return StreamingHttpResponse(astreaming_apuntados(request, inscripciones, contexto))
+
+    pagina = await apaginar_numerada(request, inscripciones, views.APUNTADOS_POR_PAGINA, views.ORDENES_APUNTADOS[orden])
+    contexto.update(
+        entrenamientos=pagina,
+        hay_apuntados=pagina.paginator.count > 0,
+        tarjetas=await sync_to_async(views.tarjetas_apuntados)([inscripcion.entrenamiento for inscripcion in pagina]),
+    )
+    return await arender(request, 'entrenamientos/apuntados.html', contexto)
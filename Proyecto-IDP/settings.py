@@ -55,6 +55,8 @@ INTERNAL_IPS = [
 NPM_BIN_PATH = "C:/Program Files/nodejs/npm.cmd"
 
 MIDDLEWARE = [
+    "FitGym.instrumentacion.InstrumentacionMiddleware",  # El primero, para medir también sesión y autenticación.
+    "FitGym.replicas.ReplicasMiddleware",  # Antes de la sesión, que también se lee de las réplicas.
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -92,6 +94,10 @@ WSGI_APPLICATION = "Proyecto-IDP.wsgi.application"
     Configuración de la base de datos llamada fitgym, con mysql para localhost y puerto 3306.
     A su vez, para los tests se crea una base de datos ficticia que luego se elimina
 """
+"""
+    Las conexiones se reutilizan entre peticiones durante CONN_MAX_AGE segundos y, con
+    CONN_HEALTH_CHECKS, se comprueba antes de cada petición que siguen vivas.
+"""
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -100,6 +106,8 @@ DATABASES = {
         'PASSWORD': 'pass',
         'HOST': 'localhost',
         'PORT': '3306',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 } 
 if 'test' in sys.argv:
@@ -107,7 +115,85 @@ if 'test' in sys.argv:
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
     }
+    DATABASES['replica'] = {  # Base de datos aparte para comprobar a cuál va cada consulta.
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+
+"""
+    Réplicas de lectura (FitGym.replicas). Cada réplica se define en DATABASES con los mismos ajustes
+    que 'default' y su propio HOST, y su alias se añade a BD_REPLICAS; las lecturas de las peticiones
+    GET se reparten entre ellas. Tras una escritura, el usuario lee de la primaria durante
+    BD_SEGUNDOS_PRIMARIA segundos (más que el retraso máximo esperado de la replicación).
+    Para probarlo en local basta con dos SQLite: 'default' en db.sqlite3 y 'replica' en una copia.
+"""
+BD_REPLICAS = []
+BD_SEGUNDOS_PRIMARIA = 10
+DATABASE_ROUTERS = ['FitGym.replicas.EnrutadorReplicas']
+
+
+"""
+    Caché usada para las tarjetas del catálogo y los totales aproximados de la paginación.
+    La caché en memoria es local a cada proceso; para compartirla entre procesos se puede usar
+    'django.core.cache.backends.filebased.FileBasedCache' con LOCATION apuntando a un directorio.
+"""
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fitgym',
+    }
+}
+CACHE_FRAGMENTOS_TIMEOUT = 60 * 60 * 24  # Segundos que se guarda cada tarjeta renderizada.
+
+"""
+    Sesiones y autenticación (FitGym.sesiones).
+    Las sesiones se leen de la caché y solo se escriben cuando cambian; el usuario de la sesión se
+    guarda en caché SESION_USUARIO_TIMEOUT segundos. Para no tocar la base de datos ni la caché se puede
+    usar SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies' (la sesión va firmada en la
+    cookie). Las sesiones caducadas se borran con 'python manage.py limpiar_sesiones'.
+    Ambas cachés necesitan que la caché SESSION_CACHE_ALIAS sea compartida por todos los procesos
+    (Redis, Memcached o base de datos). La caché en memoria solo se usa si SESIONES_CACHE_LOCAL lo permite
+    (un único proceso: runserver y las pruebas); si no, las sesiones van a la base de datos y el usuario no se cachea.
+"""
+SESSION_ENGINE = 'FitGym.sesiones'
+AUTHENTICATION_BACKENDS = ['FitGym.sesiones.BackendUsuarioCacheado']
+SESION_USUARIO_TIMEOUT = 60 * 15
+SESIONES_CACHE_LOCAL = DEBUG
+
+"""
+    Límite de intentos de inicio de sesión y registro (FitGym.limites): (capacidad, fichas por minuto)
+    de la cubeta de cada IP y de cada nombre de usuario. Con HASH_HILOS los hashes de contraseñas se
+    calculan en un grupo de ese número de hilos, con HASH_COLA peticiones como máximo esperando.
+"""
+LIMITE_INTENTOS_IP = (20, 10)
+LIMITE_INTENTOS_USUARIO = (5, 2)
+HASH_HILOS = None
+HASH_COLA = 8
 
+"""
+    Cola de tareas en segundo plano (miniaturas y borrado de ficheros).
+    Las ejecuta el worker 'python manage.py procesar_tareas'. Con TAREAS_EN_LINEA se ejecutan
+    dentro de la propia petición, como antes, para trabajar sin worker.
+"""
+TAREAS_EN_LINEA = False
+
+"""
+    Instrumentación de cada petición (FitGym.instrumentacion): consultas, duplicadas, tiempo de base
+    de datos, de plantillas y total por nombre de URL. Con INSTRUMENTACION_CABECERAS se envían en las
+    cabeceras de la respuesta (X-FitGym-* y Server-Timing); si no, se escribe una línea de log por petición.
+"""
+INSTRUMENTACION_CABECERAS = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'FitGym.instrumentacion': {'handlers': ['consola'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -150,13 +236,51 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'  # Destino de 'collectstatic' (nombres con hash y versiones .gz/.br).
+
+"""
+    Con SERVIR_ESTATICOS Django sirve STATIC_ROOT con la vista FitGym.estaticos.servir (versiones
+    precomprimidas y caché de un año). Solo hace falta si no hay un servidor web delante.
+"""
+SERVIR_ESTATICOS = False
 
 LOGIN_URL = "inicio_sesion"
 
+"""
+    Paginación de los listados del catálogo.
+    Con PAGINACION_CURSOR se pagina por cursor sobre el orden del listado, con un coste por página constante;
+    PAGINACION_TOTAL_APROXIMADO muestra un total estimado en lugar de hacer un COUNT exacto.
+"""
+PAGINACION_CURSOR = False
+PAGINACION_TOTAL_APROXIMADO = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "")
 MEDIA_URL = "/imagenes_entrenamiento/"
 
+"""
+    Las imágenes subidas se sirven con la vista FitGym.medios.servir, solo desde las carpetas de
+    MEDIOS_CARPETAS (MEDIA_ROOT es la raíz del proyecto). Con MEDIOS_DESCARGA = 'x-accel-redirect'
+    (nginx, con una location 'internal' en MEDIOS_PREFIJO_INTERNO que apunte a MEDIA_ROOT) o
+    'x-sendfile' (Apache con mod_xsendfile, lighttpd) la vista solo pone las cabeceras y el
+    servidor web envía el fichero.
+"""
+MEDIOS_CARPETAS = ('contenido', 'imagenes_ejercicio', 'imagenes_entrenamiento')  # Las dos últimas, para las imágenes anteriores al almacenamiento por hash.
+MEDIOS_DESCARGA = None
+MEDIOS_PREFIJO_INTERNO = '/medios-internos/'
+
+"""
+    Las imágenes subidas se guardan por el hash de su contenido (FitGym.almacenamiento): una misma
+    imagen subida varias veces ocupa un solo fichero y se borra cuando deja de usarla el último objeto.
+    Los estáticos también llevan el hash en el nombre y se comprimen al hacer collectstatic (FitGym.estaticos).
+"""
+STORAGES = {
+    "default": {"BACKEND": "FitGym.almacenamiento.AlmacenamientoContenido"},
+    "staticfiles": {"BACKEND": "FitGym.estaticos.EstaticosComprimidos"},
+}
+if 'test' in sys.argv:  # Las pruebas no ejecutan collectstatic, así que no hay manifiesto de hashes.
+    STORAGES["staticfiles"] = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
\ No newline at end of file
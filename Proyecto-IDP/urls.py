@@ -15,8 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from FitGym import estaticos
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -24,3 +26,6 @@ urlpatterns = [
     path("__reload__/", include("django_browser_reload.urls")),
 
 ]
+
+if settings.SERVIR_ESTATICOS:  # Sin servidor web delante: estáticos precomprimidos y con caché de un año.
+    urlpatterns.append(re_path(r'^%s(?P<ruta>.+)$' % settings.STATIC_URL.lstrip('/'), estaticos.servir))